@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Benchmark of the "ninja -t deps" output parsing of NinjaDepsProcessor.
+
+Compares the current parser, which converts the paths via PathNormalizer (memoized resolved
+directories, LRU cache of the full paths, no Path objects for the targets), with the previous
+implementation, which resolved the "../" prefix of every dependency line character by character
+and created a Path object for every target.
+
+Usage: python3 deps_path_benchmark.py [--dump FILE --build-dir DIR] [--targets N]
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_deps_processor import NinjaDepsProcessor
+from synthetic_build import generate_deps_output
+
+
+class LegacyDepsOutputParser:
+    """The reference implementation of the previous "ninja -t deps" output parser."""
+
+    def __init__(self, build_dir: Path):
+        self._build_dir_str = build_dir.as_posix()
+        self.outputs_by_dependencies = {}
+
+    def parse(self, deps_data: str):
+        self.outputs_by_dependencies = {}
+
+        current_target = None
+        for line in deps_data.splitlines():
+            if not line.startswith(" "):
+                new_current_target = line[0:line.find(": ")]
+                if new_current_target:
+                    current_target = str(Path(new_current_target))
+                continue
+
+            file_path_string = self._generate_absolute_file_path_string(line)
+            self.outputs_by_dependencies.setdefault(file_path_string, []).append(current_target)
+
+    def _generate_absolute_file_path_string(self, line: str) -> str:
+        file_name = line.lstrip()
+        if file_name[0:3] != "../":
+            return file_name
+
+        file_path = f"{self._build_dir_str}/{file_name}"
+        start, end = None, None
+        i = 0
+        while i < len(file_path):
+            if file_path[i:i + 3] == "../":
+                if start is None:
+                    start = file_path.rfind("/", 0, i - 1)
+                else:
+                    start = file_path.rfind("/", 0, start)
+                i += 3
+                end = i
+                continue
+
+            if start is not None:
+                break
+            i += 1
+
+        if start is None or end is None:
+            return file_path
+
+        return f"{file_path[0:start]}/{file_path[end:]}"
+
+
+def _run(name: str, parse, deps_data: str) -> float:
+    start = time.perf_counter()
+    parse(deps_data)
+    duration = time.perf_counter() - start
+    megabytes = len(deps_data) / (1 << 20)
+    print(f"{name:>8}: {duration:7.3f} s, {megabytes / duration:7.1f} MB/s")
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--dump", type=Path, help="File with the captured output of \"ninja -t deps\".")
+    parser.add_argument(
+        "--build-dir", type=Path, default=Path("/home/user/project/build"),
+        help="Build directory the dump was captured in.")
+    parser.add_argument(
+        "--targets", type=int, default=20_000,
+        help="Number of targets in the generated output (if no dump is given).")
+    args = parser.parse_args()
+
+    if args.dump:
+        deps_data = args.dump.read_text()
+    else:
+        deps_data = generate_deps_output(args.targets)
+
+    legacy_parser = LegacyDepsOutputParser(args.build_dir)
+    processor = NinjaDepsProcessor(args.build_dir)
+
+    legacy_duration = _run("legacy", legacy_parser.parse, deps_data)
+    current_duration = _run(
+        "current",
+        lambda data: processor._parse_ninja_deps_output(io.StringIO(data)),
+        deps_data)
+
+    # Both implementations must produce the same result.
+    assert processor._outputs_by_dependencies == legacy_parser.outputs_by_dependencies
+    print(f"Speedup: {legacy_duration / current_duration:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Micro-benchmark of the "build" statement lexer of BuildNinjaFileProcessor.
+
+Compares the throughput of the current lexer (BuildNinjaFileProcessor._parse_build_line), which
+masks the escape sequences and splits the statement by the separators once, with the previous
+implementation, which split the statement by ":" and " " and re-joined the tokens ending with an
+odd number of "$" symbols (_split_build_line() + _tokenize()).
+
+Usage: python3 lexer_benchmark.py [--edges N] [--escape-density D]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_file_processor.build_ninja_processor import BuildLineData, BuildNinjaFileProcessor
+from synthetic_build import generate_statements
+
+
+class LegacyBuildLineParser:
+    """The reference implementation of the previous "build" line tokenizer."""
+
+    _ESCAPE_SYMBOLS_RE = re.compile(r".+(\$+)$")
+
+    @classmethod
+    def parse(cls, line: str) -> BuildLineData:
+        results, sources = cls._split_build_line(line.rstrip())
+
+        explicit_raw, has_implicit, implicit_raw = results.partition("|")
+        outputs = cls._tokenize(explicit_raw)
+        implicit_outputs = cls._tokenize(implicit_raw) if has_implicit else []
+
+        normal_raw, has_order_only, order_only_raw = sources.partition("||")
+        explicit_raw, has_implicit, implicit_raw = normal_raw.partition("|")
+        dependencies = cls._tokenize(explicit_raw)
+        command = dependencies.pop(0)
+        implicit_dependencies = cls._tokenize(implicit_raw) if has_implicit else []
+        order_only_dependencies = cls._tokenize(order_only_raw) if has_order_only else []
+
+        return BuildLineData(
+            outputs=outputs,
+            implicit_outputs=implicit_outputs,
+            command=command,
+            dependencies=dependencies,
+            implicit_dependencies=implicit_dependencies,
+            order_only_dependencies=order_only_dependencies)
+
+    @classmethod
+    def _split_build_line(cls, line: str) -> tuple:
+        tokens = line.split(':')
+        [results, sources] = (tokens.pop(0), "")
+        while tokens:
+            token = tokens.pop(0)
+            if results.endswith('$'):
+                match = cls._ESCAPE_SYMBOLS_RE.match(results)
+                if len(match[1]) % 2 == 1:
+                    results += f":{token}"
+                    continue
+            sources = token + (':' if tokens else '')
+            break
+
+        sources += ':'.join(tokens)
+        return results, sources.lstrip()
+
+    @classmethod
+    def _tokenize(cls, line: str) -> list:
+        tokens = []
+        for token in line.split(' '):
+            if not token:
+                continue
+            if not tokens or not tokens[-1].endswith('$'):
+                tokens.append(token)
+                continue
+            match = cls._ESCAPE_SYMBOLS_RE.match(tokens[-1])
+            if len(match[1]) % 2 == 1:
+                tokens[-1] += f" {token}"
+        return tokens
+
+
+def _run(name: str, parse, statements: List[str]) -> float:
+    start = time.perf_counter()
+    for statement in statements:
+        parse(statement)
+    duration = time.perf_counter() - start
+    megabytes = sum(len(s) for s in statements) / (1 << 20)
+    print(
+        f"{name:>8}: {duration:7.3f} s, {len(statements) / duration:12.0f} statements/s, "
+        f"{megabytes / duration:7.1f} MB/s")
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--edges", type=int, default=1_000_000, help="Number of statements.")
+    parser.add_argument(
+        "--escape-density", type=float, default=0.01,
+        help="Share of paths containing escaped characters.")
+    args = parser.parse_args()
+
+    statements = generate_statements(args.edges, args.escape_density)
+    processor = BuildNinjaFileProcessor(Path("build.ninja"), build_directory=Path.cwd())
+
+    # Both implementations must produce the same result.
+    for statement in statements[:1000]:
+        assert processor._parse_build_line(statement) == (
+            LegacyBuildLineParser.parse(statement)), statement
+
+    legacy_duration = _run("legacy", LegacyBuildLineParser.parse, statements)
+    lexer_duration = _run("lexer", processor._parse_build_line, statements)
+    print(f"Speedup: {legacy_duration / lexer_duration:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Benchmark suite of the main ninja_tool operations on synthetic build directories.
+
+For every scale (the number of the "build" statements), a build directory is generated by
+synthetic_build.create_build_directory(), and the following operations are timed:
+- load_build_ninja: parsing build.ninja (without the parse cache);
+- load_ninja_deps: parsing the output of "ninja -t deps";
+- affected_targets: finding the targets affected by the changed files;
+- affected_top_level: the same, keeping only the top-level targets with the numbers of the
+    changed files they depend on;
+- strengthen: strengthening the dependencies of the top-level targets;
+- analyze_graph: finding the critical path and the transitive fan-in and fan-out of the edges;
+- collect_known_files: building the index of the files known from build.ninja;
+- scan_build_directory: searching for the unknown files in the build directory;
+- save_build_ninja: writing the strengthened build.ninja.
+
+Every operation is run several times, and the best time is reported. The results are written as
+JSON; the results of a previous run can be passed by "--compare" to print the ratio of the times.
+
+Usage: python3 ninja_tool_benchmark.py [--scales N,N...] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from known_files_index import KnownFilesIndex
+from ninja_deps_processor import NinjaDepsProcessor
+from ninja_file_processor.affected_targets_query import AffectedTargetsQuery
+from ninja_file_processor.build_ninja_processor import BuildNinjaFileProcessor
+from ninja_tool import find_extra_files
+from synthetic_build import SyntheticBuild, SyntheticBuildParameters, create_build_directory
+
+# Increment this value every time the layout of the results or the set of the measured operations
+# is changed, so the results of the different versions are not compared.
+RESULTS_FORMAT_VERSION = 3
+
+
+class _Benchmark:
+    def __init__(self, build: SyntheticBuild, parse_jobs: int, memory_mapped: bool) -> None:
+        self._build = build
+        self._parse_jobs = parse_jobs
+        self._memory_mapped = memory_mapped
+        # Stored outside of the build directory, so it's not reported as an unknown file.
+        self._original_build_file_name = build.build_dir.parent / "build.ninja.original"
+        shutil.copyfile(build.build_file_name, self._original_build_file_name)
+
+    def run(self, repeat: int) -> Dict[str, dict]:
+        """Run all the benchmarks.
+
+        :return: Results by the name of the benchmark.
+        :rtype: Dict[str, dict]
+        """
+
+        results = {}
+        results["load_build_ninja"] = self._measure(repeat, lambda _: self._load_build_file())
+        results["load_ninja_deps"] = self._measure(repeat, lambda _: self._load_deps())
+        results["affected_targets"] = self._measure(
+            repeat,
+            lambda processors: self._find_affected_targets(processors, AffectedTargetsQuery()),
+            setup=lambda: (self._load_build_file(), self._load_deps()))
+        results["affected_top_level"] = self._measure(
+            repeat,
+            lambda processors: self._find_affected_targets(
+                processors, AffectedTargetsQuery(top_level_only=True, with_counts=True)),
+            setup=lambda: (self._load_build_file(), self._load_deps()))
+        results["strengthen"] = self._measure(
+            repeat, self._strengthen, setup=self._load_build_file)
+        results["analyze_graph"] = self._measure(
+            repeat, self._analyze_graph, setup=self._load_build_file)
+        results["collect_known_files"] = self._measure(
+            repeat, self._collect_known_files, setup=self._load_build_file)
+        results["scan_build_directory"] = self._measure(
+            repeat, self._scan_build_directory,
+            setup=lambda: self._collect_known_files(self._load_build_file()))
+        results["save_build_ninja"] = self._measure(
+            repeat, self._save, setup=self._load_strengthened_build_file)
+        return results
+
+    def _measure(self, repeat: int, operation: Callable, setup: Callable = None) -> dict:
+        """Run the operation several times; the result of setup() is passed to the operation, and
+        the time of setup() is not measured. If the operation returns a dict, it's reported as the
+        counters of the benchmark.
+        """
+
+        durations = []
+        counters = {}
+        for _ in range(repeat):
+            argument = setup() if setup is not None else None
+            # The operations print progress messages, which are not of interest here.
+            with contextlib.redirect_stdout(io.StringIO()):
+                start_time = time.perf_counter()
+                result = operation(argument)
+                durations.append(time.perf_counter() - start_time)
+            # Besides the counters, the operations can return the loaded data.
+            counters = result if isinstance(result, dict) else {}
+        return {"best_s": min(durations), "runs_s": durations, "counters": counters}
+
+    def _load_build_file(self) -> BuildNinjaFileProcessor:
+        shutil.copyfile(self._original_build_file_name, self._build.build_file_name)
+        processor = BuildNinjaFileProcessor(
+            self._build.build_file_name,
+            build_directory=self._build.build_dir,
+            parse_jobs=self._parse_jobs,
+            memory_mapped=self._memory_mapped)
+        processor.load_data()
+        return processor
+
+    def _load_strengthened_build_file(self) -> BuildNinjaFileProcessor:
+        processor = self._load_build_file()
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.strengthen_dependencies(self._build.strengthened_targets)
+        return processor
+
+    def _load_deps(self) -> NinjaDepsProcessor:
+        processor = NinjaDepsProcessor(self._build.build_dir)
+        with open(self._build.deps_output_file_name) as deps_output:
+            processor._parse_ninja_deps_output(deps_output)
+        return processor
+
+    def _find_affected_targets(self, processors: tuple, query: AffectedTargetsQuery) -> dict:
+        # The same steps as in ninja_tool.generate_list_of_targets_affected_by_listed_files().
+        build_file_processor, ninja_deps_processor = processors
+        changed_files = []
+        for file_name in self._build.changed_files:
+            full_path = self._build.source_dir / file_name
+            changed_files.append(
+                [full_path, *ninja_deps_processor.get_dependent_object_files(full_path)])
+        targets = build_file_processor.query_affected_targets(changed_files, query)
+        return {"affected_targets": len(targets)}
+
+    def _strengthen(self, processor: BuildNinjaFileProcessor) -> None:
+        processor.strengthen_dependencies(self._build.strengthened_targets)
+
+    def _analyze_graph(self, processor: BuildNinjaFileProcessor) -> dict:
+        # The synthetic build has no .ninja_log, so every command is considered instant.
+        report = processor.analyze_graph({}, top_count=20)
+        return {"largest_fan_in": report.largest_fan_in[0].transitive_dependency_count}
+
+    def _collect_known_files(self, processor: BuildNinjaFileProcessor) -> KnownFilesIndex:
+        known_files = KnownFilesIndex(self._build.build_dir)
+        known_files.add_files(processor.get_known_files())
+        return known_files
+
+    def _scan_build_directory(self, known_files: KnownFilesIndex) -> dict:
+        return {"unknown_files": len(find_extra_files(self._build.build_dir, known_files))}
+
+    def _save(self, processor: BuildNinjaFileProcessor) -> dict:
+        processor.save_data()
+        return {"saved_bytes": self._build.build_file_name.stat().st_size}
+
+
+def _compare(results: List[dict], baseline_file_name: Path) -> None:
+    with open(baseline_file_name) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("format_version") != RESULTS_FORMAT_VERSION:
+        print(f"Cannot compare with {baseline_file_name}: the format is different")
+        return
+
+    def key(result: dict) -> tuple:
+        return (result["benchmark"], json.dumps(result["parameters"], sort_keys=True))
+
+    baseline_results = {key(result): result for result in baseline["results"]}
+    print(f"Comparison with {baseline_file_name} (current / baseline):")
+    for result in results:
+        baseline_result = baseline_results.get(key(result))
+        if baseline_result is None:
+            continue
+        ratio = result["best_s"] / baseline_result["best_s"]
+        print(
+            f"{result['benchmark']:>22} {result['parameters']['edge_count']:>9}: "
+            f"{baseline_result['best_s']:8.3f} s -> {result['best_s']:8.3f} s ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales", default="10000,100000",
+        help="Comma-separated numbers of the \"build\" statements of the generated files.")
+    parser.add_argument(
+        "--fan-in", type=int, default=20, help="Number of the object files of every library.")
+    parser.add_argument(
+        "--fan-out", type=int, default=3, help="Number of the libraries every library links to.")
+    parser.add_argument(
+        "--escape-density", type=float, default=0.01,
+        help="Share of the paths containing escaped characters.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of the runs.")
+    parser.add_argument(
+        "-j", "--parse-jobs", type=int, default=1,
+        help="Number of the processes parsing build.ninja.")
+    parser.add_argument(
+        "-m", "--mmap", action="store_true", help="Load build.ninja in the memory mapped mode.")
+    parser.add_argument(
+        "--work-dir", type=Path,
+        help="Directory for the generated files; by default, a temporary directory is used.")
+    parser.add_argument("--output", type=Path, help="File to write the results to.")
+    parser.add_argument(
+        "--compare", type=Path, help="File with the results of a previous run to compare with.")
+    args = parser.parse_args()
+
+    results = []
+    for scale in (int(s) for s in args.scales.split(",")):
+        parameters = SyntheticBuildParameters(
+            edge_count=scale,
+            fan_in=args.fan_in,
+            fan_out=args.fan_out,
+            escape_density=args.escape_density)
+        with _work_directory(args.work_dir, scale) as work_dir:
+            build = create_build_directory(work_dir, parameters)
+            print(
+                f"Scale {scale}: {build.edge_count} statements, "
+                f"{build.build_file_name.stat().st_size / (1 << 20):.1f} MB")
+            benchmark = _Benchmark(build, parse_jobs=args.parse_jobs, memory_mapped=args.mmap)
+            for name, result in benchmark.run(args.repeat).items():
+                print(f"{name:>22}: {result['best_s']:8.3f} s")
+                results.append({
+                    "benchmark": name,
+                    "parameters": parameters._asdict(),
+                    "edges": build.edge_count,
+                    **result,
+                })
+
+    report = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {"repeat": args.repeat, "parse_jobs": args.parse_jobs, "mmap": args.mmap},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=4)
+    if args.compare:
+        _compare(results, args.compare)
+
+
+@contextlib.contextmanager
+def _work_directory(work_dir: Optional[Path], scale: int):
+    if work_dir is not None:
+        directory = work_dir.resolve() / f"scale_{scale}"
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+        yield directory
+        return
+
+    with tempfile.TemporaryDirectory(prefix="ninja_tool_benchmark_") as directory:
+        yield Path(directory).resolve()
+
+
+if __name__ == "__main__":
+    main()
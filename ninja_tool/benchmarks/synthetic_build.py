@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Generators of the synthetic ninja files and build directories used by the benchmarks.
+
+SyntheticBuildParameters: Shape of the generated build graph.
+
+SyntheticBuild: Description of a generated build directory: build.ninja including
+CMakeFiles/rules.ninja, the output of "ninja -t deps" for the object files, the build products on
+disk together with some stale files unknown to build.ninja, and the inputs for the benchmarked
+operations (changed files, strengthened targets).
+
+The layout follows the files produced by CMake: every library is linked from its object files,
+some object files depend on the headers generated by custom commands (moc), and every library links
+to some of the libraries defined before it. The generation is deterministic for the same
+parameters.
+"""
+
+import random
+from pathlib import Path
+from typing import List, NamedTuple, Set
+
+
+class SyntheticBuildParameters(NamedTuple):
+    # Approximate number of the "build" statements.
+    edge_count: int
+    # Number of the object files linked into every library.
+    fan_in: int = 20
+    # Number of the libraries every library links to (if that many are defined before it).
+    fan_out: int = 3
+    # Share of the paths containing escaped characters ("$ " and "$$").
+    escape_density: float = 0.01
+    # Share of the build products accompanied by a stale file unknown to build.ninja.
+    stale_file_density: float = 0.1
+    seed: int = 0
+
+
+class SyntheticBuild(NamedTuple):
+    build_dir: Path
+    source_dir: Path
+    build_file_name: Path
+    # File with the generated output of "ninja -t deps".
+    deps_output_file_name: Path
+    edge_count: int
+    # Files changed for the affected targets generation, relative to source_dir.
+    changed_files: List[str]
+    strengthened_targets: Set[str]
+
+
+# The generated object file depends on its source and this many headers.
+_HEADERS_PER_OBJECT = 20
+_HEADERS_PER_LIBRARY = 50
+# Every this object file depends on a header generated by moc.
+_GENERATED_HEADER_PERIOD = 10
+
+
+def create_build_directory(root_dir: Path, parameters: SyntheticBuildParameters) -> SyntheticBuild:
+    """Generate the source and build directories in root_dir.
+
+    :param root_dir: Directory to create "src" and "build" in; must be an absolute path.
+    :type root_dir: Path
+    :param parameters: Shape of the build graph.
+    :type parameters: SyntheticBuildParameters
+    :return: Description of the generated build directory.
+    :rtype: SyntheticBuild
+    """
+
+    rng = random.Random(parameters.seed)
+    source_dir = root_dir / "src"
+    build_dir = root_dir / "build"
+    (build_dir / "CMakeFiles").mkdir(parents=True, exist_ok=True)
+    source_dir.mkdir(parents=True, exist_ok=True)
+
+    def escaped_name(base_name: str) -> str:
+        if rng.random() >= parameters.escape_density:
+            return base_name
+        return rng.choice((f"dir$ with$ spaces/{base_name}", f"price$$list/{base_name}"))
+
+    # Every library takes fan_in compile statements, a link statement and a phony statement.
+    library_count = max(1, parameters.edge_count // (parameters.fan_in + 2))
+    lines = [
+        "# CMAKE generated file: DO NOT EDIT!\n",
+        "ninja_required_version = 1.5\n\n",
+        "include CMakeFiles/rules.ninja\n\n",
+    ]
+    deps_lines = []
+    build_products = []
+    libraries = []
+    edge_count = 0
+    for library_index in range(library_count):
+        library = f"lib{library_index}"
+        headers = [
+            f"../src/{library}/include/{library}/header{i}.h"
+            for i in range(_HEADERS_PER_LIBRARY)]
+        order_depends_target = f"cmake_object_order_depends_target_{library}"
+        objects = []
+        generated_headers = []
+        for object_index in range(parameters.fan_in):
+            name = escaped_name(f"file{object_index}.cpp")
+            object_file = f"{library}/CMakeFiles/{library}.dir/{name}.o"
+            source_file = f"{source_dir.as_posix()}/{library}/{name}"
+            lines.append(
+                f"build {object_file}: CXX_COMPILER__Debug {source_file}"
+                f" || {order_depends_target}\n"
+                f"  DEFINES = -D{library.upper()}_EXPORTS\n"
+                f"  DEP_FILE = {object_file}.d\n"
+                f"  FLAGS = -O2 -g -fPIC\n"
+                f"  OBJECT_DIR = {library}/CMakeFiles/{library}.dir\n"
+                f"  depfile = {object_file}.d\n\n")
+            objects.append(object_file)
+            build_products.append(_unescape(object_file))
+            edge_count += 1
+
+            if object_index % _GENERATED_HEADER_PERIOD == 0:
+                generated_header = f"{library}/moc_{object_index}.cpp"
+                lines.append(
+                    f"build {generated_header}: CUSTOM_COMMAND {source_file}\n"
+                    f"  COMMAND = cd {build_dir.as_posix()}/{library} && /usr/bin/moc "
+                    f"@{build_dir.as_posix()}/{library}/moc_{object_index}.cpp_parameters\n"
+                    f"  DESC = Generating moc_{object_index}.cpp\n\n")
+                generated_headers.append(generated_header)
+                build_products.append(generated_header)
+                edge_count += 1
+
+            dependencies = [f"../src/{library}/{_unescape(name)}"]
+            dependencies += rng.sample(headers, min(_HEADERS_PER_OBJECT, len(headers)))
+            deps_lines.append(
+                f"{_unescape(object_file)}: #deps {len(dependencies)}, deps mtime 1 (VALID)\n")
+            deps_lines.extend(f"    {dependency}\n" for dependency in dependencies)
+            deps_lines.append("\n")
+
+        linked_libraries = rng.sample(libraries, min(parameters.fan_out, len(libraries)))
+        lines.append(
+            f"build {order_depends_target}: phony || {' '.join(generated_headers)}"
+            + "".join(
+                f" cmake_object_order_depends_target_{Path(l).parent.name}"
+                for l in linked_libraries)
+            + "\n\n")
+        library_file = f"{library}/lib{library}.so"
+        implicit_dependencies = f" | {' '.join(linked_libraries)}" if linked_libraries else ""
+        lines.append(
+            f"build {library_file}: CXX_SHARED_LIBRARY_LINKER__Debug "
+            f"{' '.join(objects)}{implicit_dependencies}\n"
+            f"  LINK_FLAGS = -shared\n"
+            f"  SONAME = lib{library}.so\n\n")
+        libraries.append(library_file)
+        build_products.append(library_file)
+        edge_count += 2
+
+    application = "bin/application"
+    application_libraries = libraries[len(libraries) - parameters.fan_out:]
+    lines.append(
+        f"build {application}: CXX_EXECUTABLE_LINKER__Debug {source_dir.as_posix()}/main.cpp"
+        f"{' | ' if application_libraries else ''}{' '.join(application_libraries)}\n\n")
+    lines.append(f"build all: phony {application} {' '.join(libraries)}\n\n")
+    lines.append(
+        "build build.ninja: RERUN_CMAKE | CMakeLists.txt\n"
+        "  pool = console\n\n")
+    lines.append("default all\n")
+    build_products.append(application)
+    edge_count += 3
+
+    build_file_name = build_dir / "build.ninja"
+    build_file_name.write_text("".join(lines))
+    (build_dir / "CMakeFiles" / "rules.ninja").write_text(_RULES_NINJA.format(
+        source_dir=source_dir.as_posix(), build_dir=build_dir.as_posix()))
+    # Stored outside of the build directory, so it's not reported as an unknown file.
+    deps_output_file_name = root_dir / "deps_output.txt"
+    deps_output_file_name.write_text("".join(deps_lines))
+    _create_files(build_dir, build_products, parameters.stale_file_density, rng)
+
+    changed_library = f"lib{rng.randrange(library_count)}"
+    changed_files = [
+        f"{changed_library}/include/{changed_library}/header{rng.randrange(10)}.h",
+        f"lib{rng.randrange(library_count)}/file1.cpp",
+    ]
+    return SyntheticBuild(
+        build_dir=build_dir,
+        source_dir=source_dir,
+        build_file_name=build_file_name,
+        deps_output_file_name=deps_output_file_name,
+        edge_count=edge_count,
+        changed_files=changed_files,
+        strengthened_targets={application, libraries[-1]})
+
+
+def _create_files(build_dir: Path, build_products: List[str], stale_file_density: float, rng):
+    """Create the empty build products and the stale files next to some of them."""
+
+    created_directories = set()
+    for index, product in enumerate(build_products):
+        file_name = build_dir / product
+        if file_name.parent not in created_directories:
+            file_name.parent.mkdir(parents=True, exist_ok=True)
+            created_directories.add(file_name.parent)
+        file_name.touch()
+        if rng.random() < stale_file_density:
+            (file_name.parent / f"stale{index}.o").touch()
+
+
+def _unescape(path: str) -> str:
+    return path.replace("$$", "$").replace("$ ", " ")
+
+
+_RULES_NINJA = """\
+# CMAKE generated file: DO NOT EDIT!
+
+rule CXX_COMPILER__Debug
+  depfile = $DEP_FILE
+  deps = gcc
+  command = /usr/bin/c++ $DEFINES $FLAGS -MD -MT $out -MF $DEP_FILE -o $out -c $in
+  description = Building CXX object $out
+
+rule CXX_SHARED_LIBRARY_LINKER__Debug
+  command = /usr/bin/c++ -fPIC $LINK_FLAGS -Wl,-soname,$SONAME -o $out $in
+  description = Linking CXX shared library $out
+
+rule CXX_EXECUTABLE_LINKER__Debug
+  command = /usr/bin/c++ $in -o $out
+  description = Linking CXX executable $out
+
+rule CUSTOM_COMMAND
+  command = $COMMAND
+  description = $DESC
+
+rule RERUN_CMAKE
+  command = /usr/bin/cmake --regenerate-during-build -S{source_dir} -B{build_dir}
+  description = Re-running CMake...
+  generator = 1
+"""
+
+
+def generate_statements(edge_count: int, escape_density: float, seed: int = 0) -> List[str]:
+    """Generate "build" statements (without the "build" keyword) similar to the ones produced by
+    CMake: object files compiled from sources and libraries linked from the object files.
+    """
+
+    rng = random.Random(seed)
+
+    def path(prefix: str, index: int) -> str:
+        if rng.random() < escape_density:
+            return f"{prefix}/dir$ with$ spaces/C$:/file{index}$$.cpp"
+        return f"{prefix}/some/nested/directory/file{index}.cpp"
+
+    statements = []
+    for i in range(edge_count):
+        if i % 20:
+            statements.append(
+                f"{path('obj', i)}.o: CXX_COMPILER__target_Debug {path('/src', i)}"
+                f" || cmake_object_order_depends_target_target{i % 7}\n")
+        else:
+            objects = " ".join(f"{path('obj', j)}.o" for j in range(i - 19, i))
+            statements.append(
+                f"lib/libtarget{i}.so | lib/libtarget{i}.map: "
+                f"CXX_SHARED_LIBRARY_LINKER__target_Debug {objects} | lib/libbase.so"
+                f" || phony_target{i}\n")
+    return statements
+
+
+def generate_deps_output(target_count: int, seed: int = 0) -> str:
+    """Generate "ninja -t deps" output similar to the one of a C++ project built by CMake: every
+    object file depends on its source, some of the project headers and some system headers.
+    """
+
+    rng = random.Random(seed)
+    project_headers = [
+        f"../../src/module{i % 50}/include/module{i % 50}/header{i}.h" for i in range(5000)]
+    system_headers = [f"/usr/include/c++/11/bits/header{i}.h" for i in range(500)]
+
+    lines = []
+    for i in range(target_count):
+        dependencies = [f"../../src/module{i % 50}/src/file{i}.cpp"]
+        dependencies += rng.sample(project_headers, 40) + rng.sample(system_headers, 60)
+        lines.append(
+            f"module{i % 50}/CMakeFiles/module{i % 50}.dir/src/file{i}.cpp.o: "
+            f"#deps {len(dependencies)}, deps mtime 1 (VALID)")
+        lines.extend(f"    {dependency}" for dependency in dependencies)
+        lines.append("")
+    return "\n".join(lines) + "\n"
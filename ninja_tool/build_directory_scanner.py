@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+BuildDirectoryScanner: Search for the files in the build directory which are not known to be needed
+for the build.
+
+The directory tree is walked with os.scandir(), so the type of every entry is known without extra
+system calls, and excluded directories are skipped without descending into them. The known files
+are looked up in KnownFilesIndex along with the walk, one path component at a time, so the known
+directories are skipped as a whole, and below the directories without known files no lookups are
+made. Top-level subdirectories are scanned in parallel by a thread pool (os.scandir() releases the
+GIL while waiting for the file system).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from known_files_index import KnownFilesIndex
+
+
+class BuildDirectoryScanner:
+    def __init__(self,
+            excluded_directory_names: Iterable[str],
+            excluded_file_names: Iterable[str],
+            excluded_extensions: Iterable[str],
+            jobs: Optional[int] = None) -> None:
+        """
+        :param excluded_directory_names: Names of the directories which contents are never
+            reported (e.g. "CMakeFiles").
+        :type excluded_directory_names: Iterable[str]
+        :param excluded_file_names: Names of the files which are never reported.
+        :type excluded_file_names: Iterable[str]
+        :param excluded_extensions: Extensions (with the leading dot) of the files which are never
+            reported.
+        :type excluded_extensions: Iterable[str]
+        :param jobs: Number of the threads scanning the subdirectories; by default, it is chosen by
+            ThreadPoolExecutor.
+        :type jobs: Optional[int]
+        """
+
+        self._excluded_directory_names = frozenset(excluded_directory_names)
+        self._excluded_file_names = frozenset(excluded_file_names)
+        self._excluded_extensions = frozenset(excluded_extensions)
+        self._jobs = jobs
+        # Number of the directory entries seen by the last find_unknown_files() call.
+        self.scanned_entry_count = 0
+
+    def find_unknown_files(
+            self, build_dir: Path, known_files: KnownFilesIndex) -> List[os.DirEntry]:
+        """Find the files and symlinks which are not excluded and not known.
+
+        :param build_dir: Directory to scan.
+        :type build_dir: Path
+        :param known_files: Index of the known files of the build directory.
+        :type known_files: KnownFilesIndex
+        :return: Entries of the unknown files; the paths of the entries start with build_dir.
+        :rtype: List[os.DirEntry]
+        """
+
+        # Contents of excluded directories are not reported, even if the build directory itself is
+        # inside such a directory.
+        if self._excluded_directory_names.intersection(build_dir.parts):
+            return []
+        if known_files.root == KnownFilesIndex.SUBTREE:
+            return []
+
+        result = []
+        subdirectories = []
+        self.scanned_entry_count = self._scan_directory(
+            str(build_dir), known_files.root, result, subdirectories)
+        if not subdirectories:
+            return result
+
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            subtree_results = [
+                executor.submit(self._scan_tree, path, known_node)
+                for path, known_node in subdirectories]
+            for subtree_result in subtree_results:
+                subtree_files, subtree_entry_count = subtree_result.result()
+                result.extend(subtree_files)
+                self.scanned_entry_count += subtree_entry_count
+
+        return result
+
+    def _scan_tree(
+            self, path: str, known_node: Optional[dict]) -> Tuple[List[os.DirEntry], int]:
+        result = []
+        entry_count = 0
+        unscanned_directories = [(path, known_node)]
+        while unscanned_directories:
+            entry_count += self._scan_directory(
+                *unscanned_directories.pop(), result, unscanned_directories)
+        return result, entry_count
+
+    def _scan_directory(self,
+            path: str,
+            known_node: Optional[dict],
+            result: List[os.DirEntry],
+            subdirectories: list) -> int:
+        """Scan the directory; the subdirectories to scan are added to subdirectories along with
+        their nodes of KnownFilesIndex.
+
+        :param known_node: Node of the directory in KnownFilesIndex, or None if there are no known
+            files in the directory.
+        :return: Number of the entries in the directory.
+        :rtype: int
+        """
+
+        try:
+            entries = os.scandir(path)
+        except PermissionError:
+            # Unreadable directories are skipped, the same way as Path.rglob() does.
+            return 0
+
+        entry_count = 0
+        with entries:
+            for entry in entries:
+                entry_count += 1
+                name = entry.name
+                # Symlinks to directories are reported as files, but are never followed.
+                known_child = known_node.get(name) if known_node is not None else None
+                if entry.is_dir(follow_symlinks=False):
+                    if (name not in self._excluded_directory_names
+                            and known_child != KnownFilesIndex.SUBTREE):
+                        subdirectories.append(
+                            (entry.path, known_child if isinstance(known_child, dict) else None))
+                    continue
+
+                if name in self._excluded_file_names:
+                    continue
+                # The same suffix as Path.suffix.
+                dot_position = name.rfind(".")
+                if 0 < dot_position < len(name) - 1 and (
+                        name[dot_position:] in self._excluded_extensions):
+                    continue
+                if known_child is not None and (
+                        not isinstance(known_child, dict)
+                        or KnownFilesIndex.STATE_KEY in known_child):
+                    continue
+                if entry.is_symlink() or entry.is_file():
+                    result.append(entry)
+
+        return entry_count
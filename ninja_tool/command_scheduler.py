@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+CommandScheduler: Parallel execution of the commands of the "run" script commands.
+
+The commands are started as soon as the commands they are ordered after have finished, while the
+number of the running commands is less than the job limit. A command without annotations (neither
+a name nor the commands to run after) is ordered after all the commands preceding it in the
+script, so a script without annotations is run sequentially, as it's written. The output of every
+command (both stdout and stderr) is written to its own log file and copied to stdout when the
+command finishes, so the outputs of the parallel commands are not interleaved. If a command fails
+(exits with a non-zero code or can't be started), no more commands are started, the running ones
+are terminated, and CommandSchedulerError is raised.
+
+ScheduledCommand: A command with its name and the names of the commands it must be run after.
+"""
+
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class ScheduledCommand(NamedTuple):
+    command: List[str]
+    # Name used in the "after=" annotations of other commands and in the name of the log file; if
+    # it's None, the name is generated from the position of the command and the executable name.
+    name: Optional[str] = None
+    after: Tuple[str, ...] = ()
+
+    def is_annotated(self) -> bool:
+        return self.name is not None or bool(self.after)
+
+
+class CommandResult(NamedTuple):
+    name: str
+    exit_code: int
+    duration_s: float
+    log_file_name: Path
+
+
+class CommandSchedulerError(Exception):
+    pass
+
+
+class CommandScheduler:
+    # Number of the last lines of the log of the failed command printed with the error.
+    FAILED_COMMAND_LOG_LINES = 20
+
+    _UNSAFE_FILE_NAME_SYMBOLS_RE = re.compile(r"[^\w.-]")
+
+    def __init__(self, commands: List[ScheduledCommand], jobs: int, log_dir: Path) -> None:
+        """
+        :param commands: Commands to run, in the order of the script.
+        :type commands: List[ScheduledCommand]
+        :param jobs: Maximal number of the commands running at the same time.
+        :type jobs: int
+        :param log_dir: Directory for the log files, named "run_<name>.log".
+        :type log_dir: Path
+        :raises CommandSchedulerError: The names of the commands are not unique, a command is
+            ordered after an unknown command, or the ordering has a cycle.
+        """
+
+        self._jobs = max(1, jobs)
+        self._log_dir = log_dir
+        self._commands: Dict[str, ScheduledCommand] = {}
+        for index, command in enumerate(commands, 1):
+            name = command.name or f"{index}_{Path(command.command[0]).name}"
+            if name in self._commands:
+                raise CommandSchedulerError(f"Duplicate name of the \"run\" command: {name!r}")
+            if not command.is_annotated():
+                # Running in parallel must be requested explicitly.
+                command = command._replace(after=tuple(self._commands))
+            self._commands[name] = command
+        self._check_order()
+
+    def run(self) -> List[CommandResult]:
+        """Run all the commands.
+
+        :return: Results of the commands in the order of completion.
+        :rtype: List[CommandResult]
+        :raises CommandSchedulerError: A command has failed.
+        """
+
+        self._log_dir.mkdir(parents=True, exist_ok=True)
+        waiting = dict(self._commands)
+        finished = set()
+        running: Dict[str, subprocess.Popen] = {}
+        results = []
+        completions = queue.Queue()
+        start_time = time.perf_counter()
+        try:
+            while waiting or running:
+                for name, command in list(waiting.items()):
+                    if len(running) >= self._jobs:
+                        break
+                    if finished.issuperset(command.after):
+                        del waiting[name]
+                        running[name] = self._start(name, command, completions)
+
+                result = completions.get()
+                del running[result.name]
+                results.append(result)
+                self._print_output(result)
+                if result.exit_code != 0:
+                    raise CommandSchedulerError(self._get_failure_message(result))
+                finished.add(result.name)
+                print(f"Command {result.name} finished in {result.duration_s:.2f} s")
+        finally:
+            for process in running.values():
+                process.terminate()
+            for process in running.values():
+                process.wait()
+
+        print(
+            f"{len(results)} commands finished in {time.perf_counter() - start_time:.2f} s "
+            f"(the sum of the command durations is "
+            f"{sum(r.duration_s for r in results):.2f} s)")
+        return results
+
+    def get_log_file_names(self) -> List[Path]:
+        """Get the names of the log files of all the commands, whether they are run or not.
+
+        :return: Log file names in the order of the script.
+        :rtype: List[Path]
+        """
+
+        return [self._get_log_file_name(name) for name in self._commands]
+
+    def _get_log_file_name(self, name: str) -> Path:
+        return self._log_dir / f"run_{self._UNSAFE_FILE_NAME_SYMBOLS_RE.sub('_', name)}.log"
+
+    def _start(
+            self,
+            name: str,
+            command: ScheduledCommand,
+            completions: queue.Queue) -> subprocess.Popen:
+        log_file_name = self._get_log_file_name(name)
+        print(f"Running {name}: {command.command}...")
+        start_time = time.perf_counter()
+        with open(log_file_name, "wb") as log_file:
+            try:
+                process = subprocess.Popen(
+                    command.command,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT)
+            except OSError as ex:
+                raise CommandSchedulerError(
+                    f"Cannot start command {name} {command.command}: {ex}") from ex
+
+        def wait():
+            exit_code = process.wait()
+            completions.put(CommandResult(
+                name=name,
+                exit_code=exit_code,
+                duration_s=time.perf_counter() - start_time,
+                log_file_name=log_file_name))
+
+        threading.Thread(target=wait, daemon=True).start()
+        return process
+
+    def _check_order(self) -> None:
+        for name, command in self._commands.items():
+            for predecessor in command.after:
+                if predecessor not in self._commands:
+                    raise CommandSchedulerError(
+                        f"Command {name} is ordered after unknown command {predecessor!r}")
+
+        # Remove the commands without predecessors until nothing is left; the commands which
+        # can't be removed form a cycle.
+        remaining = {name: set(command.after) for name, command in self._commands.items()}
+        while remaining:
+            ready = {name for name, predecessors in remaining.items() if not predecessors}
+            if not ready:
+                raise CommandSchedulerError(
+                    f"Cyclic order of the \"run\" commands: {', '.join(sorted(remaining))}")
+            remaining = {
+                name: predecessors - ready
+                for name, predecessors in remaining.items() if name not in ready}
+
+    @staticmethod
+    def _print_output(result: CommandResult) -> None:
+        try:
+            with open(result.log_file_name, errors="replace") as log_file:
+                sys.stdout.flush()
+                shutil.copyfileobj(log_file, sys.stdout)
+        except OSError as ex:
+            print(f"Cannot read the output of command {result.name}: {ex}")
+        sys.stdout.flush()
+
+    def _get_failure_message(self, result: CommandResult) -> str:
+        try:
+            with open(result.log_file_name, errors="replace") as log_file:
+                log_tail = log_file.readlines()[-self.FAILED_COMMAND_LOG_LINES:]
+        except OSError:
+            log_tail = []
+        return (
+            f"Command {result.name} {self._commands[result.name].command} failed with exit code "
+            f"{result.exit_code} after {result.duration_s:.2f} s; its output is in "
+            f"{result.log_file_name}" + (":\n" + "".join(log_tail).rstrip() if log_tail else ""))
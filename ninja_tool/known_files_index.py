@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+KnownFilesIndex: Prefix trie of the paths of the files in the build directory which are known to
+be needed for the build.
+
+The paths are stored component by component, relative to the build directory; absolute paths
+outside of the build directory are ignored. A directory can be added as a whole: it is stored as a
+single subtree marker, so its contents are never listed, and BuildDirectoryScanner skips it without
+descending into it.
+
+Layout of the trie: every node is a dict of the child nodes by the path component. A known file
+without known descendants is stored as the FILE value instead of a dict, a known directory is
+stored as the SUBTREE value (its descendants are dropped). A dict node which is a known file itself
+has the STATE_KEY key, which is never a valid file name.
+"""
+
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+Node = Union[dict, int]
+
+
+class KnownFilesIndex:
+    STATE_KEY = ""
+    FILE = 1
+    SUBTREE = 2
+
+    def __init__(self, build_dir: Path):
+        """
+        :param build_dir: Absolute path of the build directory.
+        :type build_dir: Path
+        """
+
+        build_dir_string = build_dir.as_posix()
+        self._build_dir_prefix = build_dir_string.rstrip("/") + "/"
+        self._build_dir_components = self._split(build_dir_string)
+        self.root: Node = {}
+
+    def add_file(self, path: str) -> None:
+        """Add a file (or any other directory entry which is not a known directory).
+
+        :param path: Path of the file, either absolute or relative to the build directory.
+        :type path: str
+        """
+
+        components = self._get_relative_components(path)
+        if not components:
+            return
+        parent_node = self._get_parent_node(components)
+        if parent_node is None:
+            return
+
+        name = components[-1]
+        node = parent_node.get(name)
+        if node is None:
+            parent_node[name] = self.FILE
+        elif isinstance(node, dict):
+            node[self.STATE_KEY] = self.FILE
+
+    def add_files(self, paths: Iterable[str]) -> None:
+        """Add the files from the iterable (e.g. a generator) without collecting them first.
+
+        :param paths: Paths of the files, either absolute or relative to the build directory.
+        :type paths: Iterable[str]
+        """
+
+        add_file = self.add_file
+        for path in paths:
+            add_file(path)
+
+    def add_directory(self, path: str) -> None:
+        """Add a directory with all its contents.
+
+        :param path: Path of the directory, either absolute or relative to the build directory.
+        :type path: str
+        """
+
+        components = self._get_relative_components(path)
+        if components is None:
+            return
+        if not components:
+            self.root = self.SUBTREE
+            return
+        parent_node = self._get_parent_node(components)
+        if parent_node is not None:
+            parent_node[components[-1]] = self.SUBTREE
+
+    def _get_parent_node(self, components: List[str]) -> Optional[dict]:
+        """Get the node of the parent directory of the path, creating the missing nodes.
+
+        :return: Node of the parent directory, or None if the path is inside a known directory.
+        :rtype: Optional[dict]
+        """
+
+        node = self.root
+        if node == self.SUBTREE:
+            return None
+        for component in components[:-1]:
+            child = node.get(component)
+            if child is None:
+                child = node[component] = {}
+            elif child == self.SUBTREE:
+                return None
+            elif child == self.FILE:
+                child = node[component] = {self.STATE_KEY: self.FILE}
+            node = child
+        return node
+
+    def _get_relative_components(self, path: str) -> Optional[List[str]]:
+        """Split the path the same way as Path(path).relative_to(build_dir).parts does.
+
+        :return: Components of the path relative to the build directory, or None if the path is
+            absolute and is not in the build directory.
+        :rtype: Optional[List[str]]
+        """
+
+        if os.sep != "/":
+            path = path.replace(os.sep, "/")
+        if path.startswith(self._build_dir_prefix):
+            return self._split(path[len(self._build_dir_prefix):])
+        if not os.path.isabs(path):
+            return self._split(path)
+
+        # The path can contain redundant separators or "." components, or differ in case from the
+        # build directory on case-insensitive systems.
+        components = self._split(path)
+        build_dir_component_count = len(self._build_dir_components)
+        if [os.path.normcase(c) for c in components[:build_dir_component_count]] != [
+                os.path.normcase(c) for c in self._build_dir_components]:
+            return None
+        return components[build_dir_component_count:]
+
+    @staticmethod
+    def _split(path: str) -> List[str]:
+        return [component for component in path.split("/") if component and component != "."]
@@ -2,60 +2,71 @@
 
 ## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
 
+import functools
+import heapq
+import mmap
+import os
+import struct
 import subprocess
+import threading
+from array import array
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 
-class NinjaDepsProcessor:
-    NINJA_CALL_TIMEOUT_S = 120
+class PathNormalizer:
+    """Conversion of the paths from the ninja deps to the format used by ninja_tool.
 
-    def __init__(self, build_dir: Path):
-        self._build_dir = build_dir
-        self._build_dir_str = build_dir.as_posix()
-        self._outputs_by_dependencies = {}
+    Dependency paths relative to the build directory are made absolute. The resolved form of
+    every directory is calculated once, and the full paths seen recently are cached, so the
+    thousands of occurrences of the same headers cost a dictionary lookup each. Target paths are
+    converted to the native format without creating Path objects, unless they need normalizing.
+    """
 
-    def load_data(self):
-        deps_data = subprocess.run(
-            ["ninja", "-C", str(self._build_dir), "-t", "deps"],
-            capture_output=True,
-            timeout=self.NINJA_CALL_TIMEOUT_S)
+    FULL_PATH_CACHE_SIZE = 1 << 16
 
-        deps_data.check_returncode()
-        self._parse_ninja_deps_output(deps_data.stdout.decode("utf-8"))
+    def __init__(self, build_dir: Path):
+        self._build_dir_str = build_dir.as_posix()
+        self._resolved_directories: Dict[str, str] = {}
+        self.normalize_dependency = functools.lru_cache(maxsize=self.FULL_PATH_CACHE_SIZE)(
+            self._normalize_dependency)
 
-    def get_dependent_object_files(self, file_path: Path) -> List[str]:
-        return self._outputs_by_dependencies.get(file_path.as_posix(), [])
+    @staticmethod
+    def to_native_path(path: str) -> str:
+        """Get the same string as str(Path(path)).
 
-    def _parse_ninja_deps_output(self, deps_data: str):
-        self._outputs_by_dependencies = {}
+        In build.ninja targets are written in the native format (e.g. with "\\" as a directory
+        separator on Windows), so we have to use the same format everywhere.
+        """
 
-        current_target = None
-        line_number = 0
-        for line in deps_data.splitlines():
-            line_number += 1
-            if not line.startswith(" "):
-                new_current_target = line[0:line.find(": ")]
-                if new_current_target:
-                    # In build.ninja targets are written in the native format (e.g. with "\" as a
-                    # directory separator on Windows), so we have to use the same format
-                    # everywhere.
-                    current_target = str(Path(new_current_target))
-                continue
+        native_path = path if os.sep == "/" else path.replace("/", os.sep)
+        # Path objects are needed only if the path contains redundant separators or "."
+        # components, or a drive (on Windows).
+        if (native_path and not native_path.endswith(os.sep)
+                and not native_path.startswith("." + os.sep)
+                and (os.sep * 2) not in native_path
+                and (os.sep + ".") not in native_path
+                and (os.sep == "/" or ":" not in native_path)):
+            return native_path
 
-            if current_target is None:
-                raise RuntimeError(
-                    f"Unexpected output from \"ninja -t deps\" command in line {line_number}")
+        return str(Path(path))
 
-            file_path_string = self._generate_absolute_file_path_string(line)
-
-            self._outputs_by_dependencies.setdefault(file_path_string, []).append(current_target)
-
-    def _generate_absolute_file_path_string(self, line: str) -> str:
+    def _normalize_dependency(self, line: str) -> str:
         file_name = line.lstrip()
         if file_name[0:3] != "../":
             return file_name
 
+        # Only the leading "../" components are resolved, so the result for the file is the
+        # resolved directory followed by the file name.
+        directory, _, name = file_name.rpartition("/")
+        resolved_directory = self._resolved_directories.get(directory)
+        if resolved_directory is None:
+            resolved_directory = self._resolve_parent_references(f"{directory}/")
+            self._resolved_directories[directory] = resolved_directory
+
+        return resolved_directory + name
+
+    def _resolve_parent_references(self, file_name: str) -> str:
         file_path = f"{self._build_dir_str}/{file_name}"
         start, end = None, None
         i = 0
@@ -77,3 +88,210 @@ class NinjaDepsProcessor:
             return file_path
 
         return f"{file_path[0:start]}/{file_path[end:]}"
+
+
+class NinjaDepsProcessor:
+    NINJA_CALL_TIMEOUT_S = 120
+
+    DEPS_LOG_FILE_NAME = ".ninja_deps"
+
+    # Format of the binary deps log written by ninja (see deps_log.cc in the ninja sources): the
+    # header is followed by the records, each starting with a 32-bit size; the highest bit of the
+    # size is set for the dependency records and is cleared for the path records.
+    _DEPS_LOG_SIGNATURE = b"# ninjadeps\n"
+    _DEPS_LOG_MTIME_SIZE_BY_VERSION = {3: 4, 4: 8}
+    _DEPS_RECORD_FLAG = 0x80000000
+    _INT32 = struct.Struct("<i")
+    _UINT32 = struct.Struct("<I")
+
+    def __init__(self, build_dir: Path):
+        self._build_dir = build_dir
+        self._path_normalizer = PathNormalizer(build_dir)
+        self._outputs_by_dependencies = {}
+        self._is_loaded = False
+
+    def load_data(self):
+        # Read the deps log directly if its format is known; "ninja -t deps" is used otherwise.
+        if not self._load_deps_log(self._build_dir / self.DEPS_LOG_FILE_NAME):
+            self._load_ninja_deps_output()
+        self._is_loaded = True
+
+    def is_loaded(self) -> bool:
+        return self._is_loaded
+
+    def get_dependent_object_files(self, file_path: Path) -> List[str]:
+        return self._outputs_by_dependencies.get(file_path.as_posix(), [])
+
+    def get_statistics(self) -> Dict[str, int]:
+        return {"dependency_files": len(self._outputs_by_dependencies)}
+
+    def get_most_used_dependencies(self, count: int) -> List[Tuple[str, int]]:
+        """Get the files (usually headers) which the largest numbers of the targets (usually
+        object files) implicitly depend on, so their change invalidates the most targets.
+
+        :param count: Maximal number of the returned files.
+        :type count: int
+        :return: Files with the numbers of the dependent targets, in the descending order of the
+            number.
+        :rtype: List[Tuple[str, int]]
+        """
+
+        return [
+            (file_name, len(outputs))
+            for file_name, outputs in heapq.nlargest(
+                count, self._outputs_by_dependencies.items(), key=lambda item: len(item[1]))]
+
+    def _load_deps_log(self, file_name: Path) -> bool:
+        """Build the index from the binary deps log of ninja.
+
+        The paths are interned by ninja itself (every path is written once, and the dependency
+        records refer to it by the index), so every path is converted to the format used in the
+        index only once. As ninja does, the file is read up to the first damaged record (e.g. the
+        one which was being written when ninja was interrupted).
+
+        :return: Whether the file is read; False if it doesn't exist or its format is unknown.
+        :rtype: bool
+        """
+
+        try:
+            with open(file_name, "rb") as file:
+                if file.read(len(self._DEPS_LOG_SIGNATURE)) != self._DEPS_LOG_SIGNATURE:
+                    return False
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        with mapping:
+            records = self._read_deps_log_records(mapping)
+        if records is None:
+            return False
+
+        paths, deps_by_output = records
+
+        target_names: Dict[int, str] = {}
+        dependency_names: Dict[int, str] = {}
+        self._outputs_by_dependencies = {}
+        # The same order as in the output of "ninja -t deps".
+        for output_id in sorted(deps_by_output):
+            target = target_names.get(output_id)
+            if target is None:
+                target = target_names[output_id] = (
+                    self._path_normalizer.to_native_path(paths[output_id]))
+
+            for dependency_id in deps_by_output[output_id]:
+                dependency = dependency_names.get(dependency_id)
+                if dependency is None:
+                    dependency = dependency_names[dependency_id] = (
+                        self._path_normalizer.normalize_dependency(paths[dependency_id]))
+                self._outputs_by_dependencies.setdefault(dependency, []).append(target)
+
+        return True
+
+    def _read_deps_log_records(self, data: mmap.mmap) -> Optional[tuple]:
+        """Read the records of the deps log.
+
+        :return: List of the paths and the latest list of the dependency ids by the output id, or
+            None if the log version is not supported.
+        :rtype: Optional[tuple]
+        """
+
+        position = len(self._DEPS_LOG_SIGNATURE)
+        if len(data) < position + self._INT32.size:
+            return None
+        (version,) = self._INT32.unpack_from(data, position)
+        mtime_size = self._DEPS_LOG_MTIME_SIZE_BY_VERSION.get(version)
+        if mtime_size is None:
+            return None
+        position += self._INT32.size
+
+        paths: List[str] = []
+        deps_by_output: Dict[int, array] = {}
+        unpack_uint32 = self._UINT32.unpack_from
+        data_size = len(data)
+        while position + 4 <= data_size:
+            (size,) = unpack_uint32(data, position)
+            is_deps_record = bool(size & self._DEPS_RECORD_FLAG)
+            size &= ~self._DEPS_RECORD_FLAG
+            record_start = position + 4
+            position = record_start + size
+            if position > data_size or size % 4 != 0:
+                break
+
+            if is_deps_record:
+                if size < 4 + mtime_size:
+                    break
+                (output_id,) = unpack_uint32(data, record_start)
+                dependency_ids = array("I", data[record_start + 4 + mtime_size:position])
+                if output_id >= len(paths) or max(dependency_ids, default=0) >= len(paths):
+                    break
+                # Later records override the earlier ones for the same output.
+                deps_by_output[output_id] = dependency_ids
+            else:
+                if size < 4:
+                    break
+                # The path is padded with zero bytes to the multiple of 4 and followed by the
+                # checksum, which is the bitwise complement of the path index.
+                (checksum,) = unpack_uint32(data, position - 4)
+                if checksum != ~len(paths) & 0xFFFFFFFF:
+                    break
+                path = data[record_start:position - 4].rstrip(b"\0")
+                paths.append(path.decode("utf-8"))
+
+        return paths, deps_by_output
+
+    def _load_ninja_deps_output(self):
+        """Parse the output of "ninja -t deps" while it is being produced, so the output is never
+        stored as a whole.
+        """
+
+        command = ["ninja", "-C", str(self._build_dir), "-t", "deps"]
+        is_timed_out = threading.Event()
+        with subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                encoding="utf-8") as process:
+
+            def kill_process():
+                is_timed_out.set()
+                process.kill()
+
+            # If the process is killed by the timeout, its output ends, so the parsing stops too.
+            watchdog = threading.Timer(self.NINJA_CALL_TIMEOUT_S, kill_process)
+            watchdog.start()
+            try:
+                self._parse_ninja_deps_output(process.stdout)
+                return_code = process.wait()
+            except BaseException:
+                process.kill()
+                raise
+            finally:
+                watchdog.cancel()
+
+        if is_timed_out.is_set():
+            raise subprocess.TimeoutExpired(command, self.NINJA_CALL_TIMEOUT_S)
+        if return_code != 0:
+            raise subprocess.CalledProcessError(return_code, command)
+
+    def _parse_ninja_deps_output(self, deps_data: Iterable[str]):
+        self._outputs_by_dependencies = {}
+
+        to_native_path = self._path_normalizer.to_native_path
+        normalize_dependency = self._path_normalizer.normalize_dependency
+        current_target = None
+        line_number = 0
+        for line in deps_data:
+            line = line.rstrip("\n")
+            line_number += 1
+            if not line.startswith(" "):
+                new_current_target = line[0:line.find(": ")]
+                if new_current_target:
+                    current_target = to_native_path(new_current_target)
+                continue
+
+            if current_target is None:
+                raise RuntimeError(
+                    f"Unexpected output from \"ninja -t deps\" command in line {line_number}")
+
+            file_path_string = normalize_dependency(line)
+            self._outputs_by_dependencies.setdefault(file_path_string, []).append(current_target)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+Queries of the targets of a BuildGraph affected by changed files.
+
+AffectedTargetsQuery: Filters and options of a query.
+
+AffectedTarget: A target found by a query.
+
+The targets are found by a single breadth-first traversal of the reverse dependencies starting from
+the changed nodes, which also gives the distance (the number of the "build" statements) from the
+nearest changed node to every target. The filters are applied to the found targets only, so a
+filtered query costs the same traversal as an unfiltered one plus a constant amount of work per
+found target. The numbers of the changed files the targets depend on are calculated only if they
+are requested, by propagating bitsets of the changed files over the traversed subgraph in the
+topological order.
+"""
+
+import re
+from fnmatch import translate
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+from .build_graph import BuildGraph
+
+_PHONY_RULE = "phony"
+
+
+class AffectedTargetsQuery(NamedTuple):
+    # Glob patterns of the names of the rules producing the targets; empty means any rule.
+    rules: Tuple[str, ...] = ()
+    excluded_rules: Tuple[str, ...] = ()
+    # Glob patterns of the target paths (as they are written in build.ninja); empty means any path.
+    outputs: Tuple[str, ...] = ()
+    excluded_outputs: Tuple[str, ...] = ()
+    # Report only the targets which are not used by any other "build" statement, except for the
+    # phony ones; the outputs of the phony statements themselves are not reported then.
+    top_level_only: bool = False
+    # Maximal distance from the changed files, in "build" statements; None means no limit.
+    max_depth: Optional[int] = None
+    # Calculate the number of the changed files every target depends on.
+    with_counts: bool = False
+
+
+class AffectedTarget(NamedTuple):
+    path: str
+    rule: str
+    # Number of the "build" statements between the nearest changed file and the target.
+    depth: int
+    # Number of the changed files the target depends on; None if it wasn't requested.
+    changed_file_count: Optional[int] = None
+
+
+def find_dependent_nodes(
+        graph: BuildGraph,
+        nodes: Iterable[int],
+        max_depth: Optional[int] = None) -> Tuple[bytearray, List[List[int]]]:
+    """Find all the nodes which depend on any of the given nodes, directly or transitively.
+
+    :param graph: Finalized build graph.
+    :type graph: BuildGraph
+    :param nodes: Nodes to start from.
+    :type nodes: Iterable[int]
+    :param max_depth: Maximal number of the "build" statements between a given node and a found
+        one; None means no limit.
+    :type max_depth: Optional[int]
+    :return: Flags of the found nodes, indexed by the node id, and the found nodes grouped by the
+        distance from the given nodes: the first list contains the nodes at the distance 1. The
+        given nodes are found only if they depend on some of the given nodes themselves.
+    :rtype: Tuple[bytearray, List[List[int]]]
+    """
+
+    consumers = graph.consumers
+    edge_outputs = graph.edge_outputs
+    dependent_nodes = bytearray(graph.node_count)
+    levels = []
+    current_level = list(set(nodes))
+    while current_level and (max_depth is None or len(levels) < max_depth):
+        next_level = []
+        for node in current_level:
+            for edge in consumers(node):
+                for output in edge_outputs(edge):
+                    if not dependent_nodes[output]:
+                        dependent_nodes[output] = 1
+                        next_level.append(output)
+        if next_level:
+            levels.append(next_level)
+        current_level = next_level
+
+    return dependent_nodes, levels
+
+
+def query_affected_targets(
+        graph: BuildGraph,
+        changed_node_groups: Sequence[Sequence[int]],
+        query: AffectedTargetsQuery) -> List[AffectedTarget]:
+    """Find the targets affected by the changed files and filter them.
+
+    :param graph: Finalized build graph.
+    :type graph: BuildGraph
+    :param changed_node_groups: Nodes of every changed file: the node of the file itself (if it's
+        in the graph) and the nodes of the files which depend on it implicitly (e.g. the object
+        files of the sources including a changed header).
+    :type changed_node_groups: Sequence[Sequence[int]]
+    :param query: Filters and options.
+    :type query: AffectedTargetsQuery
+    :return: Found targets, sorted by the number of the changed files they depend on (if it's
+        requested) in the descending order, then by the depth and by the path.
+    :rtype: List[AffectedTarget]
+    """
+
+    changed_nodes = {node for group in changed_node_groups for node in group}
+    # The counts must include the changed files reachable by the paths longer than max_depth, so
+    # the depth limit is applied after the traversal then.
+    dependent_nodes, levels = find_dependent_nodes(
+        graph, changed_nodes, max_depth=None if query.with_counts else query.max_depth)
+    counts = (
+        _count_changed_files(graph, changed_node_groups, changed_nodes, levels)
+        if query.with_counts else {})
+    if query.max_depth is not None:
+        del levels[query.max_depth:]
+
+    paths = graph.paths
+    rules = graph.rules
+    edge_rules = graph.edge_rules
+    producers = graph.node_producers
+    consumers = graph.consumers
+    # There are few rules, so the rule filter is applied once per rule.
+    rule_filter = _make_filter(query.rules, query.excluded_rules)
+    accepted_rules = [rule_filter is None or rule_filter(rule) for rule in rules]
+    phony_rules = [rule == _PHONY_RULE for rule in rules]
+    output_filter = _make_filter(query.outputs, query.excluded_outputs)
+    is_filtered = rule_filter is not None or output_filter is not None or query.top_level_only
+
+    result = []
+    for depth, level in enumerate(levels, 1):
+        if is_filtered:
+            selected_nodes = []
+            for node in level:
+                rule = edge_rules[producers[node]]
+                if not accepted_rules[rule]:
+                    continue
+                if query.top_level_only and (phony_rules[rule] or not all(
+                        phony_rules[edge_rules[edge]] for edge in consumers(node))):
+                    continue
+                if output_filter is not None and not output_filter(paths[node]):
+                    continue
+                selected_nodes.append(node)
+        else:
+            selected_nodes = level
+        selected_nodes.sort(key=paths.__getitem__)
+        result.extend(
+            AffectedTarget(paths[node], rules[edge_rules[producers[node]]], depth, counts.get(node))
+            for node in selected_nodes)
+
+    if query.with_counts:
+        # The sort is stable, so the targets with the same count remain ordered by the depth and
+        # the path.
+        result.sort(key=lambda target: -target.changed_file_count)
+    return result
+
+
+def _make_filter(included: Sequence[str], excluded: Sequence[str]):
+    """Make a predicate accepting the strings matching any of the included glob patterns (or any
+    strings if there are none) and none of the excluded ones; None if there are no patterns.
+    """
+
+    if not included and not excluded:
+        return None
+    included_re = _compile_patterns(included)
+    excluded_re = _compile_patterns(excluded)
+    return lambda value: (
+        (included_re is None or included_re.match(value) is not None) and
+        (excluded_re is None or excluded_re.match(value) is None))
+
+
+def _compile_patterns(patterns: Sequence[str]) -> Optional[Pattern]:
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{translate(pattern)})" for pattern in patterns))
+
+
+def _count_changed_files(
+        graph: BuildGraph,
+        changed_node_groups: Sequence[Sequence[int]],
+        changed_nodes: set,
+        levels: List[List[int]]) -> Dict[int, int]:
+    """Calculate the number of the changed files every found node depends on. The levels must
+    contain all the nodes depending on the changed ones (the traversal must not be limited).
+
+    Every changed file is a bit of the bitsets (Python ints) of the nodes; the bitset of a node is
+    the union of the bitsets of its dependencies, so the nodes are processed in the topological
+    order of the traversed subgraph (Kahn's algorithm). The build graph is acyclic (ninja rejects
+    the cyclic ones), so every node of the subgraph is processed.
+    """
+
+    consumers = graph.consumers
+    edge_outputs = graph.edge_outputs
+    bits: Dict[int, int] = {}
+    for index, group in enumerate(changed_node_groups):
+        for node in group:
+            bits[node] = bits.get(node, 0) | (1 << index)
+
+    subgraph_nodes = changed_nodes.union(*levels)
+    # Number of the not yet processed dependencies of the node within the subgraph.
+    pending_dependency_counts: Dict[int, int] = {}
+    for node in subgraph_nodes:
+        for edge in consumers(node):
+            for output in edge_outputs(edge):
+                pending_dependency_counts[output] = pending_dependency_counts.get(output, 0) + 1
+
+    ready_nodes = [node for node in changed_nodes if node not in pending_dependency_counts]
+    while ready_nodes:
+        node = ready_nodes.pop()
+        node_bits = bits.get(node, 0)
+        for edge in consumers(node):
+            for output in edge_outputs(edge):
+                bits[output] = bits.get(output, 0) | node_bits
+                pending_dependency_counts[output] -= 1
+                if pending_dependency_counts[output] == 0:
+                    ready_nodes.append(output)
+
+    return {node: bin(bits.get(node, 0)).count("1") for level in levels for node in level}
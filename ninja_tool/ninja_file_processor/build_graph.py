@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+BuildGraph: Compact representation of the dependency graph described by a "build.ninja" file.
+
+Every path is interned into the path table once and is referenced everywhere else by its integer
+node id. Edges ("build" statements) are referenced by integer edge ids. Outputs and inputs of the
+edges, as well as the reverse (node -> consuming edges) relation, are stored in flat arrays in the
+CSR (compressed sparse row) layout: e.g. the outputs of the edge i are
+`output_nodes[output_offsets[i]:output_offsets[i + 1]]`.
+
+Validations ("|@" paths) are kept apart from the inputs: ninja builds them together with the edge,
+but the edge doesn't wait for them, so they are neither dependencies of the edge nor consumers of
+its outputs, and following them would make cycles (a validation usually depends on the outputs of
+the edge it validates).
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+
+class BuildGraph:
+    """Build graph with interned paths. The graph is filled by add_edge() calls and must be
+    finalized by finalize() before the reverse relation (consumers()) can be queried.
+    """
+
+    NO_EDGE = -1
+
+    _PHONY_RULE = "phony"
+
+    def __init__(self) -> None:
+        self.paths: List[str] = []
+        self._node_ids = {}
+        self.rules: List[str] = []
+        self._rule_ids = {}
+
+        # Per-edge data.
+        self.edge_lines = array("q")
+        self.edge_rules = array("i")
+        self.edge_fingerprints = array("Q")
+        self.output_offsets = array("q", [0])
+        self.implicit_output_starts = array("q")
+        self.input_offsets = array("q", [0])
+        self.implicit_input_starts = array("q")
+        self.order_only_input_starts = array("q")
+        self.validation_offsets = array("q", [0])
+
+        # Concatenated output, input and validation lists of all the edges.
+        self.output_nodes = array("i")
+        self.input_nodes = array("i")
+        self.validation_nodes = array("i")
+
+        # Per-node data; filled by finalize().
+        self.node_producers = array("i")
+        self.consumer_offsets = array("q", [0])
+        self.consumer_edges = array("i")
+
+    def __getstate__(self) -> dict:
+        # The path -> id maps are restored from the tables, so they are not pickled.
+        state = self.__dict__.copy()
+        del state["_node_ids"]
+        del state["_rule_ids"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._node_ids = {path: node for node, path in enumerate(self.paths)}
+        self._rule_ids = {rule: rule_id for rule_id, rule in enumerate(self.rules)}
+
+    @property
+    def node_count(self) -> int:
+        return len(self.paths)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_lines)
+
+    def intern(self, path: str) -> int:
+        node = self._node_ids.get(path)
+        if node is None:
+            node = len(self.paths)
+            self._node_ids[path] = node
+            self.paths.append(path)
+        return node
+
+    def _intern_rule(self, rule: str) -> int:
+        rule_id = self._rule_ids.get(rule)
+        if rule_id is None:
+            rule_id = len(self.rules)
+            self._rule_ids[rule] = rule_id
+            self.rules.append(rule)
+        return rule_id
+
+    def node_id(self, path: str) -> Optional[int]:
+        return self._node_ids.get(path)
+
+    def add_edge(self,
+            line_index: int,
+            rule: str,
+            outputs: Iterable[str],
+            implicit_outputs: Iterable[str],
+            dependencies: Iterable[str],
+            implicit_dependencies: Iterable[str],
+            order_only_dependencies: Iterable[str],
+            validations: Iterable[str] = (),
+            fingerprint: int = 0) -> int:
+        """Add an edge to the graph.
+
+        :param validations: Paths built together with the edge ("|@" paths); they are nodes of
+            the graph, but not inputs of the edge.
+        :type validations: Iterable[str]
+        :param fingerprint: 64-bit hash of the edge definition; used to detect the changed edges
+            when the graph is compared with the previous version of it.
+        :type fingerprint: int
+        :return: Id of the added edge.
+        :rtype: int
+        """
+
+        intern = self.intern
+        self.edge_lines.append(line_index)
+        self.edge_rules.append(self._intern_rule(rule))
+        self.edge_fingerprints.append(fingerprint)
+
+        self.output_nodes.extend(intern(p) for p in outputs)
+        self.implicit_output_starts.append(len(self.output_nodes))
+        self.output_nodes.extend(intern(p) for p in implicit_outputs)
+        self.output_offsets.append(len(self.output_nodes))
+
+        self.input_nodes.extend(intern(p) for p in dependencies)
+        self.implicit_input_starts.append(len(self.input_nodes))
+        self.input_nodes.extend(intern(p) for p in implicit_dependencies)
+        self.order_only_input_starts.append(len(self.input_nodes))
+        self.input_nodes.extend(intern(p) for p in order_only_dependencies)
+        self.input_offsets.append(len(self.input_nodes))
+
+        self.validation_nodes.extend(intern(p) for p in validations)
+        self.validation_offsets.append(len(self.validation_nodes))
+
+        return len(self.edge_lines) - 1
+
+    def merge(self, other: "BuildGraph", line_offset: int) -> None:
+        """Append all the edges of the other (not finalized) graph to this one.
+
+        :param other: Graph to merge; its node and rule ids are translated to the ids of this graph.
+        :type other: BuildGraph
+        :param line_offset: Value to add to the line indexes of the merged edges.
+        :type line_offset: int
+        """
+
+        node_map = [self.intern(path) for path in other.paths]
+        rule_map = [self._intern_rule(rule) for rule in other.rules]
+
+        self.edge_lines.extend(line + line_offset for line in other.edge_lines)
+        self.edge_rules.extend(map(rule_map.__getitem__, other.edge_rules))
+        self.edge_fingerprints.extend(other.edge_fingerprints)
+
+        output_offset = len(self.output_nodes)
+        self.implicit_output_starts.extend(
+            start + output_offset for start in other.implicit_output_starts)
+        self.output_offsets.extend(
+            offset + output_offset for offset in other.output_offsets[1:])
+        self.output_nodes.extend(map(node_map.__getitem__, other.output_nodes))
+
+        input_offset = len(self.input_nodes)
+        self.implicit_input_starts.extend(
+            start + input_offset for start in other.implicit_input_starts)
+        self.order_only_input_starts.extend(
+            start + input_offset for start in other.order_only_input_starts)
+        self.input_offsets.extend(offset + input_offset for offset in other.input_offsets[1:])
+        self.input_nodes.extend(map(node_map.__getitem__, other.input_nodes))
+
+        validation_offset = len(self.validation_nodes)
+        self.validation_offsets.extend(
+            offset + validation_offset for offset in other.validation_offsets[1:])
+        self.validation_nodes.extend(map(node_map.__getitem__, other.validation_nodes))
+
+    def finalize(self) -> None:
+        """Build the per-node producer and consumer indexes."""
+
+        node_count = self.node_count
+
+        # If several edges have the same output, the last one wins.
+        producers = array("i", [self.NO_EDGE]) * node_count
+        output_offsets = self.output_offsets
+        output_nodes = self.output_nodes
+        for edge in range(self.edge_count):
+            for i in range(output_offsets[edge], output_offsets[edge + 1]):
+                producers[output_nodes[i]] = edge
+        self.node_producers = producers
+
+        # Counting sort of the (input node, edge) pairs by the input node.
+        input_offsets = self.input_offsets
+        input_nodes = self.input_nodes
+        consumer_counts = array("q", [0]) * (node_count + 1)
+        for node in input_nodes:
+            consumer_counts[node + 1] += 1
+        for node in range(node_count):
+            consumer_counts[node + 1] += consumer_counts[node]
+        self.consumer_offsets = array("q", consumer_counts)
+
+        consumer_edges = array("i", [0]) * len(input_nodes)
+        insert_positions = consumer_counts
+        for edge in range(self.edge_count):
+            for i in range(input_offsets[edge], input_offsets[edge + 1]):
+                node = input_nodes[i]
+                consumer_edges[insert_positions[node]] = edge
+                insert_positions[node] += 1
+        self.consumer_edges = consumer_edges
+
+    def fingerprints_by_output(self) -> Dict[str, int]:
+        """Get the fingerprints of the edges by the first output path of the edge, so the edges of
+        two graphs can be compared without keeping both graphs in memory.
+        """
+
+        paths = self.paths
+        output_nodes = self.output_nodes
+        output_offsets = self.output_offsets
+        return {
+            paths[output_nodes[output_offsets[edge]]]: fingerprint
+            for edge, fingerprint in enumerate(self.edge_fingerprints)
+            if output_offsets[edge] != output_offsets[edge + 1]}
+
+    def producer(self, node: int) -> int:
+        return self.node_producers[node]
+
+    def consumers(self, node: int) -> array:
+        return self.consumer_edges[self.consumer_offsets[node]:self.consumer_offsets[node + 1]]
+
+    def edge_outputs(self, edge: int) -> array:
+        return self.output_nodes[self.output_offsets[edge]:self.output_offsets[edge + 1]]
+
+    def edge_inputs(self, edge: int) -> array:
+        return self.input_nodes[self.input_offsets[edge]:self.input_offsets[edge + 1]]
+
+    def edge_explicit_inputs(self, edge: int) -> array:
+        return self.input_nodes[self.input_offsets[edge]:self.implicit_input_starts[edge]]
+
+    def edge_validations(self, edge: int) -> array:
+        return self.validation_nodes[
+            self.validation_offsets[edge]:self.validation_offsets[edge + 1]]
+
+    def edge_rule(self, edge: int) -> str:
+        return self.rules[self.edge_rules[edge]]
+
+    def is_phony(self, edge: int) -> bool:
+        return self.rules[self.edge_rules[edge]] == self._PHONY_RULE
@@ -7,16 +7,27 @@ BuildNinjaFileProcessor: The class for processing ninja file, containing targets
 """
 
 import re
+import zlib
 from collections import namedtuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Tuple, Set
-
+from typing import Dict, Iterable, Iterator, List, Set
+
+from .affected_targets_query import (
+    AffectedTarget,
+    AffectedTargetsQuery,
+    find_dependent_nodes,
+    query_affected_targets)
+from .build_graph import BuildGraph
+from .file_writer import FsyncPolicy
+from .graph_analysis import GraphAnalysisReport, analyze_graph
 from .ninja_file_processor import (
     NinjaFileProcessor,
     NinjaFileProcessorParseError,
     Line,
     LineType)
+from .patch_state import PatchState, PatchStateData
+from .transitive_closure import collect_transitive_dependencies
 
 
 CommandLineData = namedtuple('CommandLineData', 'command')
@@ -30,6 +41,8 @@ class BuildLineData:
     dependencies: list
     implicit_dependencies: list
     order_only_dependencies: list
+    # Validations ("|@" section) are built along with the outputs but are not their dependencies.
+    validations: list = field(default_factory=list)
 
     def all_dependencies(self) -> set:
         return (set(self.dependencies) | set(self.implicit_dependencies) |
@@ -37,182 +50,200 @@ class BuildLineData:
 
 
 class BuildNinjaFileProcessor(NinjaFileProcessor):
-    BuildResults = namedtuple('BuildReulsts', 'outputs, implicit_outputs')
-    BuildSources = namedtuple(
-        'BuildSources', 'command dependencies implicit_dependencies order_only_dependencies')
+    # Escape sequences which can hide separators in a "build" statement, and the placeholders
+    # substituted for them while the statement is split. Replacing "$$" first makes every "$" left
+    # afterwards the first symbol of an escape pair, the same way the ninja lexer reads the
+    # statement from left to right. Line continuations ("$" + newline) become plain spaces.
+    _ESCAPE_PLACEHOLDERS = (
+        ("$$", "\x00"), ("$ ", "\x01"), ("$:", "\x02"), ("$\r\n", " "), ("$\n", " "))
 
-    # Trailing "$" symbols.
-    _ESCAPE_SYMBOLS_RE = re.compile(r".+(\$+)$")
+    # Values of the "COMMAND" and "depfile" variables of a "build" statement.
+    _VARIABLE_RE = re.compile(r"\s+(?P<parameter>COMMAND|depfile)\s*=\s*(?P<value>.+)")
 
-    # Universal regex for parsing specific build.ninja syntax.
-    _LINE_RE = re.compile(r"\s+(?P<parameter>COMMAND|depfile)\s*=\s*(?P<value>.+)"
-        r"|include\s+(?P<rules_file_name>.*rules.ninja)\s*"
-        r"|build\s+(?P<build_line>.+)")
+    _INCLUDE_RE = re.compile(r"include\s+(?P<rules_file_name>.*rules.ninja)\s*")
 
     _MOCARG_RE = re.compile(r'.*moc(?:.exe)? @([^"]+)')
 
-    def __init__(self, file_name: Path, build_directory: Path, debug_output: bool = False) -> None:
-        self._line_number_by_output = {}
-        self._outputs_by_dependencies = {}
+    _LINE_OF_INTEREST_RE = re.compile(rb"^(?:build |include|[ \t]+(?:COMMAND|depfile))", re.M)
+
+    def __init__(self,
+            file_name: Path,
+            build_directory: Path,
+            debug_output: bool = False,
+            cache_file_name: Path = None,
+            parse_jobs: int = 1,
+            memory_mapped: bool = False,
+            patch_state_file_name: Path = None,
+            fingerprint_file_name: Path = None,
+            fsync_policy: FsyncPolicy = FsyncPolicy.NONE,
+            read_only: bool = False) -> None:
+        self._graph = BuildGraph()
         self._rules_file_name = Path("")
+        self._patch_state = (
+            PatchState(patch_state_file_name) if patch_state_file_name is not None else None)
         super().__init__(
-            file_name=file_name, build_directory=build_directory, debug_output=debug_output)
-
-    def _parse_line(self, line: str) -> Line:  # pylint:disable=inconsistent-return-statements
-        match = self._LINE_RE.match(line)
+            file_name=file_name,
+            build_directory=build_directory,
+            debug_output=debug_output,
+            cache_file_name=cache_file_name,
+            parse_jobs=parse_jobs,
+            memory_mapped=memory_mapped,
+            fingerprint_file_name=fingerprint_file_name,
+            fsync_policy=fsync_policy,
+            read_only=read_only)
+
+    def _reset_data(self) -> None:
+        super()._reset_data()
+        self._graph = BuildGraph()
+        self._rules_file_name = Path("")
 
-        if match is None:
-            return Line(raw=line, parsed=None, type=LineType.UNKNOWN)
+    def _parse_line(self, line: str) -> Line:
+        # Dispatch by the first characters of the line, so only the lines which can contain
+        # something interesting are matched against the regular expressions.
+        if line.startswith("build "):
+            parsed_build_data = self._parse_build_line(line[len("build "):])
+            return Line(raw=line, parsed=parsed_build_data, type=LineType.BUILD)
+
+        if line.startswith((" ", "\t")):
+            if line.lstrip().startswith(("COMMAND", "depfile")):
+                match = self._VARIABLE_RE.match(line)
+                if match is not None:
+                    if match['parameter'] == 'COMMAND':
+                        return Line(raw=line, parsed=match['value'], type=LineType.COMMAND)
+                    return Line(raw=line, parsed=match['value'], type=LineType.DEPFILE)
+
+        elif line.startswith("include"):
+            match = self._INCLUDE_RE.match(line)
+            if match is not None:
+                return Line(raw=line, parsed=match['rules_file_name'], type=LineType.INCLUDE)
+
+        return Line(raw=line, parsed=None, type=LineType.UNKNOWN)
+
+    def _consume_line_object(self, line_object: Line) -> Line:
+        if line_object.type == LineType.BUILD:
+            # Build line data is stored in the graph only.
+            line_data = line_object.parsed
+            self._graph.add_edge(
+                line_index=len(self._lines),
+                rule=line_data.command,
+                outputs=line_data.outputs,
+                implicit_outputs=line_data.implicit_outputs,
+                dependencies=line_data.dependencies,
+                implicit_dependencies=line_data.implicit_dependencies,
+                order_only_dependencies=line_data.order_only_dependencies,
+                validations=line_data.validations,
+                # The fingerprints are used only for patching.
+                fingerprint=0 if self._read_only else self._get_fingerprint(line_object.raw))
+            return line_object._replace(parsed=None)
+
+        if line_object.type == LineType.INCLUDE:
+            self._rules_file_name = Path(line_object.parsed)
 
-        if match['build_line']:
-            parsed_build_data = self._parse_build_line(match['build_line'])
-            return Line(
-                    raw=line,
-                    parsed=parsed_build_data,
-                    type=LineType.BUILD)
+        return line_object
 
-        if match['parameter'] == 'COMMAND':
-            return Line(raw=line, parsed=match['value'], type=LineType.COMMAND)
+    @staticmethod
+    def _get_fingerprint(line: str) -> int:
+        # Two fast checksums of the statement text make a 64-bit fingerprint.
+        data = line.encode()
+        return zlib.crc32(data) << 32 | zlib.adler32(data)
 
-        if match['parameter'] == 'depfile':
-            return Line(raw=line, parsed=match['value'], type=LineType.DEPFILE)
+    def _finish_loading(self) -> None:
+        self._graph.finalize()
 
-        if match['rules_file_name']:
-            return Line(raw=line, parsed=match['rules_file_name'], type=LineType.INCLUDE)
+    def _get_cached_state(self) -> dict:
+        return {
+            **super()._get_cached_state(),
+            "graph": self._graph,
+            "rules_file_name": self._rules_file_name,
+        }
 
-        assert False, "Parsing regex error for line {line!r}"
+    def _restore_cached_state(self, state: dict) -> None:
+        super()._restore_cached_state(state)
+        self._graph = state["graph"]
+        self._rules_file_name = state["rules_file_name"]
 
-    def _consume_line_object(self, line_object: Line) -> None:
-        if line_object.type == LineType.BUILD:
-            line_data = line_object.parsed
-            # Add explicit and implicit outputs to output to line number map.
-            current_outputs = {*line_data.outputs, *line_data.implicit_outputs}
-            for output in current_outputs:
-                self._line_number_by_output[output] = len(self._lines)
-            for dependency in line_data.all_dependencies():
-                self._outputs_by_dependencies.setdefault(dependency, set()).update(current_outputs)
-
-        elif line_object.type == LineType.INCLUDE:
-            self._rules_file_name = Path(line_object.parsed)
+    def _merge_chunk_state(self, state: dict) -> None:
+        self._graph.merge(state["graph"], line_offset=len(self._lines))
+        if state["rules_file_name"] != Path(""):
+            self._rules_file_name = state["rules_file_name"]
+        super()._merge_chunk_state(state)
 
     def _parse_build_line(self, build_line: str) -> BuildLineData:
-        try:
-            results, sources = self._split_build_line(build_line.rstrip())
-        except ValueError:
-            raise NinjaFileProcessorParseError(
-                self, f"invalid \"build\" line {build_line!r}.") from None
-
-        build_results = self._parse_build_results_string(results)
-        build_sources = self._parse_build_sources_string(sources)
-
-        return BuildLineData(
-            outputs=build_results.outputs,
-            implicit_outputs=build_results.implicit_outputs,
-            command=build_sources.command,
-            dependencies=build_sources.dependencies,
-            implicit_dependencies=build_sources.implicit_dependencies,
-            order_only_dependencies=build_sources.order_only_dependencies)
-
-    def _split_build_line(self, line: str) -> Tuple[str, str]:
-        """Splits build line into "results" and "sources" parts.
-
-        :param line: Source line.
-        :type line: str
+        """Parses the "build" statement (without the "build" keyword).
+
+        Escape sequences are masked with placeholders, so the statement is split by the
+        separators with the str methods only, without the regular expressions and re-joining of
+        the tokens. Placeholders are restored in the resulting paths. As in ninja, only the space
+        separates the paths; other whitespace symbols (e.g. tabs) are parts of the paths.
+
+        :param build_line: "build" statement, possibly containing line continuations.
+        :type build_line: str
         :raises NinjaFileProcessorParseError: Bad build line format.
-        :return: "results" and "sources" parts.
-        :rtype: Tuple[str, str]
+        :return: Parsed "build" statement.
+        :rtype: BuildLineData
         """
 
-        tokens = line.split(':')
-        if len(tokens) < 2:
-            raise NinjaFileProcessorParseError(self, f"invalid \"build\" line {line!r}.")
-
-        [results, sources] = (tokens.pop(0), "")
-
-        # This is needed because the ":" symbol (field separator) can be escaped by an odd number
-        # of "$" symbols. So we go through all tokens and check - if the previous one ends with the
-        # odd number of escaping symbols, then the new one is not a separate token but is a
-        # continuation of the previous one (and, by transitivity, is a continuation of the
-        # "results" part). Once we find the first separate token, we stop and consider all
-        # remaining tokens to be the "sources" part.
-        while tokens:
-            token = tokens.pop(0)
-            if results.endswith('$'):
-                match = self._ESCAPE_SYMBOLS_RE.match(results)
-                if len(match[1]) % 2 == 1:
-                    results += f":{token}"
-                    continue
-            sources = token + (':' if tokens else '')
-            break
-
-        sources += ':'.join(tokens)
-        if not sources:
-            raise NinjaFileProcessorParseError(self, f"invalid \"build\" line {line!r}.")
-
-        return results, sources.lstrip()
-
-    def _parse_build_results_string(self, results: str) -> BuildResults:  # pylint:disable=undefined-variable
-        explicit_raw, has_implicit, implicit_raw = results.partition("|")
-        if "|" in implicit_raw:
-            raise NinjaFileProcessorParseError(self, f"invalid outputs list {results!r}.")
-
-        explicit_outputs = self._tokenize(explicit_raw)
-        implicit_outputs = self._tokenize(implicit_raw) if has_implicit else []
-
-        return self.BuildResults(outputs=explicit_outputs, implicit_outputs=implicit_outputs)
-
-    def _parse_build_sources_string(self, sources: str) -> BuildSources:  # pylint:disable=undefined-variable
-        normal_raw, has_order_only, order_only_raw = sources.partition("||")
-        explicit_raw, has_implicit, implicit_raw = normal_raw.partition("|")
-
-        # Check the line validity.
-        if "|" in implicit_raw:
-            raise NinjaFileProcessorParseError(self, f"invalid dependencies list {sources!r}.")
-
-        if "||" in order_only_raw:
-            raise NinjaFileProcessorParseError(self,
-                f"invalid order only dependencies list {sources!r}.")
+        has_escapes = "$" in build_line
+        statement = build_line
+        if has_escapes:
+            for escape_sequence, placeholder in self._ESCAPE_PLACEHOLDERS:
+                statement = statement.replace(escape_sequence, placeholder)
 
-        # Tokenize explicit dependencies and check its validity.
-        explicit_dependencies = self._tokenize(explicit_raw)
-        if not explicit_dependencies:
-            raise NinjaFileProcessorParseError(self, "command not found in \"build\" line.")
+        statement = statement.rstrip("\r\n")
+        results, has_colon, sources = statement.partition(":")
+        if not has_colon or ":" in sources:
+            raise NinjaFileProcessorParseError(self, f"invalid \"build\" line {build_line!r}.")
 
-        # First token in explicit dependencies is actually a command, not dependency.
-        command = explicit_dependencies.pop(0)
+        explicit_outputs, _, implicit_outputs = results.partition("|")
+        if "|" in implicit_outputs:
+            raise NinjaFileProcessorParseError(self, f"invalid outputs list {build_line!r}.")
 
-        # Tokenize other dependencies.
-        implicit_dependencies = self._tokenize(implicit_raw) if has_implicit else []
-        order_only_dependencies = self._tokenize(order_only_raw) if has_order_only else []
+        sources, _, validations = sources.partition("|@")
+        if "|" in validations:
+            raise NinjaFileProcessorParseError(self, f"invalid validations list {build_line!r}.")
 
-        return self.BuildSources(
-            command=command,
-            dependencies=explicit_dependencies,
-            implicit_dependencies=implicit_dependencies,
-            order_only_dependencies=order_only_dependencies)
+        normal_sources, _, order_only_dependencies = sources.partition("||")
+        if "|" in order_only_dependencies:
+            raise NinjaFileProcessorParseError(self,
+                f"invalid order only dependencies list {build_line!r}.")
 
-    @classmethod
-    def _tokenize(cls, line: str) -> list:
-        tokens = []
+        explicit_dependencies, _, implicit_dependencies = normal_sources.partition("|")
+        if "|" in implicit_dependencies:
+            raise NinjaFileProcessorParseError(self, f"invalid dependencies list {build_line!r}.")
 
-        for token in line.split(' '):
-            if not token:
-                continue
+        # First token in explicit dependencies is actually a command, not dependency.
+        split = self._split_escaped if has_escapes else self._split
+        command, *dependencies = split(explicit_dependencies) or [None]
+        line_data = BuildLineData(
+            outputs=split(explicit_outputs),
+            implicit_outputs=split(implicit_outputs),
+            command=command,
+            dependencies=dependencies,
+            implicit_dependencies=split(implicit_dependencies),
+            order_only_dependencies=split(order_only_dependencies),
+            validations=split(validations))
 
-            if not tokens or not tokens[-1].endswith('$'):
-                tokens.append(token)
-                continue
+        if command is None:
+            raise NinjaFileProcessorParseError(self, "command not found in \"build\" line.")
+
+        return line_data
 
-            # This is needed because the " " symbol (field separator) can be escaped by an odd
-            # number of the "$" symbols. So we check the previous token, and if it ends with an odd
-            # number of escaping symbols, then the new token is not a separate token but is a
-            # continuation of the previous one. Thus we should concatenate these tokens instead of
-            # adding a new token to the list.
-            match = cls._ESCAPE_SYMBOLS_RE.match(tokens[-1])
-            if len(match[1]) % 2 == 1:
-                tokens[-1] += f" {token}"
+    @staticmethod
+    def _split(part: str) -> list:
+        part = part.strip(" ")
+        if not part:
+            return []
+        if "  " in part:
+            return [token for token in part.split(" ") if token]
+        # The paths are usually separated by single spaces, so there are no empty tokens.
+        return part.split(" ")
 
-        return tokens
+    @classmethod
+    def _split_escaped(cls, part: str) -> list:
+        # Restore the escape sequences masked with _ESCAPE_PLACEHOLDERS.
+        return [
+            token.replace("\x00", "$$").replace("\x01", "$ ").replace("\x02", "$:")
+            for token in cls._split(part)]
 
     def strengthen_dependencies(self, targets: set) -> None:
         """Patch build.ninja file so the targets from the "targets" set become immediately
@@ -222,60 +253,104 @@ class BuildNinjaFileProcessor(NinjaFileProcessor):
         targets (set): Set of the targets to be patched.
         """
 
+        self._check_writable("patch")
         escaped_targets = self._escape_set(targets)
-        for target in escaped_targets:
-            transitive_dependencies = self._collect_transitive_dependencies(target)
+        if self._patch_state is not None:
+            transitive_dependencies_by_target = (
+                self._collect_transitive_dependencies_incrementally(escaped_targets))
+        else:
+            transitive_dependencies_by_target = (
+                self._collect_transitive_dependencies(escaped_targets))
+
+        for target, transitive_dependencies in transitive_dependencies_by_target.items():
             self._replace_target(target,
                 implicit_dependencies=transitive_dependencies,
                 order_only_dependencies=[])
 
         self._is_patch_applied = True  # pylint:disable=attribute-defined-outside-init
 
-    def _get_target_line_by_name(self, target: str) -> Line:
-        target_line_idx = self._line_number_by_output.get(target, None)
-        if target_line_idx is None:
-            return None
-
-        return self._lines[target_line_idx]
-
-    @classmethod
-    def _is_target_phony(cls, target_line: Line) -> bool:
-        assert target_line.type == LineType.BUILD, (
-            "Error in logic: trying to check if target is phony for the line with the wrong type.")
-        return target_line.parsed.command == "phony"
-
-    def _collect_transitive_dependencies(self, target: str) -> set:
-        """Recursively gets all the dependencies that are targets themselves."""
-
-        transitive_dependencies = set()
-        target_line = self._get_target_line_by_name(target)
-        first_target_data = target_line.parsed
-        unchecked_targets = list(first_target_data.all_dependencies())
-
-        while unchecked_targets:
-            current_target = unchecked_targets.pop()
-            if current_target in transitive_dependencies:
-                continue
-
-            current_target_line = self._get_target_line_by_name(current_target)
-            if current_target_line is None:
-                continue
-
-            transitive_dependencies.add(current_target)
+    def _collect_transitive_dependencies_incrementally(
+            self, targets: Set[str]) -> Dict[str, List[str]]:
+        """Collect the transitive dependencies of the targets, reusing the ones stored by the
+        previous patching for the targets which dependency subgraphs haven't changed since then.
+
+        An edge is changed if its fingerprint differs from the stored one, or if it was added or
+        removed. If none of the nodes reachable from the target is an output of a changed edge,
+        all the edges reachable from the target are the same as before, so the stored result is
+        still valid. Such targets are found by the reverse traversal from the outputs of the
+        changed edges, so the cost of the check depends on the size of the change, not on the size
+        of the graph.
+        """
 
-            current_target_data = current_target_line.parsed
-            unchecked_targets.extend(list(current_target_data.all_dependencies()))
+        graph = self._graph
+        edge_fingerprints = graph.fingerprints_by_output()
+        previous_state = self._patch_state.load()
+        if previous_state is not None:
+            previous_fingerprints = previous_state.edge_fingerprints
+            changed_outputs = [
+                output for output, fingerprint in edge_fingerprints.items()
+                if previous_fingerprints.get(output) != fingerprint]
+            changed_outputs.extend(
+                output for output in previous_fingerprints if output not in edge_fingerprints)
+            changed_output_nodes = [
+                node for node in map(graph.node_id, changed_outputs) if node is not None]
+            changed_nodes, _ = find_dependent_nodes(graph, changed_output_nodes)
+            for node in changed_output_nodes:
+                changed_nodes[node] = 1
+            reusable_dependencies = previous_state.transitive_dependencies
+        else:
+            changed_nodes = bytearray(graph.node_count)
+            reusable_dependencies = {}
+
+        result = {}
+        changed_targets = set()
+        for target in targets:
+            node = graph.node_id(target)
+            if target in reusable_dependencies and node is not None and not changed_nodes[node]:
+                result[target] = reusable_dependencies[target]
+            else:
+                changed_targets.add(target)
+
+        print(
+            f"Transitive dependencies of {len(result)} of {len(targets)} strengthened targets "
+            "are reused from the previous patching.")
+        result.update(self._collect_transitive_dependencies(changed_targets))
+
+        self._patch_state.store(PatchStateData(
+            edge_fingerprints=edge_fingerprints,
+            transitive_dependencies={
+                target: dependencies for target, dependencies in result.items()
+                if self._get_target_edge_by_name(target) != BuildGraph.NO_EDGE}))
+        return result
+
+    def _get_target_edge_by_name(self, target: str) -> int:
+        node = self._graph.node_id(target)
+        if node is None:
+            return BuildGraph.NO_EDGE
+
+        return self._graph.producer(node)
+
+    def _collect_transitive_dependencies(self, targets: Set[str]) -> Dict[str, List[str]]:
+        """Collect all the dependencies of the targets that are targets themselves (except for the
+        phony ones), recursively. Explicit dependencies of the targets are not collected.
+        """
 
-        # Don't need explicit dependencies of the target in the result.
-        transitive_dependencies -= set(first_target_data.dependencies)
+        graph = self._graph
+        result = {}
+        targets_by_node = {}
+        for target in targets:
+            if self._get_target_edge_by_name(target) == BuildGraph.NO_EDGE:
+                # Unknown target; it is reported by _replace_target().
+                result[target] = []
+            else:
+                targets_by_node[graph.node_id(target)] = target
 
-        # Remove phony targets and non-targets from the dependencies.
-        for dep in list(transitive_dependencies):
-            target_line = self._get_target_line_by_name(dep)
-            if not target_line or self._is_target_phony(target_line):
-                transitive_dependencies.remove(dep)
+        paths = graph.paths
+        dependencies_by_node = collect_transitive_dependencies(graph, targets_by_node)
+        for node, dependencies in dependencies_by_node.items():
+            result[targets_by_node[node]] = [paths[dependency] for dependency in dependencies]
 
-        return transitive_dependencies
+        return result
 
     def _replace_target(self,
             target: str,
@@ -283,12 +358,14 @@ class BuildNinjaFileProcessor(NinjaFileProcessor):
             implicit_dependencies: list = None,
             order_only_dependencies: list = None) -> None:
 
-        target_line = self._get_target_line_by_name(target)
-        if target_line is None:
+        target_edge = self._get_target_edge_by_name(target)
+        if target_edge == BuildGraph.NO_EDGE:
             print(f"Unknown target {target}")
             return
 
-        target_line_data = target_line.parsed
+        # The line text is read from the file in the memory-mapped mode.
+        line_index = self._graph.edge_lines[target_edge]
+        target_line_data = self._parse_line(self._get_raw_line(line_index)).parsed
 
         if dependencies is not None:
             target_line_data.dependencies = dependencies
@@ -300,8 +377,7 @@ class BuildNinjaFileProcessor(NinjaFileProcessor):
             target_line_data.order_only_dependencies = order_only_dependencies
 
         build_line_string = self._generate_build_line(target_line_data)
-        self._set_target_line_by_name(
-            target, target_line._replace(raw=build_line_string, parsed=target_line_data))
+        self._lines[line_index] = self._lines[line_index]._replace(raw=build_line_string)
 
     def _generate_build_line(self, record: BuildLineData) -> str:
         line = ' '.join(sorted(record.outputs) if self._debug_output else record.outputs)
@@ -332,37 +408,51 @@ class BuildNinjaFileProcessor(NinjaFileProcessor):
             else:
                 line += f" || {' '.join(record.order_only_dependencies)}"
 
+        if record.validations:
+            line += f" |@ {' '.join(record.validations)}"
+
         return f"build {line}\n"
 
-    def _set_target_line_by_name(self, target: str, record: BuildLineData) -> None:
-        target_line_idx = self._line_number_by_output.get(target, None)
-        if target_line_idx is None:
-            return None
+    def get_statistics(self) -> Dict[str, int]:
+        statistics = super().get_statistics()
+        statistics["edges"] = self._graph.edge_count
+        statistics["nodes"] = self._graph.node_count
+        return statistics
 
-        self._lines[target_line_idx] = record
+    def get_known_files(self) -> Iterator[str]:
+        """Generate the paths of the files mentioned in build.ninja: the outputs, the inputs and the
+        validations of the "build" statements, the moc parameter files of the commands and the
+        depfiles.
+
+        Every path is unescaped and converted to "/" separators once, when it's generated, so no
+        intermediate collections of the paths are created. The paths are not deduplicated: the
+        same path can be generated more than once (e.g. a depfile which is also an output).
+        """
 
-    def get_known_files(self) -> set:
-        files = set()
+        normalize = self._normalize_known_file
+        # All the outputs, inputs and validations of the "build" lines are the nodes of the graph.
+        for path in self._graph.paths:
+            yield normalize(path)
+
+        mocarg_re = self._MOCARG_RE
         for line in self._lines:
-            line_data = line.parsed
-
-            if line.type == LineType.BUILD:
-                files.update({
-                    *line_data.outputs,
-                    *line_data.implicit_outputs,
-                    *line_data.dependencies,
-                    *line_data.implicit_dependencies,
-                    *line_data.order_only_dependencies})
-
-            elif line.type == LineType.COMMAND:
-                match = self._MOCARG_RE.fullmatch(line_data)
+            line_type = line.type
+            if line_type == LineType.COMMAND:
+                match = mocarg_re.fullmatch(line.parsed)
                 if match:
-                    files.add(match[1])
+                    yield normalize(match[1])
 
-            elif line.type == LineType.DEPFILE:
-                files.add(line_data)
+            elif line_type == LineType.DEPFILE:
+                yield normalize(line.parsed)
 
-        return {f.replace('\\', '/') for f in self._unescape_set(files)}
+    @classmethod
+    def _normalize_known_file(cls, path: str) -> str:
+        # Most of the paths contain neither escape sequences nor backslashes.
+        if "$" in path:
+            path = cls._unescape_string(path)
+        if "\\" in path:
+            path = path.replace("\\", "/")
+        return path
 
     def get_rules_file_name(self) -> Path:
         if self._rules_file_name:
@@ -373,20 +463,73 @@ class BuildNinjaFileProcessor(NinjaFileProcessor):
         return self._file_name
 
     def get_changed_targets_by_file_name(self, file_name: Path) -> Set[str]:
-        dependency = self._escape_string(str(file_name))
-        return self._get_changed_targets_by_dependency(dependency)
+        return self.get_changed_targets_by_file_names([file_name])
 
-    def _get_changed_targets_by_dependency(self, dependency: str) -> Set[str]:
-        changed_targets = set()
-        current_level_targets = {dependency}
-        while True:
-            dependent_targets = set()
-            for target in current_level_targets:
-                dependent_targets |= self._outputs_by_dependencies.get(target, set())
-            new_dependent_targets = dependent_targets - changed_targets
-            if not new_dependent_targets:
-                break
-            changed_targets |= new_dependent_targets
-            current_level_targets = new_dependent_targets
-
-        return changed_targets
+    def get_changed_targets_by_file_names(self, file_names: Iterable[Path]) -> Set[str]:
+        """Get all the targets depending on any of the files, directly or transitively.
+
+        All the files are processed in a single traversal of the graph, so every target is visited
+        only once, regardless of the number of the files it depends on.
+
+        :param file_names: Names of the changed files (source files or targets).
+        :type file_names: Iterable[Path]
+        :return: Names of the dependent targets.
+        :rtype: Set[str]
+        """
+
+        paths = self._graph.paths
+        _, levels = find_dependent_nodes(self._graph, self._get_node_ids(file_names))
+        return {paths[node] for level in levels for node in level}
+
+    def query_affected_targets(
+            self,
+            changed_files: Iterable[Iterable[Path]],
+            query: AffectedTargetsQuery) -> List[AffectedTarget]:
+        """Get the targets depending on any of the changed files, filtered by the query.
+
+        The targets are found by the same single traversal of the graph as in
+        get_changed_targets_by_file_names(); see affected_targets_query for the details.
+
+        :param changed_files: Names of the files for every changed file: the file itself and the
+            files depending on it implicitly (e.g. the object files from .ninja_deps).
+        :type changed_files: Iterable[Iterable[Path]]
+        :param query: Filters and options of the query.
+        :type query: AffectedTargetsQuery
+        :return: Found targets.
+        :rtype: List[AffectedTarget]
+        """
+
+        changed_node_groups = [self._get_node_ids(file_names) for file_names in changed_files]
+        return query_affected_targets(self._graph, changed_node_groups, query)
+
+    def _get_node_ids(self, file_names: Iterable[Path]) -> List[int]:
+        """Get the nodes of the files which are mentioned in build.ninja."""
+
+        graph = self._graph
+        nodes = (graph.node_id(self._escape_string(str(file_name))) for file_name in file_names)
+        return [node for node in nodes if node is not None]
+
+    def analyze_graph(
+            self, durations_by_output: Dict[str, float], top_count: int) -> GraphAnalysisReport:
+        """Find the critical path of the build and the edges with the largest transitive fan-in
+        and fan-out; see graph_analysis for the details.
+
+        :param durations_by_output: Durations of the commands (in seconds) by the output paths,
+            unescaped, as they are recorded in .ninja_log.
+        :type durations_by_output: Dict[str, float]
+        :param top_count: Number of the edges in the lists of the largest fan-in and fan-out.
+        :type top_count: int
+        :return: Report.
+        :rtype: GraphAnalysisReport
+        """
+
+        graph = self._graph
+        producers = graph.node_producers
+        edge_durations = [None] * graph.edge_count
+        for output, duration in durations_by_output.items():
+            node = graph.node_id(self._escape_string(output))
+            if node is None or producers[node] == BuildGraph.NO_EDGE:
+                continue
+            # Every output of an edge is recorded with the same duration.
+            edge_durations[producers[node]] = duration
+        return analyze_graph(graph, edge_durations, top_count)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+FileWriter: Writer of the patched ninja files.
+
+The data is collected in a large buffer, so writing millions of lines takes a few system calls.
+Large ranges of the source file which are not changed by patching are copied by the kernel
+(os.copy_file_range() or os.sendfile()), without passing the data through the process; if neither
+is supported for the files, the ranges are written from the memory mapping of the source file.
+
+FsyncPolicy: Enumeration of the ways to make the written file durable.
+"""
+
+import errno
+import os
+from enum import Enum
+
+# Errors meaning that the kernel can't copy the data between these files, so another way of
+# copying must be used.
+_UNSUPPORTED_COPY_ERRORS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF, errno.EPERM}
+
+
+class FsyncPolicy(Enum):
+    # Leave flushing the data to the OS.
+    NONE = "none"
+    # Flush the data of the written file to the disk before it replaces the original file.
+    FILE = "file"
+    # Also flush the directory after the replacement, so the replacement itself is durable.
+    FULL = "full"
+
+
+class FileWriter:
+    BUFFER_SIZE = 1 << 20
+
+    # Ranges smaller than this size are copied through the buffer: the system calls would cost
+    # more than copying the data.
+    MIN_KERNEL_COPY_SIZE = 64 * 1024
+
+    def __init__(self, file_name: str) -> None:
+        self._file = open(file_name, "wb", buffering=0)
+        self._buffer = bytearray()
+        self._can_copy_file_range = hasattr(os, "copy_file_range")
+        self._can_sendfile = hasattr(os, "sendfile")
+        self.bytes_written = 0
+        self.bytes_copied = 0
+
+    def __enter__(self) -> "FileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if exc_type is None:
+                self._flush()
+        finally:
+            self._file.close()
+
+    def write(self, data) -> None:
+        """Write the data (any bytes-like object) through the buffer."""
+
+        if len(self._buffer) + len(data) > self.BUFFER_SIZE:
+            self._flush()
+            if len(data) >= self.BUFFER_SIZE:
+                self._write_all(data)
+                return
+        self._buffer += data
+
+    def copy_range(self, source_fd: int, source_data, start: int, end: int) -> None:
+        """Copy the range of the source file to the written file.
+
+        :param source_fd: Descriptor of the source file, opened for reading.
+        :type source_fd: int
+        :param source_data: Data of the source file (e.g. its memory mapping); used if the kernel
+            can't copy the range.
+        :param start: Position of the range in the source file.
+        :type start: int
+        :param end: Position of the end of the range in the source file.
+        :type end: int
+        """
+
+        if end - start >= self.MIN_KERNEL_COPY_SIZE:
+            self._flush()
+            start = self._copy_by_kernel(source_fd, start, end)
+        if start < end:
+            self.write(memoryview(source_data)[start:end])
+
+    def sync(self) -> None:
+        """Write the buffered data and flush the file to the disk."""
+
+        self._flush()
+        os.fsync(self._file.fileno())
+
+    def _copy_by_kernel(self, source_fd: int, start: int, end: int) -> int:
+        """Copy as much of the range as the kernel can.
+
+        :return: Position of the first byte which was not copied.
+        :rtype: int
+        """
+
+        target_fd = self._file.fileno()
+        while start < end and self._can_copy_file_range:
+            try:
+                copied_size = os.copy_file_range(source_fd, target_fd, end - start, start)
+            except OSError as ex:
+                if ex.errno not in _UNSUPPORTED_COPY_ERRORS:
+                    raise
+                self._can_copy_file_range = False
+                break
+            if copied_size == 0:
+                break
+            start += copied_size
+            self.bytes_copied += copied_size
+            self.bytes_written += copied_size
+
+        while start < end and self._can_sendfile:
+            try:
+                copied_size = os.sendfile(target_fd, source_fd, start, end - start)
+            except OSError as ex:
+                if ex.errno not in _UNSUPPORTED_COPY_ERRORS:
+                    raise
+                self._can_sendfile = False
+                break
+            if copied_size == 0:
+                break
+            start += copied_size
+            self.bytes_copied += copied_size
+            self.bytes_written += copied_size
+
+        return start
+
+    def _flush(self) -> None:
+        if self._buffer:
+            self._write_all(self._buffer)
+            self._buffer = bytearray()
+
+    def _write_all(self, data) -> None:
+        view = memoryview(data)
+        while view:
+            written_size = self._file.write(view)
+            view = view[written_size:]
+            self.bytes_written += written_size
+
+
+def sync_directory(directory_name: str) -> None:
+    """Flush the directory entries (e.g. the result of os.replace()) to the disk. Does nothing on
+    the systems which can't open directories (i.e. Windows).
+    """
+
+    if os.name == "nt":
+        return
+
+    directory_fd = os.open(directory_name, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+Analysis of the structure of a BuildGraph, which limits the parallelism of the build.
+
+GraphAnalysis: Edges ordered topologically with their direct dependency relations, the base of
+the other calculations.
+
+EdgeStatistics: Duration and transitive fan-in/fan-out of an edge.
+
+GraphAnalysisReport: Critical path and the edges with the largest fan-in and fan-out, made by
+analyze_graph().
+
+The critical path is the chain of the dependent edges with the largest sum of the durations; the
+build can't be faster than this sum, however many jobs are run. The transitive fan-in of an edge
+is the number of the edges it depends on directly or transitively, and the transitive fan-out is
+the number of the edges depending on it; the phony edges are not counted, as they do no work. The
+fan-in and the fan-out are calculated in a single sweep each, as the sets of the reachable edges
+stored as bitsets (Python ints), in the same way as in transitive_closure; the bitset of an edge is
+released as soon as all the edges using it are processed.
+"""
+
+import heapq
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .build_graph import BuildGraph
+
+# int.bit_count() is available since Python 3.10.
+_bit_count = getattr(int, "bit_count", None) or (lambda value: bin(value).count("1"))
+
+
+class EdgeStatistics(NamedTuple):
+    # First output of the edge, as it's written in build.ninja.
+    output: str
+    rule: str
+    # Recorded duration of the command; None if it's unknown.
+    duration_s: Optional[float]
+    transitive_dependency_count: int
+    transitive_dependent_count: int
+
+
+class GraphAnalysisReport(NamedTuple):
+    critical_path: List[EdgeStatistics]
+    critical_path_duration_s: float
+    # Sum of the durations of all the commands, i.e. the duration of the build by a single job.
+    total_duration_s: float
+    # Numbers of the non-phony edges with and without the recorded durations.
+    recorded_edge_count: int
+    unrecorded_edge_count: int
+    # Non-phony edges with the largest numbers of the transitive dependencies, in the descending
+    # order of the number.
+    largest_fan_in: List[EdgeStatistics]
+    # Non-phony edges with the largest numbers of the transitive dependents.
+    largest_fan_out: List[EdgeStatistics]
+
+
+class GraphAnalysis:
+    def __init__(self, graph: BuildGraph) -> None:
+        """
+        :param graph: Finalized build graph.
+        :type graph: BuildGraph
+        """
+
+        self._graph = graph
+        producers = graph.node_producers
+        no_edge = BuildGraph.NO_EDGE
+        edge_count = graph.edge_count
+
+        # Edges producing the inputs of the edge (including the order-only ones, as they delay the
+        # edge as well), and the edges using the outputs of the edge.
+        self._dependencies: List[Tuple[int, ...]] = []
+        self._dependents: List[List[int]] = [[] for _ in range(edge_count)]
+        for edge in range(edge_count):
+            dependencies = {producers[node] for node in graph.edge_inputs(edge)}
+            dependencies.discard(no_edge)
+            dependencies.discard(edge)
+            self._dependencies.append(tuple(dependencies))
+            for dependency in dependencies:
+                self._dependents[dependency].append(edge)
+
+        self._order = self._sort_topologically()
+
+    def _sort_topologically(self) -> List[int]:
+        """Order the edges so every edge goes after all its dependencies (Kahn's algorithm). ninja
+        rejects the cyclic graphs, but if there is a cycle anyway, its edges are appended to the
+        end in the order of their ids.
+        """
+
+        dependents = self._dependents
+        pending_dependency_counts = [len(dependencies) for dependencies in self._dependencies]
+        order = [edge for edge, count in enumerate(pending_dependency_counts) if count == 0]
+        for edge in order:
+            for dependent in dependents[edge]:
+                pending_dependency_counts[dependent] -= 1
+                if pending_dependency_counts[dependent] == 0:
+                    order.append(dependent)
+
+        if len(order) < len(pending_dependency_counts):
+            order.extend(
+                edge for edge, count in enumerate(pending_dependency_counts) if count > 0)
+        return order
+
+    def find_critical_path(self, edge_durations: Sequence[float]) -> List[int]:
+        """Find the chain of the dependent edges with the largest sum of the durations.
+
+        :param edge_durations: Duration of every edge, indexed by the edge id.
+        :type edge_durations: Sequence[float]
+        :return: Edges of the path, starting from the one without dependencies; empty if no edge
+            has a positive duration.
+        :rtype: List[int]
+        """
+
+        # Time when the edge finishes, if it's started as soon as all its dependencies finish.
+        finish_times = [0.0] * len(self._order)
+        critical_dependencies = [BuildGraph.NO_EDGE] * len(self._order)
+        for edge in self._order:
+            start_time = 0.0
+            for dependency in self._dependencies[edge]:
+                if finish_times[dependency] > start_time:
+                    start_time = finish_times[dependency]
+                    critical_dependencies[edge] = dependency
+            finish_times[edge] = start_time + edge_durations[edge]
+
+        last_edge = max(range(len(finish_times)), key=finish_times.__getitem__, default=None)
+        if last_edge is None or finish_times[last_edge] <= 0:
+            return []
+        path = [last_edge]
+        while critical_dependencies[path[-1]] != BuildGraph.NO_EDGE:
+            path.append(critical_dependencies[path[-1]])
+        path.reverse()
+        return path
+
+    def count_transitive_dependencies(self) -> List[int]:
+        """Count the non-phony edges every edge depends on, directly or transitively.
+
+        :return: Counts indexed by the edge id.
+        :rtype: List[int]
+        """
+
+        return self._count_reachable_edges(self._order, self._dependencies, self._dependents)
+
+    def count_transitive_dependents(self) -> List[int]:
+        """Count the non-phony edges depending on every edge, directly or transitively.
+
+        :return: Counts indexed by the edge id.
+        :rtype: List[int]
+        """
+
+        return self._count_reachable_edges(
+            self._order[::-1], self._dependents, self._dependencies)
+
+    def _count_reachable_edges(
+            self,
+            order: List[int],
+            predecessors: Sequence[Sequence[int]],
+            successors: Sequence[Sequence[int]]) -> List[int]:
+        """Count the non-phony edges reachable from every edge by the predecessor relation; order
+        must list every edge after all its predecessors.
+        """
+
+        is_phony = self._graph.is_phony
+        # Number of the successors which are not processed yet, to release the bitset in time.
+        pending_successor_counts = [len(edge_successors) for edge_successors in successors]
+        # Bitset of the edge itself (unless it's phony) and the edges reachable from it.
+        reachable_bits = {}
+        counts = [0] * len(order)
+        next_bit = 1
+        for edge in order:
+            bits = 0
+            for predecessor in predecessors[edge]:
+                bits |= reachable_bits.get(predecessor, 0)
+                pending_successor_counts[predecessor] -= 1
+                if pending_successor_counts[predecessor] == 0:
+                    reachable_bits.pop(predecessor, None)
+            counts[edge] = _bit_count(bits)
+            if not is_phony(edge):
+                bits |= next_bit
+                next_bit <<= 1
+            if pending_successor_counts[edge] > 0:
+                reachable_bits[edge] = bits
+
+        return counts
+
+
+def analyze_graph(
+        graph: BuildGraph,
+        edge_durations: Sequence[Optional[float]],
+        top_count: int) -> GraphAnalysisReport:
+    """Find the critical path and the edges with the largest transitive fan-in and fan-out.
+
+    :param graph: Finalized build graph.
+    :type graph: BuildGraph
+    :param edge_durations: Duration of the command of every edge, indexed by the edge id; None if
+        it's unknown (such edges are considered instant).
+    :type edge_durations: Sequence[Optional[float]]
+    :param top_count: Number of the edges in the lists of the largest fan-in and fan-out.
+    :type top_count: int
+    :return: Report.
+    :rtype: GraphAnalysisReport
+    """
+
+    analysis = GraphAnalysis(graph)
+    durations = [duration or 0.0 for duration in edge_durations]
+    dependency_counts = analysis.count_transitive_dependencies()
+    dependent_counts = analysis.count_transitive_dependents()
+    paths = graph.paths
+    output_nodes = graph.output_nodes
+    output_offsets = graph.output_offsets
+
+    def statistics(edge: int) -> EdgeStatistics:
+        has_outputs = output_offsets[edge] != output_offsets[edge + 1]
+        return EdgeStatistics(
+            output=paths[output_nodes[output_offsets[edge]]] if has_outputs else "",
+            rule=graph.edge_rule(edge),
+            # Phony edges run no commands, so they are never recorded.
+            duration_s=0.0 if graph.is_phony(edge) else edge_durations[edge],
+            transitive_dependency_count=dependency_counts[edge],
+            transitive_dependent_count=dependent_counts[edge])
+
+    working_edges = [edge for edge in range(graph.edge_count) if not graph.is_phony(edge)]
+    recorded_edge_count = sum(1 for edge in working_edges if edge_durations[edge] is not None)
+    critical_path = analysis.find_critical_path(durations)
+    return GraphAnalysisReport(
+        critical_path=[statistics(edge) for edge in critical_path],
+        critical_path_duration_s=sum(durations[edge] for edge in critical_path),
+        total_duration_s=sum(durations),
+        recorded_edge_count=recorded_edge_count,
+        unrecorded_edge_count=len(working_edges) - recorded_edge_count,
+        largest_fan_in=[
+            statistics(edge) for edge in
+            heapq.nlargest(top_count, working_edges, key=dependency_counts.__getitem__)],
+        largest_fan_out=[
+            statistics(edge) for edge in
+            heapq.nlargest(top_count, working_edges, key=dependent_counts.__getitem__)])
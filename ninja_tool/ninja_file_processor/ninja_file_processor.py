@@ -12,19 +12,32 @@ NinjaFileProcessor: The base class for NinjaFileProcessor and RulesNinjaFileProc
 NinjaFileProcessorError: The base class for NinjaFileProcessor-related exceptions.
 NinjaFileProcessorIOError: Exception of a file IO error.
 NinjaFileProcessorParseError: Exception of a file parsing error.
+NinjaFileProcessorReadOnlyError: Exception of an attempt to change a file loaded in the read-only
+    mode.
 
 Line: Represents a line of build.ninja file.
 LineType: Enumeration to distinguish different types of Line objects.
 """
 
+import io
+import itertools
+import locale
+import mmap
 import os
 import re
+import time
+from array import array
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from pathlib import Path
-from typing import TextIO
+from typing import BinaryIO, Dict, Iterable, List, Optional, TextIO, Tuple
 from abc import ABCMeta, abstractmethod
 
+from .file_writer import FileWriter, FsyncPolicy, sync_directory
+from .parse_cache import ParseCache
+from .patch_fingerprint import PatchFingerprintStore, options_digest
+
 
 Line = namedtuple('Line', 'raw parsed type')
 
@@ -55,7 +68,31 @@ class NinjaFileProcessor(metaclass=ABCMeta):
 
     _ADDED_LINES_MARKER_START = "# Start of lines added by ninja_tool\n"
 
-    def __init__(self, file_name: Path, build_directory: Path, debug_output: bool = False) -> None:
+    # Minimal size of the file part parsed by one process in the parallel load mode. Files smaller
+    # than two such parts are parsed sequentially, because starting the worker processes would
+    # take longer than parsing.
+    _MIN_PARALLEL_CHUNK_SIZE = 16 * 1024 * 1024
+
+    _BOUNDARY_SEARCH_BLOCK_SIZE = 64 * 1024
+
+    # Number of the lines joined into one string before encoding when saving in the text mode.
+    _SAVED_LINES_BATCH_SIZE = 16 * 1024
+
+    # Regex (for bytes, in the multiline mode) matching the beginnings of the lines which are
+    # parsed in the memory-mapped mode; all other lines are skipped without decoding. Must be
+    # defined by the subclasses supporting this mode.
+    _LINE_OF_INTEREST_RE: Optional[re.Pattern] = None
+
+    def __init__(self,
+            file_name: Path,
+            build_directory: Path,
+            debug_output: bool = False,
+            cache_file_name: Path = None,
+            parse_jobs: int = 1,
+            memory_mapped: bool = False,
+            fingerprint_file_name: Path = None,
+            fsync_policy: FsyncPolicy = FsyncPolicy.NONE,
+            read_only: bool = False) -> None:
         self.build_directory = Path(build_directory)
         self._lines = []
         self._added_lines = []
@@ -63,10 +100,50 @@ class NinjaFileProcessor(metaclass=ABCMeta):
         self._is_patch_applied = False
         self._debug_output = debug_output
         self._current_parsed_line = 0
+        self._parse_cache = ParseCache(cache_file_name) if cache_file_name else None
+        self._parse_jobs = parse_jobs
+        self._fingerprint_store = (
+            PatchFingerprintStore(fingerprint_file_name) if fingerprint_file_name else None)
+        self.set_patch_options([])
+        self._fsync_policy = fsync_policy
+
+        # In the read-only mode, only the parsed data is kept: the raw text of the lines is
+        # dropped, and the lines without data of interest are not stored at all, so the file can't
+        # be patched and saved.
+        self._read_only = read_only
+
+        # The file is loaded once and shared by all the commands of a run; the number of the loads
+        # is counted to check it.
+        self._is_loaded = False
+        self._load_count = 0
+
+        # In the memory-mapped mode, only the lines matching _LINE_OF_INTEREST_RE are stored in
+        # self._lines, and their raw text is None until the line is replaced. The file is kept
+        # mapped, and the positions of the stored lines in it are kept in self._line_starts and
+        # self._line_ends, so the unchanged data can be copied to the patched file as is.
+        self._memory_mapped = memory_mapped
+        self._mapping = None
+        self._data_size = 0
+        self._line_starts = array("q")
+        self._line_ends = array("q")
+
+    def set_patch_options(self, options: Iterable[str]) -> None:
+        """Set the options which define the result of patching (e.g. the strengthened targets).
+        They are stored in the fingerprint of the patched file.
+
+        :param options: Options of patching.
+        :type options: Iterable[str]
+        """
+
+        self._patch_options_digest = options_digest([str(self._debug_output), *options])
 
     def needs_patching(self, script_version_timestamp: float = None) -> bool:
         """Check if build.ninja file needs patching.
 
+        If the fingerprint of the last patching is stored, the file doesn't need patching only if
+        it's the same as after the last patching with the same options. Otherwise, the file doesn't
+        need patching if it's already patched and is not older than the patch script.
+
         :param script_version_timestamp: Unix timestamp of the patch script file.
         :type script_version_timestamp: float
         :return: Whether the file is not patched yet.
@@ -74,30 +151,121 @@ class NinjaFileProcessor(metaclass=ABCMeta):
         """
 
         try:
+            with open(self._file_name) as file:
+                first_line = next(file)
+            if first_line != self._PATCH_MARKER:
+                return True
+
+            if self._fingerprint_store is not None:
+                fingerprint = self._fingerprint_store.load(self._file_name)
+                if fingerprint is not None:
+                    return not self._fingerprint_store.matches(
+                        self._file_name, fingerprint, self._patch_options_digest)
+
             # If the currently processed file is older than the patch script, patch it.
             if script_version_timestamp is not None:
                 if self._file_name.stat().st_mtime < script_version_timestamp:
                     return True
-
-            with open(self._file_name) as file:
-                first_line = next(file)
         except OSError as ex:
             raise NinjaFileProcessorIOError(self, "check patch status of") from ex
 
-        return first_line != self._PATCH_MARKER
+        return False
 
     def load_data(self) -> None:
-        self._current_parsed_line = 0
+        """Load the file (or its cached parse results), replacing the previously loaded data.
+        Normally, ensure_loaded() should be used instead, so the file is not loaded again.
+        """
+
+        self._reset_data()
+        if self._parse_cache is not None:
+            cached_state = self._parse_cache.load(self._file_name)
+            if cached_state is not None and cached_state["memory_mapped"] == self._memory_mapped:
+                try:
+                    self._restore_cached_state(cached_state)
+                except OSError as ex:
+                    raise NinjaFileProcessorIOError(self, "load") from ex
+                print(f"Using cached parse results for {self._file_name}")
+                self._set_loaded()
+                return
+
+        # The cache is shared by the read-only processors and the ones which save data, so it
+        # always stores the full state: a read-only processor parses the file in full and drops the
+        # data needed only for saving after the state is stored.
+        drop_saving_data = self._read_only and self._parse_cache is not None
+        if drop_saving_data:
+            self._read_only = False
+
         try:
-            with open(self._file_name) as ninja_file:
-                self._load_data_from_file(ninja_file)
+            source_stat = os.stat(self._file_name)
+            if self._memory_mapped:
+                self._open_mapping()
+                data_size = self._data_size
+            else:
+                data_size = source_stat.st_size
+
+            chunk_count = min(self._parse_jobs, data_size // self._MIN_PARALLEL_CHUNK_SIZE)
+            if chunk_count > 1:
+                self._load_data_in_parallel(chunk_count, data_size)
+            elif self._memory_mapped:
+                self._load_data_from_mapping(0, data_size)
+            else:
+                with open(self._file_name) as ninja_file:
+                    self._load_data_from_file(ninja_file)
         except OSError as ex:
             raise NinjaFileProcessorIOError(self, "load") from ex
+        finally:
+            if drop_saving_data:
+                self._read_only = True
+
+        self._finish_loading()
+        if self._parse_cache is not None:
+            self._parse_cache.store(self._file_name, source_stat, self._get_cached_state())
+        if drop_saving_data:
+            self._lines = [line._replace(raw=None) for line in self._lines]
+        if self._read_only and self._memory_mapped:
+            self._release_mapping()
+        self._set_loaded()
+
+    def ensure_loaded(self) -> bool:
+        """Load the file unless it's already loaded.
+
+        :return: Whether the file has been loaded by this call.
+        :rtype: bool
+        """
+
+        if self._is_loaded:
+            return False
+        self.load_data()
+        return True
+
+    def _reset_data(self) -> None:
+        """Drop the loaded data. Subclasses must reset their own data as well."""
+
+        self._is_loaded = False
+        self._lines = []
+        self._added_lines = []
+        self._is_patch_applied = False
+        self._current_parsed_line = 0
+        self._close_mapping()
+        self._line_starts = array("q")
+        self._line_ends = array("q")
+
+    def _set_loaded(self) -> None:
+        self._is_loaded = True
+        self._load_count += 1
+
+    def _load_data_from_file(self, file: TextIO) -> bool:
+        """Parse lines of the file and add them to the line list.
+
+        :param file: File to read the lines from.
+        :type file: TextIO
+        :return: Whether the reading was stopped by the marker of the lines added by ninja_tool.
+        :rtype: bool
+        """
 
-    def _load_data_from_file(self, file: TextIO) -> None:
         for line in file:
             if line == self._ADDED_LINES_MARKER_START:
-                break
+                return True
 
             self._current_parsed_line += 1
 
@@ -110,48 +278,348 @@ class NinjaFileProcessor(metaclass=ABCMeta):
                 self._current_parsed_line += 1
 
             line_data = self._parse_line(line)
-            self._consume_line_object(line_data)
-            self._lines.append(line_data)
+            line_object = self._consume_line_object(line_data)
+            if self._read_only:
+                if line_object.type == LineType.UNKNOWN:
+                    continue
+                line_object = line_object._replace(raw=None)
+            self._lines.append(line_object)
+
+        return False
+
+    def _open_mapping(self) -> None:
+        """Map the file into memory and find the end of its data (i.e. the beginning of the lines
+        added by ninja_tool).
+        """
+
+        with open(self._file_name, "rb") as file:
+            if os.fstat(file.fileno()).st_size > 0:
+                self._mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._mapping = b""
+
+        marker = self._ADDED_LINES_MARKER_START.encode()
+        if self._mapping[:len(marker)] == marker:
+            self._data_size = 0
+        else:
+            marker_position = self._mapping.find(b"\n" + marker)
+            self._data_size = marker_position + 1 if marker_position >= 0 else len(self._mapping)
+
+    def _close_mapping(self) -> None:
+        if isinstance(self._mapping, mmap.mmap):
+            self._mapping.close()
+        self._mapping = None
+
+    def _release_mapping(self) -> None:
+        """Close the mapping and drop the line positions, which are needed only for saving."""
+
+        self._close_mapping()
+        self._line_starts = array("q")
+        self._line_ends = array("q")
+
+    def _load_data_from_mapping(self, start: int, end: int) -> None:
+        """Parse the lines of interest beginning in the given range of the mapped file."""
+
+        mapping = self._mapping
+        for match in self._LINE_OF_INTEREST_RE.finditer(mapping, start, end):
+            line_start = match.start()
+            if self._is_continuation_line(line_start):
+                continue
+
+            line_end = self._find_statement_end(line_start)
+            # Translate the newlines the same way as open() does in the text mode.
+            line = mapping[line_start:line_end].decode("utf-8").replace("\r\n", "\n")
+            try:
+                line_object = self._parse_line(line)
+            except NinjaFileProcessorParseError as ex:
+                self._current_parsed_line = mapping[:line_end - 1].count(b"\n") + 1
+                raise NinjaFileProcessorParseError(self, ex.message) from None
+
+            if line_object.type == LineType.UNKNOWN:
+                continue
+
+            self._line_starts.append(line_start)
+            self._line_ends.append(line_end)
+            self._lines.append(self._consume_line_object(line_object)._replace(raw=None))
+
+    def _is_continuation_line(self, line_start: int) -> bool:
+        """Check if the previous line ends with "$" (i.e. the line is its continuation)."""
+
+        position = line_start - 2
+        if position >= 0 and self._mapping[position] == ord("\r"):
+            position -= 1
+        return position >= 0 and self._mapping[position] == ord("$")
+
+    def _find_statement_end(self, line_start: int) -> int:
+        position = line_start
+        while True:
+            newline = self._mapping.find(b"\n", position, self._data_size)
+            if newline < 0:
+                return self._data_size
+            position = newline + 1
+            if not self._is_continuation_line(position):
+                return position
+
+    def _get_raw_line(self, index: int) -> str:
+        """Get the raw text of the line, reading it from the mapped file if it is not
+        materialized.
+        """
+
+        line = self._lines[index]
+        if line.raw is not None:
+            return line.raw
+
+        raw_line = self._mapping[self._line_starts[index]:self._line_ends[index]]
+        return raw_line.decode("utf-8").replace("\r\n", "\n")
+
+    def _load_data_in_parallel(self, chunk_count: int, data_size: int) -> None:
+        """Split the file into chunks at the statement boundaries, parse the chunks in a process
+        pool and merge the results in the order of the chunks, so the line numbering is the same as
+        in the case of the sequential parsing.
+        """
+
+        chunk_ranges = self._find_chunk_ranges(chunk_count, data_size)
+        with ProcessPoolExecutor(max_workers=len(chunk_ranges)) as executor:
+            futures = [
+                executor.submit(
+                    _load_file_chunk, type(self), self._file_name, self.build_directory,
+                    self._memory_mapped, self._read_only, start, end)
+                for start, end in chunk_ranges]
+
+            for future in futures:
+                chunk_state = future.result()
+                if chunk_state["error"] is not None:
+                    executor.shutdown(cancel_futures=True)
+                    self._current_parsed_line += chunk_state["current_parsed_line"]
+                    raise NinjaFileProcessorParseError(self, chunk_state["error"])
+
+                self._merge_chunk_state(chunk_state)
+                if chunk_state["is_added_lines_marker_found"]:
+                    executor.shutdown(cancel_futures=True)
+                    break
+
+    def _find_chunk_ranges(self, chunk_count: int, file_size: int) -> List[Tuple[int, int]]:
+        boundaries = [0]
+        with open(self._file_name, "rb") as file:
+            for i in range(1, chunk_count):
+                boundary = self._find_statement_boundary(
+                    file, max(file_size * i // chunk_count, boundaries[-1]))
+                if boundary >= file_size:
+                    break
+                if boundary > boundaries[-1]:
+                    boundaries.append(boundary)
+        boundaries.append(file_size)
+
+        return list(zip(boundaries, boundaries[1:]))
+
+    @classmethod
+    def _find_statement_boundary(cls, file: BinaryIO, position: int) -> int:
+        """Find the offset of the first line beginning at or after the position, which is not a
+        continuation of the previous line (i.e. the previous line doesn't end with "$").
+        """
+
+        # Keep a couple of bytes before the searched range to check the end of the previous line.
+        window_start = max(position - 3, 0)
+        file.seek(window_start)
+        data = file.read(cls._BOUNDARY_SEARCH_BLOCK_SIZE)
+        search_start = position - 1 - window_start
+        if search_start < 0:
+            return 0
+
+        while True:
+            newline = data.find(b"\n", search_start)
+            if newline < 0:
+                block = file.read(cls._BOUNDARY_SEARCH_BLOCK_SIZE)
+                if not block:
+                    return window_start + len(data)
+                kept_data = data[-3:]
+                window_start += len(data) - len(kept_data)
+                data = kept_data + block
+                search_start = len(kept_data)
+                continue
+
+            line_end = newline
+            if line_end > 0 and data[line_end - 1] == ord("\r"):
+                line_end -= 1
+            if line_end > 0 and data[line_end - 1] == ord("$"):
+                search_start = newline + 1
+                continue
+
+            return window_start + newline + 1
+
+    def _merge_chunk_state(self, state: dict) -> None:
+        """Append the state of the parsed file chunk to the current state. Subclasses must merge
+        their own data, taking into account that the line numbers in the chunk state start from 0.
+        """
+
+        self._lines.extend(self._decode_lines(state))
+        self._line_starts.extend(state["line_starts"])
+        self._line_ends.extend(state["line_ends"])
+        self._current_parsed_line += state["current_parsed_line"]
+
+    def _get_cached_state(self) -> dict:
+        """Return the parsed state to be stored in the parse cache. Subclasses must extend the
+        result with their own data.
+        """
+
+        # Lines are stored column-wise, because pickling of millions of Line tuples (and LineType
+        # values in them) is several times slower than pickling of the flat lists.
+        return {
+            "raw_lines": [line.raw for line in self._lines],
+            "parsed_lines": [line.parsed for line in self._lines],
+            "line_types": array("b", [line.type.value for line in self._lines]),
+            "current_parsed_line": self._current_parsed_line,
+            "memory_mapped": self._memory_mapped,
+            "line_starts": self._line_starts,
+            "line_ends": self._line_ends,
+        }
+
+    def _restore_cached_state(self, state: dict) -> None:
+        self._lines = self._decode_lines(state, keep_raw_lines=not self._read_only)
+        self._current_parsed_line = state["current_parsed_line"]
+        if self._read_only:
+            return
+
+        self._line_starts = state["line_starts"]
+        self._line_ends = state["line_ends"]
+        if self._memory_mapped:
+            self._open_mapping()
+
+    @staticmethod
+    def _decode_lines(state: dict, keep_raw_lines: bool = True) -> List[Line]:
+        line_types = map({t.value: t for t in LineType}.__getitem__, state["line_types"])
+        raw_lines = state["raw_lines"] if keep_raw_lines else itertools.repeat(None)
+        return list(map(Line, raw_lines, state["parsed_lines"], line_types))
 
     @abstractmethod
     def _parse_line(self, line: str) -> Line:
         pass
 
     @abstractmethod
-    def _consume_line_object(self, line_object: Line) -> None:
-        pass
+    def _consume_line_object(self, line_object: Line) -> Line:
+        """Update the processor indexes with the parsed line.
+
+        :param line_object: Parsed line.
+        :type line_object: Line
+        :return: Line object to be stored in the line list.
+        :rtype: Line
+        """
+
+    def _finish_loading(self) -> None:
+        """Called after all the lines are loaded; subclasses can build their indexes here."""
 
     def save_data(self) -> None:
         assert self.is_loaded(), "Nothing to save (file wasn't loaded?)"
+        self._check_writable("save")
 
         if not self._is_patch_applied:
             # Do nothing if we haven't patched the file yet.
             return
 
         patched_file_name = f"{self._file_name}.patched"
+        start_time = time.perf_counter()
         try:
-            with open(patched_file_name, "w") as file:
-                # Add a patch marker if we applied the patch and the marker isn't already here.
-                if not self._has_patch_marker():
-                    file.write(self._PATCH_MARKER)
-
-                for record in self._lines:
-                    file.write(record.raw)
-
-                if self._added_lines:
-                    if self._lines[-1].raw != "\n":
-                        file.write("\n")
-                    file.write(self._ADDED_LINES_MARKER_START)
-                    for record in self._added_lines:
-                        file.write(record.raw)
+            with FileWriter(patched_file_name) as file:
+                if self._memory_mapped:
+                    self._save_mapped_data(file)
+                else:
+                    self._save_lines(file)
+                if self._fsync_policy != FsyncPolicy.NONE:
+                    file.sync()
+
+            if self._memory_mapped:
+                # The mapped file can't be replaced on Windows.
+                self._close_mapping()
+            os.replace(patched_file_name, self._file_name)
+            if self._fsync_policy == FsyncPolicy.FULL:
+                sync_directory(self._file_name.parent)
+            if self._memory_mapped:
+                self._open_mapping()
         except OSError as ex:
             raise NinjaFileProcessorIOError(self, "save") from ex
+        duration = time.perf_counter() - start_time
 
-        os.replace(patched_file_name, self._file_name)
+        if self._fingerprint_store is not None:
+            self._fingerprint_store.store(self._file_name, self._patch_options_digest)
 
-        print(f"{self._file_name} patched.")
+        megabyte = 1024 * 1024
+        print(
+            f"{self._file_name} patched: {file.bytes_written / megabyte:.1f} MB saved in "
+            f"{duration:.2f} s ({file.bytes_copied / megabyte:.1f} MB copied by the kernel).")
+
+    def _save_lines(self, file: FileWriter) -> None:
+        """Write all the lines, encoding them the same way as open() does in the text mode."""
+
+        encoding = locale.getpreferredencoding(False)
+
+        def write(text: str) -> None:
+            if os.linesep != "\n":
+                text = text.replace("\n", os.linesep)
+            file.write(text.encode(encoding))
+
+        # Add a patch marker if we applied the patch and the marker isn't already here.
+        if not self._has_patch_marker():
+            write(self._PATCH_MARKER)
+
+        for start in range(0, len(self._lines), self._SAVED_LINES_BATCH_SIZE):
+            write("".join(
+                record.raw for record in self._lines[start:start + self._SAVED_LINES_BATCH_SIZE]))
+
+        if self._added_lines:
+            if self._lines[-1].raw != "\n":
+                write("\n")
+            write(self._ADDED_LINES_MARKER_START)
+            write("".join(record.raw for record in self._added_lines))
+
+    def _save_mapped_data(self, file: FileWriter) -> None:
+        """Copy the unchanged ranges of the mapped file to the patched file, writing only the
+        replaced lines. After saving, the line positions refer to the patched file, which is to be
+        mapped instead of the original one.
+        """
+
+        mapping = self._mapping
+        new_line_starts = array("q")
+        new_line_ends = array("q")
+        with open(self._file_name, "rb") as source_file:
+            source_fd = source_file.fileno()
+
+            # Difference between the new and the old positions of the data.
+            shift = 0
+            # Add a patch marker if we applied the patch and the marker isn't already here.
+            if not self._has_patch_marker():
+                file.write(self._PATCH_MARKER.encode())
+                shift = len(self._PATCH_MARKER.encode())
+
+            copied_position = 0
+            for index, line in enumerate(self._lines):
+                line_start = self._line_starts[index]
+                new_line_starts.append(line_start + shift)
+                if line.raw is not None:
+                    file.copy_range(source_fd, mapping, copied_position, line_start)
+                    raw_line = line.raw.encode("utf-8")
+                    file.write(raw_line)
+                    copied_position = self._line_ends[index]
+                    shift += len(raw_line) - (copied_position - line_start)
+                new_line_ends.append(self._line_ends[index] + shift)
+            file.copy_range(source_fd, mapping, copied_position, self._data_size)
+
+        if self._added_lines:
+            if mapping[max(self._data_size - 2, 0):self._data_size] != b"\n\n":
+                file.write(b"\n")
+            file.write(self._ADDED_LINES_MARKER_START.encode())
+            for record in self._added_lines:
+                file.write(record.raw.encode("utf-8"))
+
+        self._line_starts = new_line_starts
+        self._line_ends = new_line_ends
+        self._lines = [line._replace(raw=None) if line.raw is not None else line
+            for line in self._lines]
 
     def _has_patch_marker(self):
+        if self._memory_mapped:
+            marker = self._PATCH_MARKER.encode()
+            return self._mapping[:len(marker)] == marker
+
         return self._lines and self._lines[0].raw == self._PATCH_MARKER
 
     @classmethod
@@ -162,16 +630,39 @@ class NinjaFileProcessor(metaclass=ABCMeta):
     def _escape_string(cls, unescaped_string: str) -> str:
         return re.sub(cls._ESCAPE_RE, "$\\1", unescaped_string)
 
-    @classmethod
-    def _unescape_set(cls, escaped_strings: set) -> set:
-        return set(cls._unescape_string(string) for string in escaped_strings)
-
     @classmethod
     def _unescape_string(cls, escaped_string: str) -> str:
-        return re.sub(cls._UNESCAPE_RE, "\\1", escaped_string)
+        return cls._UNESCAPE_RE.sub("\\1", escaped_string)
+
+    def is_memory_mapped(self) -> bool:
+        return self._memory_mapped
+
+    def is_read_only(self) -> bool:
+        return self._read_only
+
+    def _check_writable(self, operation: str) -> None:
+        if self._read_only:
+            raise NinjaFileProcessorReadOnlyError(self, operation)
+
+    def get_fsync_policy(self) -> FsyncPolicy:
+        return self._fsync_policy
+
+    def set_fsync_policy(self, fsync_policy: FsyncPolicy) -> None:
+        # The policy is used only when the file is saved, so it can be changed after loading.
+        self._fsync_policy = fsync_policy
 
     def is_loaded(self) -> bool:
-        return len(self._lines) > 0
+        return self._is_loaded
+
+    def get_load_count(self) -> int:
+        """Get the number of the times the file has been loaded by this processor."""
+
+        return self._load_count
+
+    def get_statistics(self) -> Dict[str, int]:
+        """Get the size of the loaded data, e.g. for the timing report."""
+
+        return {"lines": len(self._lines)}
 
 
 class NinjaFileProcessorError(Exception):
@@ -186,7 +677,60 @@ class NinjaFileProcessorIOError(NinjaFileProcessorError):
 
 class NinjaFileProcessorParseError(NinjaFileProcessorError):
     def __init__(self, file_processor: NinjaFileProcessor, message: str) -> None:
+        self.message = message
         error_message = (
             f"Cannot parse file {file_processor._file_name}. "
             f"Error at line {file_processor._current_parsed_line}: {message}")
         super().__init__(error_message)
+
+
+class NinjaFileProcessorReadOnlyError(NinjaFileProcessorError):
+    def __init__(self, file_processor: NinjaFileProcessor, operation: str) -> None:
+        error_message = (
+            f"Cannot {operation} file {file_processor._file_name}: it's loaded in the read-only "
+            "mode")
+        super().__init__(error_message)
+
+
+def _load_file_chunk(
+        processor_type: type,
+        file_name: Path,
+        build_directory: Path,
+        memory_mapped: bool,
+        read_only: bool,
+        start: int,
+        end: int) -> dict:
+    """Parse the part of the file in a worker process of the parallel load mode.
+
+    :return: State of the processor after parsing the chunk (see _get_cached_state()), extended
+        with the "is_added_lines_marker_found" and "error" fields.
+    :rtype: dict
+    """
+
+    processor = processor_type(
+        file_name=file_name,
+        build_directory=build_directory,
+        memory_mapped=memory_mapped,
+        read_only=read_only)
+    try:
+        if memory_mapped:
+            # The file part is limited by the main process, so it never contains the marker.
+            processor._open_mapping()
+            processor._load_data_from_mapping(start, end)
+            is_added_lines_marker_found = False
+        else:
+            with open(file_name, "rb") as file:
+                file.seek(start)
+                data = file.read(end - start)
+
+            # Decode the data the same way as open() does in the text mode.
+            is_added_lines_marker_found = processor._load_data_from_file(
+                io.TextIOWrapper(io.BytesIO(data)))
+    except NinjaFileProcessorParseError as ex:
+        return {"error": ex.message, "current_parsed_line": processor._current_parsed_line}
+
+    return {
+        **processor._get_cached_state(),
+        "is_added_lines_marker_found": is_added_lines_marker_found,
+        "error": None,
+    }
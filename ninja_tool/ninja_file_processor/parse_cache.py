@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+ParseCache: Persistent on-disk storage for the parsed state of a ninja file.
+
+The cached state is keyed by the size, modification time and content hash of the source file, so
+it is reused only while the file stays the same. If the modification time has changed, but the
+content is the same (e.g. CMake has rewritten the file with identical data), the cache is still
+considered valid.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+
+def file_digest(file_name: Path) -> str:
+    """Calculate a fast content hash of the file.
+
+    :param file_name: Name of the file to hash.
+    :type file_name: Path
+    :return: Hex digest of the file content.
+    :rtype: str
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_name, "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _CacheKey(NamedTuple):
+    version: int
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+class ParseCache:
+    # Increment this value every time the layout of the cached state is changed.
+    _FORMAT_VERSION = 8
+
+    def __init__(self, cache_file_name: Path) -> None:
+        self._cache_file_name = Path(cache_file_name)
+
+    def load(self, source_file_name: Path) -> Optional[dict]:
+        """Load the cached state for the source file.
+
+        :param source_file_name: Name of the file which parsed state was cached.
+        :type source_file_name: Path
+        :return: Cached state or None if there is no valid cache for the current file content.
+        :rtype: Optional[dict]
+        """
+
+        try:
+            source_stat = os.stat(source_file_name)
+            with open(self._cache_file_name, "rb") as cache_file:
+                key = pickle.load(cache_file)
+                if not self._is_key_valid(key, source_file_name, source_stat):
+                    return None
+                return pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def store(self, source_file_name: Path, source_stat: os.stat_result, state: dict) -> None:
+        """Store the parsed state of the source file.
+
+        :param source_file_name: Name of the parsed file.
+        :type source_file_name: Path
+        :param source_stat: Result of os.stat() for the source file taken before it was parsed.
+            If the file was changed while parsing, the state is not stored.
+        :type source_stat: os.stat_result
+        :param state: State to store; must be picklable.
+        :type state: dict
+        """
+
+        temporary_file_name = f"{self._cache_file_name}.tmp"
+        try:
+            current_stat = os.stat(source_file_name)
+            if (current_stat.st_size, current_stat.st_mtime_ns) != (
+                    source_stat.st_size, source_stat.st_mtime_ns):
+                return
+
+            key = _CacheKey(
+                version=self._FORMAT_VERSION,
+                size=source_stat.st_size,
+                mtime_ns=source_stat.st_mtime_ns,
+                digest=file_digest(source_file_name))
+            with open(temporary_file_name, "wb") as cache_file:
+                pickle.dump(key, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(state, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file_name, self._cache_file_name)
+        except OSError as ex:
+            print(f"Cannot store parse cache {self._cache_file_name}: {ex}")
+
+    def _is_key_valid(
+            self, key: _CacheKey, source_file_name: Path, source_stat: os.stat_result) -> bool:
+        if not isinstance(key, _CacheKey) or key.version != self._FORMAT_VERSION:
+            return False
+
+        if key.size != source_stat.st_size:
+            return False
+
+        if key.mtime_ns == source_stat.st_mtime_ns:
+            return True
+
+        return key.digest == file_digest(source_file_name)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+PatchFingerprintStore: Persistent on-disk storage for the fingerprints of the patched ninja files.
+
+The fingerprint of a file is the content hash of the file written by the last patching, together
+with the hash of the options the file was patched with (e.g. the set of the strengthened targets).
+If the file still has the same content and the options are the same, patching it again would
+produce the same file, so the patching is skipped and the file is left untouched, regardless of
+the modification times of the file and the patch script.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from .parse_cache import file_digest
+
+
+class PatchFingerprint(NamedTuple):
+    options_digest: str
+    size: int
+    digest: str
+
+
+def options_digest(options: Iterable[str]) -> str:
+    """Calculate the hash of the patch options; the order of the options doesn't matter.
+
+    :param options: Options the file is patched with.
+    :type options: Iterable[str]
+    :return: Hex digest of the options.
+    :rtype: str
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    for option in sorted(options):
+        digest.update(option.encode("utf-8", errors="surrogateescape"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class PatchFingerprintStore:
+    # Increment this value every time the layout of the stored data or the patching algorithm
+    # (so the result of patching the same file with the same options) is changed.
+    _FORMAT_VERSION = 1
+
+    def __init__(self, store_file_name: Path) -> None:
+        self._store_file_name = Path(store_file_name)
+
+    def load(self, file_name: Path) -> Optional[PatchFingerprint]:
+        """Load the fingerprint stored by the last patching of the file.
+
+        :param file_name: Name of the patched file.
+        :type file_name: Path
+        :return: Stored fingerprint or None if the file was never patched with the fingerprint.
+        :rtype: Optional[PatchFingerprint]
+        """
+
+        return self._load_all().get(str(file_name))
+
+    @staticmethod
+    def matches(file_name: Path, fingerprint: PatchFingerprint, patch_options_digest: str) -> bool:
+        """Check if the file is the result of the patching the fingerprint was stored for.
+
+        :param file_name: Name of the patched file.
+        :type file_name: Path
+        :param fingerprint: Fingerprint stored by the last patching.
+        :type fingerprint: PatchFingerprint
+        :param patch_options_digest: Digest of the current patch options (see options_digest()).
+        :type patch_options_digest: str
+        :return: Whether the file has the same content as after the last patching, and the
+            options of the last patching are the same.
+        :rtype: bool
+        """
+
+        if fingerprint.options_digest != patch_options_digest:
+            return False
+
+        try:
+            # The hash is calculated only if the size matches.
+            return (os.stat(file_name).st_size == fingerprint.size
+                and file_digest(file_name) == fingerprint.digest)
+        except OSError:
+            return False
+
+    def store(self, file_name: Path, patch_options_digest: str) -> None:
+        """Store the fingerprint of the file which has just been patched.
+
+        :param file_name: Name of the patched file.
+        :type file_name: Path
+        :param patch_options_digest: Digest of the options the file was patched with.
+        :type patch_options_digest: str
+        """
+
+        fingerprints = self._load_all()
+        temporary_file_name = f"{self._store_file_name}.tmp"
+        try:
+            fingerprints[str(file_name)] = PatchFingerprint(
+                options_digest=patch_options_digest,
+                size=os.stat(file_name).st_size,
+                digest=file_digest(file_name))
+            with open(temporary_file_name, "wb") as store_file:
+                pickle.dump(self._FORMAT_VERSION, store_file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(fingerprints, store_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file_name, self._store_file_name)
+        except OSError as ex:
+            print(f"Cannot store patch fingerprint {self._store_file_name}: {ex}")
+
+    def _load_all(self) -> Dict[str, PatchFingerprint]:
+        try:
+            with open(self._store_file_name, "rb") as store_file:
+                if pickle.load(store_file) != self._FORMAT_VERSION:
+                    return {}
+                fingerprints = pickle.load(store_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return {}
+
+        return fingerprints if isinstance(fingerprints, dict) else {}
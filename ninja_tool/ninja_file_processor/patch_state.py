@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+PatchState: Persistent on-disk storage for the results of the previous patching of build.ninja.
+
+The state contains the fingerprints of all the "build" statements of the patched graph and the
+transitive dependencies calculated for the strengthened targets. When build.ninja is regenerated,
+the fingerprints are compared with the ones of the new graph, and the transitive dependencies are
+recalculated only for the targets which can reach the changed statements.
+"""
+
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+
+class PatchStateData(NamedTuple):
+    # Fingerprints of the "build" statements by the first output of the statement.
+    edge_fingerprints: Dict[str, int]
+    # Transitive dependencies by the (escaped) name of the strengthened target.
+    transitive_dependencies: Dict[str, List[str]]
+
+
+class PatchState:
+    # Increment this value every time the layout of the stored state is changed.
+    _FORMAT_VERSION = 1
+
+    def __init__(self, state_file_name: Path) -> None:
+        self._state_file_name = Path(state_file_name)
+
+    def load(self) -> Optional[PatchStateData]:
+        """Load the state stored by the previous patching.
+
+        :return: Stored state or None if there is no valid stored state.
+        :rtype: Optional[PatchStateData]
+        """
+
+        try:
+            with open(self._state_file_name, "rb") as state_file:
+                if pickle.load(state_file) != self._FORMAT_VERSION:
+                    return None
+                state = pickle.load(state_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+        return state if isinstance(state, PatchStateData) else None
+
+    def store(self, state: PatchStateData) -> None:
+        temporary_file_name = f"{self._state_file_name}.tmp"
+        try:
+            with open(temporary_file_name, "wb") as state_file:
+                pickle.dump(self._FORMAT_VERSION, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file_name, self._state_file_name)
+        except OSError as ex:
+            print(f"Cannot store patch state {self._state_file_name}: {ex}")
@@ -14,6 +14,7 @@ import platform
 from pathlib import Path
 from typing import Tuple
 
+from .file_writer import FsyncPolicy
 from .ninja_file_processor import (
     Line,
     LineType,
@@ -33,10 +34,31 @@ class RulesNinjaFileProcessor(NinjaFileProcessor):  # pylint:disable=too-few-pub
         r'(?P<is_rule>rule (?P<rule_name>.+?))\s+'
         r'|(?P<is_command>\s+command\s+=\s+(?P<command>.+))\s*')
 
-    def __init__(self, file_name: Path, build_directory: Path, debug_output: bool = False) -> None:
+    _LINE_OF_INTEREST_RE = re.compile(rb"^(?:rule |[ \t]+command)", re.M)
+
+    def __init__(self,
+            file_name: Path,
+            build_directory: Path,
+            debug_output: bool = False,
+            memory_mapped: bool = False,
+            fingerprint_file_name: Path = None,
+            fsync_policy: FsyncPolicy = FsyncPolicy.NONE,
+            read_only: bool = False) -> None:
         self._line_number_by_rule = {}
         super().__init__(
-            file_name=file_name, build_directory=build_directory, debug_output=debug_output)
+            file_name=file_name,
+            build_directory=build_directory,
+            debug_output=debug_output,
+            memory_mapped=memory_mapped,
+            fingerprint_file_name=fingerprint_file_name,
+            fsync_policy=fsync_policy,
+            read_only=read_only)
+        # The rerun command depends on the location of the interpreter and of ninja_tool.
+        self.set_patch_options([self._get_self_run_string()])
+
+    def _reset_data(self) -> None:
+        super()._reset_data()
+        self._line_number_by_rule = {}
 
     def _parse_line(self, line: str) -> Line:
         match = self._LINE_RE.match(line)
@@ -52,13 +74,29 @@ class RulesNinjaFileProcessor(NinjaFileProcessor):  # pylint:disable=too-few-pub
 
         assert False, "Parsing regex error for line {line!r}"
 
-    def _consume_line_object(self, line_object: Line) -> None:
+    def _consume_line_object(self, line_object: Line) -> Line:
         if line_object.type == LineType.RULE:
             self._line_number_by_rule[line_object.parsed] = len(self._lines)
 
+        return line_object
+
+    def _get_cached_state(self) -> dict:
+        return {**super()._get_cached_state(), "line_number_by_rule": self._line_number_by_rule}
+
+    def _restore_cached_state(self, state: dict) -> None:
+        super()._restore_cached_state(state)
+        self._line_number_by_rule = state["line_number_by_rule"]
+
+    def _merge_chunk_state(self, state: dict) -> None:
+        line_offset = len(self._lines)
+        for rule, line_number in state["line_number_by_rule"].items():
+            self._line_number_by_rule[rule] = line_number + line_offset
+        super()._merge_chunk_state(state)
+
     def patch_cmake_rerun(self) -> None:
         """Adds ninja_tool call on CMake regeneration."""
 
+        self._check_writable("patch")
         try:
             command_line_index, command = self._find_command_by_rule(
                 self._RERUN_CMAKE_RULE)
@@ -66,8 +104,7 @@ class RulesNinjaFileProcessor(NinjaFileProcessor):  # pylint:disable=too-few-pub
             print(f"Can't find {self._RERUN_CMAKE_RULE} in rules.ninja file.")
             return
 
-        self_run_string = (
-            f'"{sys.executable}" "{os.path.abspath(sys.argv[0])}" {self._SELF_RUN_OPTIONS}')
+        self_run_string = self._get_self_run_string()
         if self_run_string in command:  # ninja_tool is already added.
             return
 
@@ -84,6 +121,9 @@ class RulesNinjaFileProcessor(NinjaFileProcessor):  # pylint:disable=too-few-pub
 
         self._is_patch_applied = True  # pylint:disable=attribute-defined-outside-init
 
+    def _get_self_run_string(self) -> str:
+        return f'"{sys.executable}" "{os.path.abspath(sys.argv[0])}" {self._SELF_RUN_OPTIONS}'
+
     def _find_command_by_rule(self, rule: str) -> Tuple[int, str]:
         if rule not in self._line_number_by_rule:
             raise self.RuleLookupError(f"Command {rule} is not found")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+Calculation of the transitive dependencies of several targets of a BuildGraph in a single sweep.
+
+The subgraph reachable from the targets is condensed into strongly connected components (the
+iterative Tarjan algorithm), which are emitted in the reverse topological order, so the set of the
+nodes reachable from a component is calculated once as a union of the sets of its successors and
+is shared by all the targets depending on it. The sets are stored as bitsets (Python ints) over
+the non-phony nodes produced by the edges; the bitset of a node is released as soon as all the
+nodes of the other components depending on it are processed. The components are collected before
+they are processed, so the dependencies within a component (including the self-loops) are not
+counted as consumers which would never release the bitset.
+"""
+
+from itertools import compress
+from typing import Dict, Iterable, List
+
+from .build_graph import BuildGraph
+
+_BINARY_DIGIT_VALUES = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def collect_transitive_dependencies(
+        graph: BuildGraph, target_nodes: Iterable[int]) -> Dict[int, List[int]]:
+    """Collect the nodes produced by the edges (except for the phony ones) on which the targets
+    depend directly or transitively. Explicit dependencies of the targets are not included in the
+    result.
+
+    :param graph: Finalized build graph.
+    :type graph: BuildGraph
+    :param target_nodes: Nodes of the targets; all of them must be produced by some edge.
+    :type target_nodes: Iterable[int]
+    :return: Lists of the dependency nodes by the target node.
+    :rtype: Dict[int, List[int]]
+    """
+
+    target_nodes = set(target_nodes)
+    successors = _collect_successors(graph, target_nodes)
+    components = []
+    _find_strongly_connected_components(target_nodes, successors, components.append)
+    component_ids = {node: i for i, component in enumerate(components) for node in component}
+
+    # Number of the not yet processed nodes depending on the node, to release its bitset in time.
+    pending_consumer_counts = _count_consumers(successors, component_ids)
+
+    producers = graph.node_producers
+    is_phony = graph.is_phony
+    # Bitset of the node itself and all the nodes reachable from it, by the node.
+    reachable_bits: Dict[int, int] = {}
+    # Bit index by the node, and the node by the bit index.
+    node_bit_indexes: Dict[int, int] = {}
+    bit_nodes = []
+    result = {}
+
+    def release(node: int) -> int:
+        bits = reachable_bits[node]
+        pending_consumer_counts[node] -= 1
+        if pending_consumer_counts[node] == 0:
+            del reachable_bits[node]
+        return bits
+
+    def process_component(component: List[int]) -> None:
+        own_bits = 0
+        for node in component:
+            if not is_phony(producers[node]):
+                node_bit_indexes[node] = len(bit_nodes)
+                own_bits |= 1 << len(bit_nodes)
+                bit_nodes.append(node)
+
+        component_id = component_ids[component[0]]
+        dependency_bits = 0
+        for node in component:
+            for input_node in successors[node]:
+                if component_ids[input_node] != component_id:
+                    dependency_bits |= release(input_node)
+                else:
+                    # The node is in a cycle (maybe a self-loop), and all the nodes of a cycle are
+                    # reachable from each of its nodes.
+                    dependency_bits |= own_bits
+
+        for node in component:
+            if pending_consumer_counts.get(node, 0) > 0:
+                reachable_bits[node] = own_bits | dependency_bits
+            if node in target_nodes:
+                explicit_dependency_bits = 0
+                for input_node in graph.edge_explicit_inputs(producers[node]):
+                    bit_index = node_bit_indexes.get(input_node)
+                    if bit_index is not None:
+                        explicit_dependency_bits |= 1 << bit_index
+                result[node] = _bits_to_nodes(
+                    dependency_bits & ~explicit_dependency_bits, bit_nodes)
+
+    for component in components:
+        process_component(component)
+    return result
+
+
+def _collect_successors(graph: BuildGraph, root_nodes: Iterable[int]) -> Dict[int, List[int]]:
+    """Collect the dependencies of all the nodes reachable from the root nodes. Source files are
+    not produced by any edge and are never collected, so they are not included.
+    """
+
+    producers = graph.node_producers
+    no_edge = BuildGraph.NO_EDGE
+    successors = {}
+    unchecked_nodes = list(root_nodes)
+    while unchecked_nodes:
+        node = unchecked_nodes.pop()
+        if node in successors:
+            continue
+        node_successors = [
+            input_node for input_node in graph.edge_inputs(producers[node])
+            if producers[input_node] != no_edge]
+        successors[node] = node_successors
+        unchecked_nodes.extend(node_successors)
+
+    return successors
+
+
+def _count_consumers(
+        successors: Dict[int, List[int]], component_ids: Dict[int, int]) -> Dict[int, int]:
+    """Count the nodes of the other components depending on every node; the nodes without such
+    consumers are omitted.
+    """
+
+    consumer_counts = {}
+    for node, node_successors in successors.items():
+        component_id = component_ids[node]
+        for input_node in node_successors:
+            if component_ids[input_node] != component_id:
+                consumer_counts[input_node] = consumer_counts.get(input_node, 0) + 1
+    return consumer_counts
+
+
+def _find_strongly_connected_components(
+        root_nodes: Iterable[int], successors: Dict[int, List[int]], process_component) -> None:
+    """Iterative Tarjan algorithm; the components are passed to process_component() in the
+    reverse topological order (every component goes after all the components reachable from it).
+    """
+
+    indexes = {}
+    low_links = {}
+    is_on_stack = set()
+    stack = []
+
+    for root_node in root_nodes:
+        if root_node in indexes:
+            continue
+
+        indexes[root_node] = low_links[root_node] = len(indexes)
+        stack.append(root_node)
+        is_on_stack.add(root_node)
+        work = [(root_node, iter(successors[root_node]))]
+        while work:
+            node, successor_iterator = work[-1]
+            for successor in successor_iterator:
+                if successor not in indexes:
+                    indexes[successor] = low_links[successor] = len(indexes)
+                    stack.append(successor)
+                    is_on_stack.add(successor)
+                    work.append((successor, iter(successors[successor])))
+                    break
+                if successor in is_on_stack and indexes[successor] < low_links[node]:
+                    low_links[node] = indexes[successor]
+            else:
+                work.pop()
+                if work and low_links[node] < low_links[work[-1][0]]:
+                    low_links[work[-1][0]] = low_links[node]
+                if low_links[node] == indexes[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        is_on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    process_component(component)
+
+
+def _bits_to_nodes(bits: int, bit_nodes: List[int]) -> List[int]:
+    # The binary representation starts with the highest bit; it is translated to the selectors of
+    # the nodes in the reverse order.
+    selectors = format(bits, "b").encode().translate(_BINARY_DIGIT_VALUES)
+    return list(compress(reversed(bit_nodes[:len(selectors)]), selectors))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+NinjaLogProcessor: Reader of the durations of the build commands recorded by ninja in the
+".ninja_log" file of the build directory.
+
+Every line of the log describes a run of the command producing one output: the start and the end
+time (in milliseconds since the start of the build), the modification time of the output, the
+output path and the hash of the command. Ninja appends a line after every run, so the same output
+can be mentioned several times; the last line wins, as in ninja itself.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict
+
+
+class NinjaLogProcessorError(Exception):
+    pass
+
+
+class NinjaLogProcessor:
+    LOG_FILE_NAME = ".ninja_log"
+
+    # Versions of the log format which have the same layout of the lines.
+    SUPPORTED_VERSIONS = range(5, 8)
+
+    _HEADER_RE = re.compile(r"# ninja log v(?P<version>\d+)\s*")
+
+    def __init__(self, build_dir: Path):
+        self._file_name = build_dir / self.LOG_FILE_NAME
+        self._durations_by_output: Dict[str, float] = {}
+        self._is_loaded = False
+
+    def load_data(self) -> None:
+        """Read the log. If it doesn't exist (nothing has been built yet), no durations are known.
+
+        :raises NinjaLogProcessorError: The format of the log is not supported.
+        """
+
+        self._durations_by_output = {}
+        try:
+            log_file = open(self._file_name, encoding="utf-8", errors="surrogateescape")
+        except FileNotFoundError:
+            self._is_loaded = True
+            return
+
+        with log_file:
+            header = log_file.readline()
+            match = self._HEADER_RE.fullmatch(header)
+            if not match or int(match["version"]) not in self.SUPPORTED_VERSIONS:
+                raise NinjaLogProcessorError(
+                    f"Unsupported format of {self._file_name}: {header.strip()!r}")
+
+            durations_by_output = self._durations_by_output
+            for line in log_file:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 5 or not fields[0].isdigit() or not fields[1].isdigit():
+                    continue
+                start_time, end_time, _, output, _ = fields
+                durations_by_output[output] = (int(end_time) - int(start_time)) / 1000
+
+        self._is_loaded = True
+
+    def is_loaded(self) -> bool:
+        return self._is_loaded
+
+    def get_durations(self) -> Dict[str, float]:
+        """
+        :return: Durations (in seconds) of the last runs of the commands by the output paths, as
+            they are written in the log (unescaped).
+        :rtype: Dict[str, float]
+        """
+
+        return self._durations_by_output
+
+    def get_statistics(self) -> Dict[str, int]:
+        return {"outputs": len(self._durations_by_output)}
@@ -8,21 +8,39 @@ from __future__ import annotations
 import os
 import sys
 import argparse
+import json
 import traceback
 import shlex
-import subprocess
-from typing import List, NamedTuple, Optional, Set
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Set, Tuple
 from pathlib import Path
 
+from build_directory_scanner import BuildDirectoryScanner
+from command_scheduler import CommandScheduler, CommandSchedulerError, ScheduledCommand
+from known_files_index import KnownFilesIndex
 from ninja_deps_processor import NinjaDepsProcessor
+from ninja_log_processor import NinjaLogProcessor, NinjaLogProcessorError
+from ninja_file_processor.affected_targets_query import AffectedTargetsQuery
+from ninja_file_processor.file_writer import FsyncPolicy
+from ninja_file_processor.graph_analysis import GraphAnalysisReport
 from ninja_file_processor.ninja_file_processor import NinjaFileProcessorError
 from ninja_file_processor.build_ninja_processor import BuildNinjaFileProcessor
 from ninja_file_processor.rules_ninja_processor import RulesNinjaFileProcessor
+from ninja_tool_server import NinjaToolServer, NinjaToolServerError, SERVED_COMMANDS, send_request
+from phase_profiler import profiler
 
 NINJA_BUILD_FILE_NAME = 'build.ninja'
 NINJA_PREBUILD_FILE_NAME = 'pre_build.ninja_tool'
 KNOWN_FILES_FILE_NAME = "known_files.txt"
 PERSISTENT_KNOWN_FILES_FILE_NAME = "persistent_known_files.txt"
+PARSE_CACHE_FILE_NAME = ".ninja_tool_cache"
+PATCH_STATE_FILE_NAME = ".ninja_tool_patch_state"
+PATCH_FINGERPRINT_FILE_NAME = ".ninja_tool_patch_fingerprints"
+# Default number of the entries in the lists of the build analysis report.
+ANALYSIS_TOP_COUNT = 20
+# Number of files removed by one task of the thread pool.
+REMOVAL_BATCH_SIZE = 256
 ALLOWED_COMMANDS = [
     "strengthen",
     "run",
@@ -30,18 +48,38 @@ ALLOWED_COMMANDS = [
     "list_unknown_files",
     "generate_affected_targets_list",
     "add_directories_to_known_files",
+    "analyze_build",
 ]
 
+class AffectedTargetsListArguments(NamedTuple):
+    source_dir: Path
+    changed_files_list_file_name: str
+    affected_targets_list_file_name: str
+    # Filters of the affected targets; None means all the affected targets are listed.
+    query: AffectedTargetsQuery = None
+    # "text" or "json".
+    output_format: str = "text"
+
+
+class BuildAnalysisArguments(NamedTuple):
+    report_file_name: str
+    top_count: int = ANALYSIS_TOP_COUNT
+    # "text" or "json".
+    output_format: str = "text"
+
+
 class ParsedScriptData(NamedTuple):
     strengthened_targets: Set[str] = set()
-    commands_to_run: List[List[str]] = list()
+    commands_to_run: List[ScheduledCommand] = list()
     do_clean: bool = None
     do_list_unknown: bool = None
     known_file_names: Set[str] = set()
-    changed_files_list_file_name: str = None
-    affected_targets_list_file_name: str = None
-    source_dir: Path = None
+    # Arguments and options of the "generate_affected_targets_list" command are kept together, so
+    # the last command of the script replaces the previous ones as a whole.
+    affected_targets_list: AffectedTargetsListArguments = None
     added_known_directories: Set[str] = set()
+    # Arguments and options of the last "analyze_build" command.
+    build_analysis: BuildAnalysisArguments = None
 
     @classmethod
     def merge(cls, sources: List[ParsedScriptData]) -> ParsedScriptData:
@@ -59,10 +97,9 @@ class ParsedScriptData(NamedTuple):
             do_clean=any([s for s in sources if s.do_clean]),
             do_list_unknown=any([s for s in sources if s.do_list_unknown]),
             known_file_names={n for s in sources for n in s.known_file_names},
-            changed_files_list_file_name=_last_value_or_none("changed_files_list_file_name"),
-            affected_targets_list_file_name=_last_value_or_none("affected_targets_list_file_name"),
-            source_dir=_last_value_or_none("source_dir"),
-            added_known_directories={d for s in sources for d in s.added_known_directories})
+            affected_targets_list=_last_value_or_none("affected_targets_list"),
+            added_known_directories={d for s in sources for d in s.added_known_directories},
+            build_analysis=_last_value_or_none("build_analysis"))
 
 
 def clean_build_directory(build_dir: Path,
@@ -72,87 +109,132 @@ def clean_build_directory(build_dir: Path,
 
     if build_file_processor is None:
         build_filename = build_dir / NINJA_BUILD_FILE_NAME
-        build_file_processor = BuildNinjaFileProcessor(build_filename, build_directory=build_dir)
+        build_file_processor = BuildNinjaFileProcessor(
+            build_filename,
+            build_directory=build_dir,
+            cache_file_name=build_dir / PARSE_CACHE_FILE_NAME,
+            read_only=True)
+
+    _load_build_file(build_file_processor)
+
+    with profiler.phase("collect_known_files"):
+        all_known_files = KnownFilesIndex(build_dir)
+        all_known_files.add_files(build_file_processor.get_known_files())
+        add_files_from_list_file(all_known_files, build_dir / KNOWN_FILES_FILE_NAME)
+        add_files_from_list_file(all_known_files, build_dir / PERSISTENT_KNOWN_FILES_FILE_NAME)
+        if (build_dir / "conan_imported_files.txt").exists():
+            add_files_from_conan_manifest(all_known_files, build_dir / "conan_imported_files.txt")
+        else:
+            add_files_from_conan_manifest(
+                all_known_files, build_dir / "conan_imports_manifest.txt")
+        for file_name in additional_known_files or ():
+            all_known_files.add_file(file_name)
+        # The timing report and the profiles may be written to the build directory.
+        all_known_files.add_files(file_name.as_posix() for file_name in profiler.get_output_files())
+
+    start_time = time.perf_counter()
+    with profiler.phase("scan_build_directory"):
+        extra_files = find_extra_files(build_dir, all_known_files)
+    profiler.count("unknown_files", len(extra_files))
 
-    if not build_file_processor.is_loaded():
-        build_file_processor.load_data()
+    if remove_unknown_files:
+        print("Cleaning build directory...")
 
-    build_files = build_file_processor.get_known_files()
-    known_files = get_files_from_list_file(build_dir / KNOWN_FILES_FILE_NAME)
-    persistent_known_files = get_files_from_list_file(build_dir / PERSISTENT_KNOWN_FILES_FILE_NAME)
-    if (build_dir / "conan_imported_files.txt").exists():
-        conan_files = get_files_from_conan_manifest(build_dir / "conan_imported_files.txt")
+    with profiler.phase("remove_files" if remove_unknown_files else "list_files"):
+        file_count, total_size = process_extra_files(extra_files, remove=remove_unknown_files)
+    duration = time.perf_counter() - start_time
+    if remove_unknown_files:
+        profiler.count("removed_files", file_count)
+        profiler.count("removed_bytes", total_size)
+        print(f"Removed {file_count} files ({_format_size(total_size)}) in {duration:.2f} s")
+        print("Done")
     else:
-        conan_files = get_files_from_conan_manifest(build_dir / "conan_imports_manifest.txt")
-
-    all_known_files = additional_known_files if additional_known_files else set()
-    for file_name in build_files | known_files | persistent_known_files | conan_files:
-        file_path = Path(file_name)
-        if file_path.is_absolute():
-            try:
-                file_path_relative = file_path.relative_to(build_dir)
-                all_known_files.add(file_path_relative.as_posix())
-            except ValueError:
-                pass
-        else:
-            all_known_files.add(file_path.as_posix())
+        # The summary goes to stderr, so the output still can be used as a list of the files.
+        print(
+            f"Found {file_count} unknown files ({_format_size(total_size)}) in {duration:.2f} s",
+            file=sys.stderr)
 
-    extra_files = find_extra_files(build_dir, all_known_files)
 
-    if remove_unknown_files:
-        print("Cleaning build directory...")
+def process_extra_files(files: List[os.DirEntry], remove: bool) -> Tuple[int, int]:
+    """Remove the files or print their names. The files are processed in batches by a thread pool.
+
+    :param files: Entries of the files found by find_extra_files().
+    :type files: List[os.DirEntry]
+    :param remove: Whether to remove the files; if False, only their names are printed.
+    :type remove: bool
+    :return: Number of the processed files and their total size.
+    :rtype: Tuple[int, int]
+    """
+
+    batches = [
+        files[i:i + REMOVAL_BATCH_SIZE] for i in range(0, len(files), REMOVAL_BATCH_SIZE)]
+    file_count, total_size = 0, 0
+    with ThreadPoolExecutor() as executor:
+        for batch, (batch_file_count, batch_size) in zip(
+                batches, executor.map(_process_extra_file_batch, batches, [remove] * len(batches))):
+            if not remove:
+                for file in batch:
+                    print(file.path)
+            file_count += batch_file_count
+            total_size += batch_size
+
+    return file_count, total_size
 
-    for file in extra_files:
-        if not os.path.isfile(file) and not os.path.islink(file):
+
+def _process_extra_file_batch(files: List[os.DirEntry], remove: bool) -> Tuple[int, int]:
+    file_count, total_size = 0, 0
+    for file in files:
+        try:
+            total_size += file.stat(follow_symlinks=False).st_size
+            if remove:
+                os.remove(file.path)
+        except FileNotFoundError:
+            # The file was removed by someone else after the build directory was scanned.
             continue
-        if remove_unknown_files:
-            os.remove(file)
-        else:
-            print(file)
+        file_count += 1
+
+    return file_count, total_size
 
-    if remove_unknown_files:
-        print("Done")
 
+def _format_size(size: int) -> str:
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}" if unit != "bytes" else f"{size} {unit}"
 
-def get_files_from_list_file(list_file_name: Path) -> set:
+
+def add_files_from_list_file(known_files: KnownFilesIndex, list_file_name: Path) -> None:
     if not list_file_name.is_file():
-        return set()
+        return
 
-    result = set()
     with open(list_file_name) as list_file:
         for line in list_file:
             entry = line.strip()
-            path = Path(entry)
+            if not entry:
+                continue
 
             # If an entry ends with a slash, consider it as a directory which contents should be
-            # ignored. All files will be added to the list of known files.
-            if entry.endswith("/") and path.exists():
-                for root, _, files in os.walk(path):
-                    root = os.path.normpath(root)
-                    for file in files:
-                        result.add(str(Path(root) / file))
+            # ignored. The directory is added to the index as a whole, without listing its files.
+            if entry.endswith("/"):
+                known_files.add_directory(entry)
+            else:
+                known_files.add_file(entry)
 
-            result.add(str(path))
 
-    return result
-
-
-def get_files_from_conan_manifest(conan_manifest_file_name: Path) -> set:
-    result = set()
+def add_files_from_conan_manifest(
+        known_files: KnownFilesIndex, conan_manifest_file_name: Path) -> None:
     try:
         with open(conan_manifest_file_name) as manifest:
             for line in manifest:
                 sep = line.find(': ')
                 if sep > 0:
-                    file_name = line[:sep]
-                    result.add(str(Path(file_name).as_posix()))
+                    known_files.add_file(line[:sep])
     except OSError:
         pass
 
-    return result
 
-
-def find_extra_files(build_dir: Path, known_files: set) -> list:
+def find_extra_files(build_dir: Path, known_files: KnownFilesIndex) -> List[os.DirEntry]:
     """Find files not needed to the build."""
 
     exclusion_dirs = {
@@ -175,6 +257,9 @@ def find_extra_files(build_dir: Path, known_files: set) -> list:
         NINJA_BUILD_FILE_NAME,
         NINJA_PREBUILD_FILE_NAME,
         PERSISTENT_KNOWN_FILES_FILE_NAME,
+        PARSE_CACHE_FILE_NAME,
+        PATCH_STATE_FILE_NAME,
+        PATCH_FINGERPRINT_FILE_NAME,
         "compile_commands.json",
         "CTestTestfile.cmake",
         "cmake_install.cmake",
@@ -192,76 +277,283 @@ def find_extra_files(build_dir: Path, known_files: set) -> list:
         "pre_build.log",
     }
 
-    result = []
-
-    for file in build_dir.rglob('*'):
-        if any(d in file.parent.parts for d in exclusion_dirs):
-            continue
-        if file.name in exclusions or file.suffix in exclusion_extensions:
-            continue
-        if str(file.relative_to(build_dir).as_posix()) in known_files:
-            continue
-
-        result.append(build_dir / file)
+    scanner = BuildDirectoryScanner(
+        excluded_directory_names=exclusion_dirs,
+        excluded_file_names=exclusions,
+        excluded_extensions=exclusion_extensions)
+    unknown_files = scanner.find_unknown_files(build_dir, known_files)
+    profiler.count("scanned_files", scanner.scanned_entry_count)
+    return unknown_files
 
-    return result
 
-
-def execute_command(build_dir: Path, command_with_args: List[str], force_patch: bool) -> None:
+def execute_command(
+        build_dir: Path,
+        command_with_args: List[str],
+        force_patch: bool,
+        parse_jobs: int = 1,
+        memory_mapped: bool = False,
+        dry_run: bool = False,
+        fsync_policy: FsyncPolicy = FsyncPolicy.NONE,
+        run_jobs: int = 1,
+        run_log_dir: Path = None) -> None:
     script_data = _parse_splitted_command_line(command_with_args[0], command_with_args[1:])
-    _execute(build_dir, script_data, force_patch)
+    _execute(
+        build_dir, script_data, force_patch,
+        parse_jobs=parse_jobs, memory_mapped=memory_mapped, dry_run=dry_run,
+        fsync_policy=fsync_policy, run_jobs=run_jobs, run_log_dir=run_log_dir)
 
 
-def execute_script(build_dir: Path, script_file_name: str, force_patch: bool) -> None:
+def execute_script(
+        build_dir: Path,
+        script_file_name: str,
+        force_patch: bool,
+        parse_jobs: int = 1,
+        memory_mapped: bool = False,
+        dry_run: bool = False,
+        fsync_policy: FsyncPolicy = FsyncPolicy.NONE,
+        run_jobs: int = 1,
+        run_log_dir: Path = None) -> None:
     script_data = _parse_script_data(script_file_name)
-    _execute(build_dir, script_data, force_patch)
+    _execute(
+        build_dir, script_data, force_patch,
+        parse_jobs=parse_jobs, memory_mapped=memory_mapped, dry_run=dry_run,
+        fsync_policy=fsync_policy, run_jobs=run_jobs, run_log_dir=run_log_dir)
 
 
 def _execute(
         build_dir: Path,
         script_data: ParsedScriptData,
         force_patch: bool,
-        script_file_name: str = None):
+        script_file_name: str = None,
+        parse_jobs: int = 1,
+        memory_mapped: bool = False,
+        dry_run: bool = False,
+        fsync_policy: FsyncPolicy = FsyncPolicy.NONE,
+        run_jobs: int = 1,
+        run_log_dir: Path = None,
+        build_file_processor: BuildNinjaFileProcessor = None,
+        ninja_deps_processor: NinjaDepsProcessor = None):
     build_file_name = build_dir / NINJA_BUILD_FILE_NAME
-    build_file_processor = BuildNinjaFileProcessor(build_file_name, build_directory=build_dir)
-
-    if script_data.changed_files_list_file_name:
-        generate_list_of_targets_affected_by_listed_files(
-            build_dir=build_dir, source_dir=script_data.source_dir,
-            changed_files_list_file_name=script_data.changed_files_list_file_name,
-            affected_targets_list_file_name=script_data.affected_targets_list_file_name,
-            build_file_processor=build_file_processor)
+    if build_file_processor is None:
+        # If nothing is patched, the raw text of build.ninja is not needed.
+        build_file_processor = _create_build_file_processor(
+            build_dir, parse_jobs=parse_jobs, memory_mapped=memory_mapped,
+            fsync_policy=fsync_policy, read_only=not _has_data_for_patching(script_data))
+    if ninja_deps_processor is None:
+        ninja_deps_processor = NinjaDepsProcessor(build_dir)
+
+    if script_data.affected_targets_list is not None:
+        arguments = script_data.affected_targets_list
+        with profiler.phase("generate_affected_targets_list"):
+            generate_list_of_targets_affected_by_listed_files(
+                build_dir=build_dir, source_dir=arguments.source_dir,
+                changed_files_list_file_name=arguments.changed_files_list_file_name,
+                affected_targets_list_file_name=arguments.affected_targets_list_file_name,
+                query=arguments.query,
+                output_format=arguments.output_format,
+                build_file_processor=build_file_processor,
+                ninja_deps_processor=ninja_deps_processor)
+
+    if script_data.build_analysis is not None:
+        arguments = script_data.build_analysis
+        with profiler.phase("analyze_build"):
+            analyze_build(
+                build_dir=build_dir,
+                report_file_name=arguments.report_file_name,
+                top_count=arguments.top_count,
+                output_format=arguments.output_format,
+                build_file_processor=build_file_processor,
+                ninja_deps_processor=ninja_deps_processor)
 
     if script_data.added_known_directories:
-        update_persistent_known_files_file(
-             build_dir=build_dir, directories=script_data.added_known_directories)
+        with profiler.phase("add_known_directories"):
+            update_persistent_known_files_file(
+                 build_dir=build_dir, directories=script_data.added_known_directories)
+
+    scheduler = None
+    known_file_names = script_data.known_file_names
+    if script_data.commands_to_run:
+        scheduler = CommandScheduler(
+            script_data.commands_to_run,
+            jobs=run_jobs,
+            log_dir=run_log_dir or build_dir / "build_logs")
+        # The logs of the "run" commands may be written to the build directory.
+        known_file_names = known_file_names | {
+            file_name.as_posix() for file_name in scheduler.get_log_file_names()}
 
     if script_data.do_list_unknown:
-        clean_build_directory(build_dir=build_dir, build_file_processor=build_file_processor,
-            additional_known_files=script_data.known_file_names, remove_unknown_files=False)
+        with profiler.phase("list_unknown_files"):
+            clean_build_directory(build_dir=build_dir, build_file_processor=build_file_processor,
+                additional_known_files=known_file_names, remove_unknown_files=False)
 
     if script_data.do_clean:
-        clean_build_directory(build_dir=build_dir, build_file_processor=build_file_processor,
-            additional_known_files=script_data.known_file_names)
+        # In the dry run mode, the files which would be removed are only listed.
+        with profiler.phase("clean"):
+            clean_build_directory(build_dir=build_dir, build_file_processor=build_file_processor,
+                additional_known_files=known_file_names,
+                remove_unknown_files=not dry_run)
 
     if _has_data_for_patching(script_data):
         if script_file_name is not None:
             script_timestamp = os.path.getmtime(script_file_name)
         else:
             script_timestamp = None
-        patch_ninja_build(file_name=build_file_name,
-            strengthened_targets=script_data.strengthened_targets,
-            script_timestamp=script_timestamp,
-            build_file_processor=build_file_processor,
-            force_patch=force_patch)
-
-    for command in script_data.commands_to_run:
-        print(f"Running {command}...")
-        subprocess.call(command)
+        with profiler.phase("patch"):
+            patch_ninja_build(file_name=build_file_name,
+                strengthened_targets=script_data.strengthened_targets,
+                script_timestamp=script_timestamp,
+                build_file_processor=build_file_processor,
+                force_patch=force_patch)
+
+    if scheduler is not None:
+        with profiler.phase("run"):
+            results = scheduler.run()
+        profiler.count("commands_run", len(results))
+
+    # All the commands share build_file_processor, so build.ninja must be loaded at most once.
+    load_count = build_file_processor.get_load_count()
+    profiler.set_counter("build_ninja_loads", load_count)
+    if load_count > 1:
+        print(f"Warning: {build_file_name} has been loaded {load_count} times")
 
     print("All done")
 
 
+def _create_build_file_processor(
+        build_dir: Path,
+        parse_jobs: int = 1,
+        memory_mapped: bool = False,
+        fsync_policy: FsyncPolicy = FsyncPolicy.NONE,
+        read_only: bool = False) -> BuildNinjaFileProcessor:
+    return BuildNinjaFileProcessor(
+        build_dir / NINJA_BUILD_FILE_NAME,
+        build_directory=build_dir,
+        cache_file_name=build_dir / PARSE_CACHE_FILE_NAME,
+        parse_jobs=parse_jobs,
+        memory_mapped=memory_mapped,
+        patch_state_file_name=build_dir / PATCH_STATE_FILE_NAME,
+        fingerprint_file_name=build_dir / PATCH_FINGERPRINT_FILE_NAME,
+        fsync_policy=fsync_policy,
+        read_only=read_only)
+
+
+class _ServerSession:
+    """Data of the build directory kept loaded by the server (see ninja_tool_server.py) between
+    the requests. The data is reloaded when build.ninja or .ninja_deps is changed, including the
+    changes made by the requests themselves (e.g. patching).
+    """
+
+    def __init__(self,
+            build_dir: Path,
+            parse_jobs: int = 1,
+            memory_mapped: bool = False,
+            fsync_policy: FsyncPolicy = FsyncPolicy.NONE) -> None:
+        self._build_dir = build_dir
+        self._parse_jobs = parse_jobs
+        self._memory_mapped = memory_mapped
+        self._fsync_policy = fsync_policy
+        self._build_file_processor = None
+        self._build_file_signature = None
+        self._ninja_deps_processor = None
+        self._ninja_deps_signature = None
+
+    def refresh(self) -> None:
+        # The signature is taken before loading, so the changes made while loading are detected
+        # by the next refresh.
+        build_file_signature = _get_file_signature(self._build_dir / NINJA_BUILD_FILE_NAME)
+        if self._build_file_processor is None or (
+                build_file_signature != self._build_file_signature):
+            build_file_processor = _create_build_file_processor(
+                self._build_dir, parse_jobs=self._parse_jobs, memory_mapped=self._memory_mapped,
+                fsync_policy=self._fsync_policy)
+            build_file_processor.load_data()
+            self._build_file_processor = build_file_processor
+            self._build_file_signature = build_file_signature
+
+        # The deps are loaded when they are needed for the first time; after that, they are
+        # reloaded as soon as they are changed.
+        ninja_deps_signature = _get_file_signature(
+            self._build_dir / NinjaDepsProcessor.DEPS_LOG_FILE_NAME)
+        if self._ninja_deps_processor is None or (
+                ninja_deps_signature != self._ninja_deps_signature):
+            ninja_deps_processor = NinjaDepsProcessor(self._build_dir)
+            if self._ninja_deps_processor is not None and self._ninja_deps_processor.is_loaded():
+                ninja_deps_processor.load_data()
+            self._ninja_deps_processor = ninja_deps_processor
+            self._ninja_deps_signature = ninja_deps_signature
+
+    def execute(self, request: dict) -> None:
+        """Execute the command of the request.
+
+        :param request: Request with the "command" (the command and its arguments), "cwd",
+            "force_patch", "dry_run", "stack_trace", "parse_jobs", "memory_mapped" and "fsync"
+            fields.
+        :type request: dict
+        :raises NinjaToolServerError: The command has failed; the message is the same as the one
+            printed by ninja_tool when the command is executed in its own process.
+        """
+
+        command = request["command"]
+        if command[0] not in SERVED_COMMANDS:
+            raise NinjaToolServerError(f"Command {command[0]!r} can't be executed by the server")
+
+        # The data of the previous requests is dropped, so it doesn't accumulate in the server.
+        profiler.reset()
+        try:
+            self._configure(
+                parse_jobs=request.get("parse_jobs", self._parse_jobs),
+                memory_mapped=request.get("memory_mapped", self._memory_mapped),
+                fsync_policy=FsyncPolicy(request.get("fsync", self._fsync_policy.value)))
+            # The relative paths in the command arguments are relative to the client directory.
+            script_data = _parse_splitted_command_line(
+                command[0], command[1:], working_dir=Path(request.get("cwd", self._build_dir)))
+            _execute(
+                self._build_dir,
+                script_data,
+                force_patch=request.get("force_patch", False),
+                dry_run=request.get("dry_run", False),
+                build_file_processor=self._build_file_processor,
+                ninja_deps_processor=self._ninja_deps_processor)
+        except (NinjaFileProcessorError, OSError) as ex:
+            raise NinjaToolServerError(
+                _get_error_message(ex, request.get("stack_trace", False))) from ex
+
+    def _configure(
+            self, parse_jobs: int, memory_mapped: bool, fsync_policy: FsyncPolicy) -> None:
+        """Apply the options of the client, so the request is executed the same way as it would be
+        executed by the client itself.
+        """
+
+        self._parse_jobs = parse_jobs
+        self._fsync_policy = fsync_policy
+        if self._build_file_processor is not None:
+            self._build_file_processor.set_fsync_policy(fsync_policy)
+        if memory_mapped != self._memory_mapped:
+            # The mode defines how the lines are stored, so build.ninja is loaded again.
+            self._memory_mapped = memory_mapped
+            self._build_file_processor = None
+            self.refresh()
+
+
+def _get_file_signature(file_name: Path) -> Optional[tuple]:
+    try:
+        file_stat = os.stat(file_name)
+    except OSError:
+        return None
+    return file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino
+
+
+def _get_error_message(ex: Exception, stack_trace: bool = False) -> str:
+    if stack_trace:
+        message = ''.join(traceback.TracebackException.from_exception(ex).format())
+    else:
+        message = str(ex)
+
+    if isinstance(ex, NinjaFileProcessorError):
+        return f"{message}\nAn error occured while processing ninja files, exiting"
+    return f"{message}\nAn error occured while performing file operation, exiting"
+
+
 def update_persistent_known_files_file(build_dir: Path, directories: Set[str]):
     print(f"Updating persistent known files file...")
 
@@ -306,7 +598,16 @@ def _parse_script_data(script_file_name: str) -> ParsedScriptData:
     return ParsedScriptData.merge(parsed_data_list)
 
 
-def _parse_splitted_command_line(command: str, args: List[str]) -> ParsedScriptData:
+def _parse_splitted_command_line(
+        command: str, args: List[str], working_dir: Path = None) -> ParsedScriptData:
+    """Parse the command with its arguments.
+
+    :param working_dir: Directory the relative paths in the arguments are relative to; None means
+        the current directory.
+    :type working_dir: Path
+    """
+
+    working_dir = working_dir or Path.cwd()
     if command == "strengthen":
         if not args:
             print("Missing argument for \"strengthen\" command.")
@@ -314,10 +615,7 @@ def _parse_splitted_command_line(command: str, args: List[str]) -> ParsedScriptD
         return ParsedScriptData(strengthened_targets={args[0]})
 
     if command == "run":
-        if not args:
-            print("Missing argument for \"run\" command.")
-            return ParsedScriptData()
-        return ParsedScriptData(commands_to_run=[args.copy()])
+        return _parse_run_command(args)
 
     if command == "clean":
         return ParsedScriptData(do_clean=True)
@@ -326,66 +624,289 @@ def _parse_splitted_command_line(command: str, args: List[str]) -> ParsedScriptD
         return ParsedScriptData(do_list_unknown=True)
 
     if command == "generate_affected_targets_list":
-        if len(args) != 3:
-            print("There must be exactly three arguments for "
+        if len(args) < 3:
+            print("There must be at least three arguments for "
                 '"generate_affected_targets_list" command.')
             return ParsedScriptData()
+        try:
+            query, output_format = _parse_affected_targets_options(args[3:])
+        except ValueError as ex:
+            print(f'Invalid option of "generate_affected_targets_list" command: {ex}')
+            return ParsedScriptData()
         return ParsedScriptData(
-            source_dir=Path(args[0]),
-            changed_files_list_file_name=args[1],
-            affected_targets_list_file_name=args[2],
+            affected_targets_list=AffectedTargetsListArguments(
+                source_dir=working_dir / args[0],
+                changed_files_list_file_name=args[1],
+                affected_targets_list_file_name=args[2],
+                query=query,
+                output_format=output_format or "text"),
             known_file_names={args[1], args[2]})
 
+    if command == "analyze_build":
+        if not args:
+            print('Missing argument for "analyze_build" command.')
+            return ParsedScriptData()
+        top_count = ANALYSIS_TOP_COUNT
+        output_format = "text"
+        for option in args[1:]:
+            key, _, value = option.partition("=")
+            if key == "top" and value.isdigit() and int(value) > 0:
+                top_count = int(value)
+            elif key == "format" and value in ("text", "json"):
+                output_format = value
+            else:
+                print(f'Invalid option of "analyze_build" command: {option!r}')
+                return ParsedScriptData()
+        return ParsedScriptData(
+            build_analysis=BuildAnalysisArguments(
+                report_file_name=args[0], top_count=top_count, output_format=output_format),
+            known_file_names={args[0]})
+
     if command == "add_directories_to_known_files":
         if not len(args):
             print("There must be at least one argument for "
                 '"add_directories_to_known_files" command.')
             return ParsedScriptData()
         return ParsedScriptData(
-            added_known_directories=set([Path(d).absolute() for d in args]))
+            added_known_directories=set([working_dir / d for d in args]))
 
     print(f"Unknown command: {command}")
     return ParsedScriptData()
 
 
+def _parse_run_command(args: List[str]) -> ParsedScriptData:
+    """Parse the arguments of the "run" command: the optional "name=<name>" and
+    "after=<name>[,<name>...]" annotations followed by the command line.
+    """
+
+    name = None
+    after = []
+    while args and args[0].startswith(("name=", "after=")):
+        key, _, value = args[0].partition("=")
+        if key == "name":
+            name = value
+        else:
+            after.extend(n for n in value.split(",") if n)
+        args = args[1:]
+
+    if not args:
+        print("Missing argument for \"run\" command.")
+        return ParsedScriptData()
+    return ParsedScriptData(
+        commands_to_run=[ScheduledCommand(command=args.copy(), name=name, after=tuple(after))])
+
+
+def _parse_affected_targets_options(
+        options: List[str]) -> Tuple[Optional[AffectedTargetsQuery], Optional[str]]:
+    """Parse the options of the "generate_affected_targets_list" command following its
+    arguments: "rule=<pattern>", "exclude_rule=<pattern>", "output=<pattern>",
+    "exclude_output=<pattern>" (all of them can be repeated), "top_level", "max_depth=<number>",
+    "counts" and "format=text|json".
+
+    :return: Query (None if there are no filters or options of it) and the output format (None if
+        it's not specified).
+    :rtype: Tuple[Optional[AffectedTargetsQuery], Optional[str]]
+    :raises ValueError: An option is unknown or its value is invalid.
+    """
+
+    patterns = {"rule": [], "exclude_rule": [], "output": [], "exclude_output": []}
+    flags = {"top_level": False, "counts": False}
+    max_depth = None
+    output_format = None
+    for option in options:
+        key, separator, value = option.partition("=")
+        if key in patterns and separator and value:
+            patterns[key].append(value)
+        elif key in flags and not separator:
+            flags[key] = True
+        elif key == "max_depth" and value.isdigit() and int(value) > 0:
+            max_depth = int(value)
+        elif key == "format" and value in ("text", "json"):
+            output_format = value
+        else:
+            raise ValueError(repr(option))
+
+    query = AffectedTargetsQuery(
+        rules=tuple(patterns["rule"]),
+        excluded_rules=tuple(patterns["exclude_rule"]),
+        outputs=tuple(patterns["output"]),
+        excluded_outputs=tuple(patterns["exclude_output"]),
+        top_level_only=flags["top_level"],
+        max_depth=max_depth,
+        with_counts=flags["counts"])
+    return (None if query == AffectedTargetsQuery() else query), output_format
+
+
 def generate_list_of_targets_affected_by_listed_files(
         build_dir: Path, source_dir: Path,
         changed_files_list_file_name: str,
         affected_targets_list_file_name: str,
-        build_file_processor: BuildNinjaFileProcessor = None):
+        query: AffectedTargetsQuery = None,
+        output_format: str = "text",
+        build_file_processor: BuildNinjaFileProcessor = None,
+        ninja_deps_processor: NinjaDepsProcessor = None):
+    """Write the list of the targets affected by the changed files.
+
+    The targets (all the affected ones if there is no query) are listed one per line, in the order
+    of the query result; if the query requests the counts, every line contains the target and the
+    number of the changed files it depends on, separated by a tab. The "json" format contains the
+    changed files and the targets with their rules, depths (and counts, if requested).
+    """
+
     print(f"Generating list of affected targets...")
 
-    updated_targets = set()
     with open(build_dir / changed_files_list_file_name) as f:
         files = f.read().splitlines()
 
-    build_file_processor.load_data()
-    ninja_deps_processor = NinjaDepsProcessor(build_dir)
-    ninja_deps_processor.load_data()
-    for file in files:
-        full_path = source_dir / file
-        # Get targets that explicitly depend on the changed file.
-        updated_targets |= build_file_processor.get_changed_targets_by_file_name(full_path)
-        # Get targets (object files) that implicitly depend on the changed file. For each such
-        # target, get all the targets that depend on it.
-        for target_file in ninja_deps_processor.get_dependent_object_files(full_path):
-            updated_targets |= build_file_processor.get_changed_targets_by_file_name(target_file)
+    _load_build_file(build_file_processor)
+    if ninja_deps_processor is None:
+        ninja_deps_processor = NinjaDepsProcessor(build_dir)
+    _load_ninja_deps(ninja_deps_processor)
+
+    with profiler.phase("find_affected_targets"):
+        changed_files = []
+        for file in files:
+            full_path = source_dir / file
+            # Targets that explicitly depend on the changed file are affected. Targets (object
+            # files) that implicitly depend on the changed file, and all the targets that depend
+            # on them, are affected too.
+            changed_files.append(
+                [full_path, *ninja_deps_processor.get_dependent_object_files(full_path)])
+
+        # Find the affected targets for all the changed files in a single pass over the graph.
+        updated_targets = build_file_processor.query_affected_targets(
+            changed_files, query or AffectedTargetsQuery())
+    profiler.count("changed_files", len(files))
+    profiler.count("affected_targets", len(updated_targets))
+
+    if output_format == "json":
+        content = json.dumps({
+            "changed_files": files,
+            "targets": [
+                {k: v for k, v in target._asdict().items() if v is not None}
+                for target in updated_targets],
+        }, indent=4) + "\n"
+    else:
+        content = "\n".join(
+            target.path if target.changed_file_count is None
+            else f"{target.path}\t{target.changed_file_count}"
+            for target in updated_targets)
 
     try:
         with open(build_dir / affected_targets_list_file_name) as f:
-            old_targets = set([l.rstrip() for l in f.readlines()])
+            old_content = f.read()
     except:
-        old_targets = None
+        old_content = None
 
     # Prevent overwriting of the output file (and hence rebuilding dependent targets) if its
-    # content hasn't changed.
-    if old_targets != updated_targets:
+    # content hasn't changed. The order of the lines of the text format is not significant.
+    if output_format == "json":
+        is_changed = old_content != content
+    else:
+        is_changed = (
+            old_content is None or set(old_content.splitlines()) != set(content.splitlines()))
+    if is_changed:
         with open(build_dir / affected_targets_list_file_name, "w") as f:
-            f.write("\n".join(updated_targets))
+            f.write(content)
 
     print("Done")
 
 
+def analyze_build(
+        build_dir: Path,
+        report_file_name: str,
+        top_count: int = ANALYSIS_TOP_COUNT,
+        output_format: str = "text",
+        build_file_processor: BuildNinjaFileProcessor = None,
+        ninja_deps_processor: NinjaDepsProcessor = None):
+    """Write the report on the structure of the build, showing where the dependencies limit the
+    parallelism of the build: the critical path by the durations of the commands recorded in
+    .ninja_log, the commands with the largest transitive fan-in and fan-out, and the files (from
+    the ninja deps) which invalidate the most targets when they are changed.
+
+    The durations are taken from the last run of every command, so after an incremental build they
+    can come from different builds.
+    """
+
+    print("Analyzing the build...")
+
+    _load_build_file(build_file_processor)
+    if ninja_deps_processor is None:
+        ninja_deps_processor = NinjaDepsProcessor(build_dir)
+    _load_ninja_deps(ninja_deps_processor)
+    ninja_log_processor = NinjaLogProcessor(build_dir)
+    with profiler.phase("load_ninja_log"):
+        ninja_log_processor.load_data()
+    for name, value in ninja_log_processor.get_statistics().items():
+        profiler.set_counter(f"ninja_log_{name}", value)
+
+    with profiler.phase("analyze_graph"):
+        graph_report = build_file_processor.analyze_graph(
+            ninja_log_processor.get_durations(), top_count)
+    most_used_dependencies = ninja_deps_processor.get_most_used_dependencies(top_count)
+
+    if output_format == "json":
+        report = graph_report._asdict()
+        for key in ("critical_path", "largest_fan_in", "largest_fan_out"):
+            report[key] = [edge._asdict() for edge in report[key]]
+        report["most_used_dependencies"] = [
+            {"file": file_name, "dependent_target_count": count}
+            for file_name, count in most_used_dependencies]
+        content = json.dumps(report, indent=4) + "\n"
+    else:
+        content = _format_build_analysis_report(graph_report, most_used_dependencies)
+    with open(build_dir / report_file_name, "w") as f:
+        f.write(content)
+
+    print(
+        f"Critical path: {len(graph_report.critical_path)} commands, "
+        f"{graph_report.critical_path_duration_s:.1f} s of "
+        f"{graph_report.total_duration_s:.1f} s of all the commands")
+    print("Done")
+
+
+def _format_build_analysis_report(
+        graph_report: GraphAnalysisReport, most_used_dependencies: List[Tuple[str, int]]) -> str:
+    def format_duration(duration_s: Optional[float]) -> str:
+        return "?" if duration_s is None else f"{duration_s:.1f}"
+
+    lines = [
+        f"Commands with recorded durations: {graph_report.recorded_edge_count}; "
+        f"without them: {graph_report.unrecorded_edge_count}.",
+        f"Sum of the durations of the commands: {graph_report.total_duration_s:.1f} s.",
+        f"Duration of the critical path: {graph_report.critical_path_duration_s:.1f} s.",
+    ]
+    if graph_report.critical_path_duration_s > 0:
+        lines.append(
+            "The build can't use more than "
+            f"{graph_report.total_duration_s / graph_report.critical_path_duration_s:.1f} "
+            "jobs on average.")
+
+    lines += ["", "Critical path (finish time, duration, rule, output):"]
+    finish_time_s = 0.0
+    for edge in graph_report.critical_path:
+        finish_time_s += edge.duration_s or 0.0
+        lines.append(
+            f"{finish_time_s:10.1f} s {format_duration(edge.duration_s):>8} s  "
+            f"{edge.rule}  {edge.output}")
+
+    lines += ["", "Largest transitive fan-in (number of the commands it depends on, rule, output):"]
+    lines += [
+        f"{edge.transitive_dependency_count:10}  {edge.rule}  {edge.output}"
+        for edge in graph_report.largest_fan_in]
+
+    lines += [
+        "",
+        "Largest transitive fan-out (number of the commands depending on it, rule, output):"]
+    lines += [
+        f"{edge.transitive_dependent_count:10}  {edge.rule}  {edge.output}"
+        for edge in graph_report.largest_fan_out]
+
+    lines += ["", "Files invalidating the most targets (number of the dependent targets, file):"]
+    lines += [f"{count:10}  {file_name}" for file_name, count in most_used_dependencies]
+    return "\n".join(lines) + "\n"
+
+
 def patch_ninja_build(
         file_name: Path,
         strengthened_targets: set,
@@ -409,23 +930,28 @@ def patch_ninja_build(
     :type force_patch: bool, optional
     """
 
-    # Patch the file only if it needs patching (it was not patched yet or its modification time is
-    # older than the modification time of the patch script) or the patching is enforced by the
-    # command-line parameter.
+    # Patch the file only if it needs patching (it was not patched yet, or it differs from the
+    # result of the last patching with the same strengthened targets, or, if the result of the last
+    # patching is unknown, its modification time is older than the modification time of the patch
+    # script) or the patching is enforced by the command-line parameter.
+    build_file_processor.set_patch_options(strengthened_targets)
     if not force_patch:
         if not build_file_processor.needs_patching(script_version_timestamp=script_timestamp):
             print(f"{file_name} is already patched, do nothing")
             return
 
-    if not build_file_processor.is_loaded():
-        build_file_processor.load_data()
+    _load_build_file(build_file_processor)
 
     print("Patching build.ninja...")
-    patch_rules_file(
-        build_file_processor, script_timestamp=script_timestamp, force_patch=force_patch)
+    with profiler.phase("patch_rules_ninja"):
+        patch_rules_file(
+            build_file_processor, script_timestamp=script_timestamp, force_patch=force_patch)
     if strengthened_targets:
-        build_file_processor.strengthen_dependencies(strengthened_targets)
-    build_file_processor.save_data()
+        with profiler.phase("strengthen_dependencies"):
+            build_file_processor.strengthen_dependencies(strengthened_targets)
+        profiler.count("strengthened_targets", len(strengthened_targets))
+    with profiler.phase("save_build_ninja"):
+        build_file_processor.save_data()
     print("Done")
 
 
@@ -436,21 +962,57 @@ def patch_rules_file(
 
     rules_file_name = build_file_processor.get_rules_file_name()
     rules_file_processor = RulesNinjaFileProcessor(
-        rules_file_name, build_directory=build_file_processor.build_directory)
+        rules_file_name,
+        build_directory=build_file_processor.build_directory,
+        memory_mapped=build_file_processor.is_memory_mapped(),
+        fsync_policy=build_file_processor.get_fsync_policy(),
+        fingerprint_file_name=build_file_processor.build_directory / PATCH_FINGERPRINT_FILE_NAME)
 
     if not force_patch:
         if not rules_file_processor.needs_patching(script_version_timestamp=script_timestamp):
             print(f"{rules_file_name} is already patched, do nothing")
             return
 
-    rules_file_processor.load_data()
+    with profiler.phase("load"):
+        rules_file_processor.load_data()
 
     print("Patching rules.ninja...")
     rules_file_processor.patch_cmake_rerun()
-    rules_file_processor.save_data()
+    with profiler.phase("save"):
+        rules_file_processor.save_data()
     print("Done")
 
 
+def _load_build_file(build_file_processor: BuildNinjaFileProcessor) -> None:
+    """Load build.ninja unless it's already loaded, and record the size of the loaded data."""
+
+    if build_file_processor.is_loaded():
+        return
+
+    with profiler.phase("load_build_ninja"):
+        build_file_processor.load_data()
+    for name, value in build_file_processor.get_statistics().items():
+        profiler.set_counter(f"build_ninja_{name}", value)
+
+
+def _load_ninja_deps(ninja_deps_processor: NinjaDepsProcessor) -> None:
+    """Load the ninja deps unless they are already loaded, and record the size of the index."""
+
+    if ninja_deps_processor.is_loaded():
+        return
+
+    with profiler.phase("load_ninja_deps"):
+        ninja_deps_processor.load_data()
+    for name, value in ninja_deps_processor.get_statistics().items():
+        profiler.set_counter(f"ninja_deps_{name}", value)
+
+
+def _get_available_cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
 def redirect_output(file_name: Path):
     """Redirects stderr and stdout to the file."""
 
@@ -480,6 +1042,67 @@ def main():
         default=None,
         const="",
         help='Log output to file.')
+    parser.add_argument(
+        "-j", "--parse-jobs",
+        type=int,
+        default=_get_available_cpu_count(),
+        help=(
+            "Number of processes used for parsing large build.ninja files. Defaults to the number "
+            "of CPUs."))
+    parser.add_argument(
+        "--run-jobs",
+        type=int,
+        default=_get_available_cpu_count(),
+        help=(
+            "Maximal number of the commands of the \"run\" commands running at the same time. "
+            "Only the commands with the \"name=\" or \"after=\" annotations can run in "
+            "parallel. Defaults to the number of CPUs."))
+    parser.add_argument(
+        "-m", "--mmap",
+        action='store_true',
+        help=(
+            "Map ninja files into memory instead of reading them, parse only the lines used by "
+            "ninja_tool and copy the unchanged parts of the files as is when patching them."))
+    parser.add_argument(
+        "-n", "--dry-run",
+        action='store_true',
+        help=(
+            "Don't remove any files by the \"clean\" command; list the files which would be "
+            "removed instead."))
+    parser.add_argument(
+        "--fsync",
+        choices=[policy.value for policy in FsyncPolicy],
+        default=FsyncPolicy.NONE.value,
+        help=(
+            "Flush the patched files to the disk before replacing the original ones (\"file\"), "
+            "and also flush the directory after the replacement (\"full\"). Defaults to "
+            "\"none\"."))
+    parser.add_argument(
+        "--serve",
+        action='store_true',
+        help=(
+            "Start a server keeping the parsed build.ninja and ninja deps of the build directory "
+            f"in memory and executing the {', '.join(sorted(repr(c) for c in SERVED_COMMANDS))} "
+            "commands passed by other ninja_tool processes; the server runs until it's stopped "
+            "by \"--stop-server\"."))
+    parser.add_argument(
+        "--stop-server",
+        action='store_true',
+        help="Stop the server running for the build directory.")
+    parser.add_argument(
+        "--no-server",
+        action='store_true',
+        help="Execute the command in this process even if a server is running.")
+    parser.add_argument(
+        "--profile-phase",
+        action="append",
+        default=[],
+        metavar="PHASE",
+        help=(
+            "Profile the phase (e.g. \"patch\" or \"patch/save_build_ninja\", see the timing "
+            "report for the names of the phases) by cProfile and dump the profile to "
+            "\"<phase>.prof\" in the log directory; \"all\" means all the top-level phases. "
+            "Can be specified multiple times."))
     parser.add_argument(
         "-t", "--stack-trace",
         action='store_true',
@@ -496,32 +1119,91 @@ def main():
     args = parser.parse_args()
 
     build_dir = args.build_dir.resolve()
+    log_file = Path(args.log_output or (build_dir / "build_logs" / "pre_build.log"))
     if args.log_output is not None:
-        log_file = Path(args.log_output or (build_dir / "build_logs" / "pre_build.log"))
         redirect_output(log_file)
+    # The requests of the server are measured separately (see _ServerSession.execute()), and
+    # neither their reports nor their profiles are written.
+    if not args.serve:
+        # The timing report is written next to the log, e.g. "pre_build.timing.json".
+        profiler.configure(
+            profiled_phases=args.profile_phase,
+            profile_dir=log_file.parent,
+            report_file_name=(
+                log_file.with_suffix(".timing.json") if args.log_output is not None else None))
 
     try:
-        if args.command:
-            execute_command(
-                build_dir=build_dir, command_with_args=args.command, force_patch=args.force)
+        if args.serve:
+            session = _ServerSession(
+                build_dir,
+                parse_jobs=args.parse_jobs,
+                memory_mapped=args.mmap,
+                fsync_policy=FsyncPolicy(args.fsync))
+            NinjaToolServer(build_dir, session).serve()
+        elif args.stop_server:
+            if send_request(build_dir, {"shutdown": True}) is None:
+                print("No server is running for the build directory")
+        elif args.command:
+            # The commands which can be executed by the server are executed in this process only
+            # if there is no server for the build directory.
+            if (args.command[0] not in SERVED_COMMANDS or args.no_server
+                    or not _execute_on_server(build_dir, args)):
+                execute_command(
+                    build_dir=build_dir,
+                    command_with_args=args.command,
+                    force_patch=args.force,
+                    parse_jobs=args.parse_jobs,
+                    memory_mapped=args.mmap,
+                    dry_run=args.dry_run,
+                    fsync_policy=FsyncPolicy(args.fsync),
+                    run_jobs=args.run_jobs,
+                    run_log_dir=log_file.parent)
         else:
             script_filename = build_dir / NINJA_PREBUILD_FILE_NAME
             execute_script(
-                build_dir=build_dir, script_file_name=script_filename, force_patch=args.force)
+                build_dir=build_dir,
+                script_file_name=script_filename,
+                force_patch=args.force,
+                parse_jobs=args.parse_jobs,
+                memory_mapped=args.mmap,
+                dry_run=args.dry_run,
+                fsync_policy=FsyncPolicy(args.fsync),
+                run_jobs=args.run_jobs,
+                run_log_dir=log_file.parent)
 
-    except NinjaFileProcessorError as ex:
-        if args.stack_trace:
-            message = ''.join(traceback.TracebackException.from_exception(ex).format())
-        else:
-            message = str(ex)
-        sys.exit(f"{message}\nAn error occured while processing ninja files, exiting")
+    except (NinjaToolServerError, CommandSchedulerError, NinjaLogProcessorError) as ex:
+        sys.exit(str(ex))
+
+    except (NinjaFileProcessorError, OSError) as ex:
+        sys.exit(_get_error_message(ex, stack_trace=args.stack_trace))
+
+    finally:
+        profiler.write_report()
+
+
+def _execute_on_server(build_dir: Path, args: argparse.Namespace) -> bool:
+    """Execute the command by the server if it's running for the build directory.
+
+    :return: Whether the command was executed by the server.
+    :rtype: bool
+    """
+
+    exit_code = send_request(build_dir, {
+        "command": args.command,
+        "cwd": os.getcwd(),
+        "force_patch": args.force,
+        "dry_run": args.dry_run,
+        "stack_trace": args.stack_trace,
+        "parse_jobs": args.parse_jobs,
+        "memory_mapped": args.mmap,
+        "fsync": args.fsync,
+    })
+    if exit_code is None:
+        return False
+    if exit_code != 0:
+        sys.exit(exit_code)
+    return True
 
-    except OSError as ex:
-        if args.stack_trace:
-            message = ''.join(traceback.TracebackException.from_exception(ex).format())
-        else:
-            message = str(ex)
-        sys.exit(f"{message}\nAn error occured while performing file operation, exiting")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+NinjaToolServer: Long-lived ninja_tool process serving the requests for a build directory over a
+local UNIX socket, so the parsed build.ninja and the ninja deps stay in memory between the runs.
+
+The requests are executed one at a time by a session object, which owns the loaded data. The
+session is refreshed (i.e. reloads the changed files) periodically in the background and before
+every request. The output of the request is sent back to the client as it is produced: sys.stdout
+and sys.stderr are replaced once, when the server starts, with the streams routing the output of
+every thread to the stream bound to this thread, so only the output of the thread executing the
+request is sent to the client, and the output of the other threads goes to the server output.
+
+Protocol: the client sends a single JSON line with the request; the server sends JSON lines with
+the "stdout" or "stderr" field for the output, and the final line with the "exit_code" field (and
+the "error" field if the request has failed).
+
+send_request(): Client side; returns None if no server is running, so the caller can execute the
+request in its own process.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+SOCKET_FILE_NAME = ".ninja_tool.sock"
+
+# Commands which can be executed by the server; other commands are always executed by the client.
+SERVED_COMMANDS = {"generate_affected_targets_list", "list_unknown_files", "strengthen"}
+
+# Maximal length of the socket path supported on all the platforms (sizeof(sockaddr_un.sun_path)
+# is 104 on macOS and 108 on Linux).
+_MAX_SOCKET_PATH_LENGTH = 100
+
+
+def get_socket_path(build_dir: Path) -> str:
+    """Get the path of the socket of the server for the build directory. The socket is created in
+    the build directory, unless the path is too long; then it's created in the runtime directory of
+    the user (see _get_runtime_dir()).
+
+    :raises NinjaToolServerError: The runtime directory can't be created or is not private.
+    """
+
+    socket_path = str(build_dir / SOCKET_FILE_NAME)
+    if len(socket_path) <= _MAX_SOCKET_PATH_LENGTH:
+        return socket_path
+
+    build_dir_hash = hashlib.blake2b(str(build_dir).encode(), digest_size=8).hexdigest()
+    return os.path.join(_get_runtime_dir(), f"ninja_tool_{build_dir_hash}.sock")
+
+
+def _get_runtime_dir() -> str:
+    """Get the directory for the sockets which don't fit into the build directory: $XDG_RUNTIME_DIR
+    if it's set, or the "ninja_tool-<uid>" directory in the temporary directory otherwise. The
+    directory must belong to the current user and must not be accessible by other users, so
+    nobody else can create a socket there for the client to connect to.
+    """
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), f"ninja_tool-{os.getuid()}")
+        with contextlib.suppress(FileExistsError):
+            os.mkdir(runtime_dir, 0o700)
+
+    try:
+        # lstat() is used, so a symlink planted by another user is not followed.
+        dir_stat = os.lstat(runtime_dir)
+    except OSError as ex:
+        raise NinjaToolServerError(f"Cannot access the runtime directory: {ex}") from ex
+    if (not stat.S_ISDIR(dir_stat.st_mode) or dir_stat.st_uid != os.getuid()
+            or dir_stat.st_mode & 0o077):
+        raise NinjaToolServerError(
+            f"Runtime directory {runtime_dir} is not a private directory of the current user")
+    return runtime_dir
+
+
+def _is_owned_by_current_user(socket_path: str) -> bool:
+    try:
+        return os.lstat(socket_path).st_uid == os.getuid()
+    except OSError:
+        return False
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+class NinjaToolServerError(Exception):
+    pass
+
+
+class NinjaToolServer:
+    REFRESH_INTERVAL_S = 1
+
+    # The server exits if there are no requests during this time.
+    IDLE_TIMEOUT_S = 4 * 60 * 60
+
+    def __init__(self, build_dir: Path, session) -> None:
+        """
+        :param build_dir: Build directory the server is started for.
+        :type build_dir: Path
+        :param session: Object with the refresh() method, which reloads the changed data, and the
+            execute(request: dict) method, which executes the request printing its output to
+            sys.stdout and sys.stderr; it must not change the current directory.
+        """
+
+        self._build_dir = build_dir
+        self._socket_path = None
+        self._session = session
+        # Streams replacing sys.stdout and sys.stderr while the server is running.
+        self._stdout: Optional[_ThreadOutputRouter] = None
+        self._stderr: Optional[_ThreadOutputRouter] = None
+        self._lock = threading.Lock()
+        self._is_stopped = threading.Event()
+
+    def serve(self) -> None:
+        """Serve the requests until the "shutdown" request is received or the idle timeout
+        expires.
+
+        :raises NinjaToolServerError: Another server is already running for the build directory.
+        """
+
+        if not is_supported():
+            raise NinjaToolServerError("UNIX sockets are not supported on this platform")
+        self._socket_path = get_socket_path(self._build_dir)
+
+        with self._lock:
+            self._session.refresh()
+
+        server_socket = self._create_server_socket()
+        original_stdout, original_stderr = sys.stdout, sys.stderr
+        self._stdout = sys.stdout = _ThreadOutputRouter(original_stdout)
+        self._stderr = sys.stderr = _ThreadOutputRouter(original_stderr)
+        refresh_thread = threading.Thread(target=self._refresh_periodically, daemon=True)
+        refresh_thread.start()
+        print(f"Serving requests at {self._socket_path}")
+        try:
+            with server_socket:
+                server_socket.settimeout(self.REFRESH_INTERVAL_S)
+                last_request_time = time.monotonic()
+                while not self._is_stopped.is_set():
+                    try:
+                        connection, _ = server_socket.accept()
+                    except socket.timeout:
+                        if time.monotonic() - last_request_time > self.IDLE_TIMEOUT_S:
+                            print("No requests for a long time, exiting")
+                            break
+                        continue
+
+                    with connection:
+                        connection.settimeout(None)
+                        try:
+                            self._handle_connection(connection)
+                        except OSError as ex:
+                            print(f"Connection failed: {ex}")
+                    last_request_time = time.monotonic()
+        finally:
+            self._is_stopped.set()
+            refresh_thread.join()
+            sys.stdout, sys.stderr = original_stdout, original_stderr
+            with contextlib.suppress(OSError):
+                os.remove(self._socket_path)
+
+    def _create_server_socket(self) -> socket.socket:
+        if os.path.lexists(self._socket_path):
+            if not _is_owned_by_current_user(self._socket_path):
+                raise NinjaToolServerError(
+                    f"Socket {self._socket_path} belongs to another user")
+            connection = _connect(self._socket_path)
+            if connection is not None:
+                connection.close()
+                raise NinjaToolServerError(
+                    f"Another server is already running at {self._socket_path}")
+            # The socket was left by a server which has been killed.
+            os.remove(self._socket_path)
+
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Other users must not be able to connect to the socket and run the commands.
+        previous_umask = os.umask(0o177)
+        try:
+            server_socket.bind(self._socket_path)
+        finally:
+            os.umask(previous_umask)
+        server_socket.listen()
+        return server_socket
+
+    def _refresh_periodically(self) -> None:
+        while not self._is_stopped.wait(self.REFRESH_INTERVAL_S):
+            with self._lock:
+                try:
+                    self._session.refresh()
+                except Exception as ex:  # pylint:disable=broad-except
+                    # The error is reported to the client when it tries to use the data.
+                    print(f"Cannot reload the data: {ex}")
+
+    def _handle_connection(self, connection: socket.socket) -> None:
+        with connection.makefile("r", encoding="utf-8") as reader:
+            try:
+                request = json.loads(reader.readline())
+            except ValueError:
+                return
+        if not isinstance(request, dict):
+            return
+
+        with connection.makefile("w", encoding="utf-8") as writer:
+            if request.get("shutdown"):
+                self._is_stopped.set()
+                _send(writer, {"exit_code": 0})
+                return
+
+            print(f"Executing {request.get('command')}...")
+            stdout = _OutputStream(writer, "stdout")
+            stderr = _OutputStream(writer, "stderr")
+            response = {"exit_code": 0}
+            with self._lock:
+                try:
+                    with self._stdout.bind(stdout), self._stderr.bind(stderr):
+                        try:
+                            self._session.refresh()
+                            self._session.execute(request)
+                        finally:
+                            stdout.flush()
+                            stderr.flush()
+                except Exception as ex:  # pylint:disable=broad-except
+                    response = {"exit_code": 1, "error": str(ex)}
+                    print(f"Request failed: {ex}")
+            with contextlib.suppress(OSError):
+                _send(writer, response)
+
+
+class _ThreadOutputRouter(io.TextIOBase):
+    """Text stream writing the text to the stream bound to the current thread by bind(), or to the
+    default stream if no stream is bound.
+    """
+
+    def __init__(self, default_stream: io.TextIOBase) -> None:
+        super().__init__()
+        self._default_stream = default_stream
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def bind(self, stream: io.TextIOBase):
+        previous_stream = getattr(self._local, "stream", None)
+        self._local.stream = stream
+        try:
+            yield
+        finally:
+            self._local.stream = previous_stream
+
+    def _get_stream(self) -> io.TextIOBase:
+        return getattr(self._local, "stream", None) or self._default_stream
+
+    @property
+    def encoding(self) -> str:
+        return self._default_stream.encoding
+
+    def write(self, text: str) -> int:
+        return self._get_stream().write(text)
+
+    def flush(self) -> None:
+        self._get_stream().flush()
+
+
+class _OutputStream(io.TextIOBase):
+    """Text stream sending the written text to the client; the text is sent in large pieces."""
+
+    _MAX_BUFFERED_SIZE = 64 * 1024
+
+    def __init__(self, writer: io.TextIOBase, name: str) -> None:
+        super().__init__()
+        self._writer = writer
+        self._name = name
+        self._buffer = []
+        self._buffered_size = 0
+
+    def write(self, text: str) -> int:
+        self._buffer.append(text)
+        self._buffered_size += len(text)
+        if self._buffered_size >= self._MAX_BUFFERED_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if self._buffer:
+            _send(self._writer, {self._name: "".join(self._buffer)})
+            self._buffer = []
+            self._buffered_size = 0
+
+
+def send_request(build_dir: Path, request: dict) -> Optional[int]:
+    """Send the request to the server for the build directory, printing the output of the request.
+
+    :param build_dir: Build directory.
+    :type build_dir: Path
+    :param request: Request to send; the "command" field contains the command with its arguments.
+    :type request: dict
+    :return: Exit code of the request, or None if there is no server for the build directory.
+    :rtype: Optional[int]
+    :raises NinjaToolServerError: The request has failed.
+    :raises ConnectionError: The server has closed the connection before the request was
+        completed.
+    """
+
+    if not is_supported():
+        return None
+
+    try:
+        socket_path = get_socket_path(build_dir)
+    except NinjaToolServerError:
+        # No server can listen to the socket in an unsafe directory.
+        return None
+    # The socket created by another user may belong to a server executing foreign code, so it's
+    # never used.
+    if not _is_owned_by_current_user(socket_path):
+        return None
+    connection = _connect(socket_path)
+    if connection is None:
+        return None
+
+    with connection:
+        connection.settimeout(None)
+        with connection.makefile("w", encoding="utf-8") as writer:
+            _send(writer, request)
+        with connection.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                response = json.loads(line)
+                if "stdout" in response:
+                    print(response["stdout"], end="", flush=True)
+                elif "stderr" in response:
+                    print(response["stderr"], end="", file=sys.stderr, flush=True)
+                elif "exit_code" in response:
+                    if "error" in response:
+                        raise NinjaToolServerError(response["error"])
+                    return response["exit_code"]
+
+    raise ConnectionError("The server has closed the connection")
+
+
+def _connect(socket_path: str) -> Optional[socket.socket]:
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(1)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        # The socket doesn't exist, or nobody is listening to it.
+        connection.close()
+        return None
+    return connection
+
+
+def _send(writer: io.TextIOBase, message: dict) -> None:
+    writer.write(json.dumps(message) + "\n")
+    writer.flush()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""
+PhaseProfiler: Collection of the timing data of the phases of a ninja_tool run.
+
+For every phase, the wall and CPU time and the peak RSS of the process by the end of the phase are
+recorded; phases can be nested. Besides that, named counters (e.g. the number of the parsed lines
+or the removed files) are collected. The collected data is written as a JSON report. Any phase can
+also be profiled by cProfile; the profile of the phase is dumped to a file named after the phase.
+
+profiler: The instance used by ninja_tool; it's configured in main().
+"""
+
+import cProfile
+import contextlib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+class PhaseProfiler:
+    # Name meaning all the top-level phases in the list of the profiled phases.
+    ALL_PHASES = "all"
+
+    def __init__(self) -> None:
+        self._profiled_phases = set()
+        self._profile_dir: Optional[Path] = None
+        self._report_file_name: Optional[Path] = None
+        self.reset()
+
+    def configure(
+            self,
+            profiled_phases: Iterable[str] = (),
+            profile_dir: Path = None,
+            report_file_name: Path = None) -> None:
+        """
+        :param profiled_phases: Names of the phases to be profiled by cProfile; ALL_PHASES means
+            all the top-level phases.
+        :type profiled_phases: Iterable[str]
+        :param profile_dir: Directory for the cProfile dumps, named "<phase>.prof".
+        :type profile_dir: Path
+        :param report_file_name: File the report is written to by write_report(); None means the
+            report is not written.
+        :type report_file_name: Path
+        """
+
+        self._profiled_phases = set(profiled_phases)
+        self._profile_dir = profile_dir.absolute() if profile_dir is not None else None
+        self._report_file_name = (
+            report_file_name.absolute() if report_file_name is not None else None)
+
+    def reset(self) -> None:
+        """Drop the collected data and start measuring the total time again, e.g. before the next
+        request of a long-lived process.
+        """
+
+        self._phases = []
+        self._current_phase_names = []
+        self._counters: Dict[str, int] = {}
+        self._start_time = time.perf_counter()
+        self._start_cpu_time = time.process_time()
+
+    def get_output_files(self) -> List[Path]:
+        """Get the absolute paths of the files written by the profiler: the report and the cProfile
+        dumps. The top-level phases are not known in advance, so if all of them are profiled, the
+        dumps of the top-level phases existing in the profile directory are listed.
+        """
+
+        output_files = [self._report_file_name] if self._report_file_name is not None else []
+        if self._profile_dir is None:
+            return output_files
+        for name in self._profiled_phases - {self.ALL_PHASES}:
+            output_files.append(self._get_profile_file_name(name))
+        if self.ALL_PHASES in self._profiled_phases:
+            # The names of the dumps of the nested phases contain dots.
+            output_files.extend(
+                file_name for file_name in self._profile_dir.glob("*.prof")
+                if "." not in file_name.stem)
+        return output_files
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Context manager measuring the phase; the name of a nested phase is prefixed with the
+        names of the enclosing phases, separated by "/".
+        """
+
+        self._current_phase_names.append(name)
+        full_name = "/".join(self._current_phase_names)
+        profile = self._create_profile(full_name)
+        record = {"name": full_name}
+        self._phases.append(record)
+        start_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            record["wall_time_s"] = round(time.perf_counter() - start_time, 6)
+            record["cpu_time_s"] = round(time.process_time() - start_cpu_time, 6)
+            record["peak_rss_bytes"] = self._get_peak_rss()
+            self._current_phase_names.pop()
+            if profile is not None:
+                self._dump_profile(profile, full_name)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_counter(self, name: str, value: int) -> None:
+        self._counters[name] = value
+
+    def get_report(self) -> dict:
+        report = {
+            "total_wall_time_s": round(time.perf_counter() - self._start_time, 6),
+            "total_cpu_time_s": round(time.process_time() - self._start_cpu_time, 6),
+            "peak_rss_bytes": self._get_peak_rss(),
+        }
+        if resource is not None:
+            # CPU time of the worker processes and the subprocesses (e.g. "ninja -t deps").
+            children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            report["children_cpu_time_s"] = round(
+                children_usage.ru_utime + children_usage.ru_stime, 6)
+        report["phases"] = self._phases
+        report["counters"] = self._counters
+        return report
+
+    def write_report(self) -> None:
+        """Write the report to the configured file, if any."""
+
+        file_name = self._report_file_name
+        if file_name is None:
+            return
+        try:
+            file_name.parent.mkdir(parents=True, exist_ok=True)
+            with open(file_name, "w") as report_file:
+                json.dump(self.get_report(), report_file, indent=4)
+        except OSError as ex:
+            print(f"Cannot write timing report {file_name}: {ex}")
+
+    def _create_profile(self, full_name: str) -> Optional[cProfile.Profile]:
+        if self._profile_dir is None or not self._is_profiled(full_name):
+            return None
+        # Only one cProfile profiler can be active at a time, so the nested phases of a profiled
+        # phase are not profiled separately.
+        if any(self._is_profiled(name) for name in self._enclosing_phase_names()):
+            return None
+        return cProfile.Profile()
+
+    def _enclosing_phase_names(self):
+        for i in range(1, len(self._current_phase_names)):
+            yield "/".join(self._current_phase_names[:i])
+
+    def _is_profiled(self, full_name: str) -> bool:
+        return full_name in self._profiled_phases or (
+            self.ALL_PHASES in self._profiled_phases and "/" not in full_name)
+
+    def _get_profile_file_name(self, full_name: str) -> Path:
+        return self._profile_dir / f"{full_name.replace('/', '.')}.prof"
+
+    def _dump_profile(self, profile: cProfile.Profile, full_name: str) -> None:
+        file_name = self._get_profile_file_name(full_name)
+        try:
+            self._profile_dir.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(str(file_name))
+        except OSError as ex:
+            print(f"Cannot write profile {file_name}: {ex}")
+
+    @staticmethod
+    def _get_peak_rss() -> Optional[int]:
+        if resource is None:
+            return None
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # The value is in kilobytes on Linux, and in bytes on macOS.
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+profiler = PhaseProfiler()
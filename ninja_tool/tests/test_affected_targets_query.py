@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of searching and filtering the targets affected by the changed files."""
+
+import random
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_file_processor.affected_targets_query import (
+    AffectedTarget, AffectedTargetsQuery, find_dependent_nodes, query_affected_targets)
+from ninja_file_processor.build_graph import BuildGraph
+
+
+def make_graph(statements) -> BuildGraph:
+    """Make a graph of the statements: tuples of the outputs, the implicit outputs, the rule, the
+    explicit, the implicit and the order-only inputs.
+    """
+
+    graph = BuildGraph()
+    for line_index, statement in enumerate(statements):
+        outputs, implicit_outputs, rule, inputs, implicit_inputs, order_only_inputs = statement
+        graph.add_edge(
+            line_index=line_index,
+            rule=rule,
+            outputs=outputs,
+            implicit_outputs=implicit_outputs,
+            dependencies=inputs,
+            implicit_dependencies=implicit_inputs,
+            order_only_dependencies=order_only_inputs)
+    graph.finalize()
+    return graph
+
+
+def find_dependent_targets_naively(statements, changed_paths) -> set:
+    """Search the dependent targets level by level, the way it was done before BuildGraph."""
+
+    outputs_by_dependencies = {}
+    for outputs, implicit_outputs, _, *input_lists in statements:
+        for dependency in {path for inputs in input_lists for path in inputs}:
+            outputs_by_dependencies.setdefault(dependency, set()).update(
+                outputs, implicit_outputs)
+
+    changed_targets = set()
+    current_level_targets = set(changed_paths)
+    while True:
+        dependent_targets = set()
+        for target in current_level_targets:
+            dependent_targets |= outputs_by_dependencies.get(target, set())
+        new_dependent_targets = dependent_targets - changed_targets
+        if not new_dependent_targets:
+            break
+        changed_targets |= new_dependent_targets
+        current_level_targets = new_dependent_targets
+    return changed_targets
+
+
+STATEMENTS = [
+    (["a.o"], [], "CXX_COMPILER", ["a.cpp"], ["a.h"], []),
+    (["b.o"], [], "CXX_COMPILER", ["b.cpp"], ["a.h", "b.h"], []),
+    (["a.pch"], ["a.pch.map"], "CXX_PCH", ["a.h"], [], []),
+    (["liba.a"], [], "STATIC_LIBRARY", ["a.o"], [], []),
+    (["app"], [], "CXX_LINKER", ["b.o", "liba.a"], [], []),
+    (["tests"], [], "CXX_LINKER", ["a.o"], [], []),
+    (["gen.h"], [], "CUSTOM_COMMAND", [], [], ["a.o"]),
+    (["tool"], [], "CXX_LINKER", ["liba.a"], ["b.h"], []),
+    (["all"], [], "phony", ["app", "tests"], [], []),
+]
+
+
+class AffectedTargetsQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = make_graph(STATEMENTS)
+
+    def query(self, changed_path_groups, **options) -> list:
+        changed_node_groups = [
+            [self.graph.node_id(path) for path in group] for group in changed_path_groups]
+        return query_affected_targets(
+            self.graph, changed_node_groups, AffectedTargetsQuery(**options))
+
+    def levels(self, changed_paths, max_depth=None) -> list:
+        _, levels = find_dependent_nodes(
+            self.graph, [self.graph.node_id(path) for path in changed_paths], max_depth)
+        return [sorted(self.graph.paths[node] for node in level) for level in levels]
+
+    def test_levels(self):
+        self.assertEqual(self.levels(["a.h"]), [
+            ["a.o", "a.pch", "a.pch.map", "b.o"],
+            ["app", "gen.h", "liba.a", "tests"],
+            ["all", "tool"],
+        ])
+        self.assertEqual(self.levels(["a.h"], max_depth=1), [["a.o", "a.pch", "a.pch.map", "b.o"]])
+        self.assertEqual(self.levels(["a.h", "a.o"], max_depth=1), [
+            ["a.o", "a.pch", "a.pch.map", "b.o", "gen.h", "liba.a", "tests"]])
+        self.assertEqual(self.levels(["all"]), [])
+        self.assertEqual(self.levels([]), [])
+
+    def test_unfiltered_query(self):
+        self.assertEqual(self.query([["b.h"]]), [
+            AffectedTarget("b.o", "CXX_COMPILER", 1),
+            AffectedTarget("tool", "CXX_LINKER", 1),
+            AffectedTarget("app", "CXX_LINKER", 2),
+            AffectedTarget("all", "phony", 3),
+        ])
+
+    def test_rule_and_output_filters(self):
+        targets = self.query([["a.h"]], rules=("CXX*",), excluded_outputs=("*.pch",))
+        self.assertEqual(
+            [target.path for target in targets],
+            ["a.o", "a.pch.map", "b.o", "app", "tests", "tool"])
+        targets = self.query(
+            [["a.h"]], excluded_rules=("CXX_LINKER", "phony"), outputs=("*.o", "*.a", "app"))
+        self.assertEqual([target.path for target in targets], ["a.o", "b.o", "liba.a"])
+
+    def test_top_level_only(self):
+        targets = self.query([["a.h"]], top_level_only=True)
+        # "app" and "tests" are used by the phony "all" only; "all" itself is phony.
+        self.assertEqual(
+            [target.path for target in targets],
+            ["a.pch", "a.pch.map", "app", "gen.h", "tests", "tool"])
+
+    def test_max_depth(self):
+        targets = self.query([["a.h"]], max_depth=2, rules=("CXX_LINKER",))
+        self.assertEqual([target.path for target in targets], ["app", "tests"])
+
+    def test_counts(self):
+        # The counts include the changed files reachable only by the paths longer than max_depth:
+        # "tool" is one statement away from "b.h" and three statements away from "a.h".
+        targets = self.query([["a.h"], ["b.h"]], max_depth=1, with_counts=True)
+        self.assertEqual(targets, [
+            AffectedTarget("b.o", "CXX_COMPILER", 1, 2),
+            AffectedTarget("tool", "CXX_LINKER", 1, 2),
+            AffectedTarget("a.o", "CXX_COMPILER", 1, 1),
+            AffectedTarget("a.pch", "CXX_PCH", 1, 1),
+            AffectedTarget("a.pch.map", "CXX_PCH", 1, 1),
+        ])
+
+    def test_counts_of_groups(self):
+        # A changed file is counted once, even if several nodes of its group are reached.
+        targets = self.query([["a.cpp", "a.o"], ["b.cpp"]], with_counts=True)
+        self.assertEqual(targets, [
+            AffectedTarget("all", "phony", 2, 2),
+            AffectedTarget("app", "CXX_LINKER", 2, 2),
+            AffectedTarget("a.o", "CXX_COMPILER", 1, 1),
+            AffectedTarget("b.o", "CXX_COMPILER", 1, 1),
+            AffectedTarget("gen.h", "CUSTOM_COMMAND", 1, 1),
+            AffectedTarget("liba.a", "STATIC_LIBRARY", 1, 1),
+            AffectedTarget("tests", "CXX_LINKER", 1, 1),
+            AffectedTarget("tool", "CXX_LINKER", 2, 1),
+        ])
+
+    def test_same_targets_as_level_by_level_search(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            paths = [f"n{i}" for i in range(rng.randint(1, 15))]
+            rng.shuffle(paths)
+            statements = []
+            # The outputs are produced by the statements in the topological order.
+            while len(paths) > 1 and rng.random() < 0.9:
+                output_count = rng.randint(1, min(2, len(paths) - 1))
+                outputs, paths = paths[-output_count:], paths[:-output_count]
+                statements.append((
+                    outputs[:1],
+                    outputs[1:],
+                    rng.choice(["CMD", "phony"]),
+                    *(rng.sample(paths, rng.randint(0, min(2, len(paths)))) for _ in range(3))))
+            graph = make_graph(statements)
+            for path in graph.paths:
+                _, levels = find_dependent_nodes(graph, [graph.node_id(path)])
+                found_paths = [graph.paths[node] for level in levels for node in level]
+                self.assertEqual(len(found_paths), len(set(found_paths)))
+                self.assertEqual(
+                    set(found_paths), find_dependent_targets_naively(statements, [path]),
+                    statements)
+
+            changed_paths = rng.sample(graph.paths, min(3, len(graph.paths)))
+            targets = query_affected_targets(
+                graph,
+                [[graph.node_id(path)] for path in changed_paths],
+                AffectedTargetsQuery(with_counts=True))
+            # A changed file is counted for the targets depending on it and for its own node.
+            affected_paths = [
+                find_dependent_targets_naively(statements, [path]) | {path}
+                for path in changed_paths]
+            self.assertEqual(
+                {target.path: target.changed_file_count for target in targets},
+                {
+                    target: sum(target in paths for paths in affected_paths)
+                    for target in find_dependent_targets_naively(statements, changed_paths)},
+                statements)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of the "build" statement lexer of BuildNinjaFileProcessor."""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_file_processor.build_ninja_processor import BuildLineData, BuildNinjaFileProcessor
+from ninja_file_processor.ninja_file_processor import LineType, NinjaFileProcessorParseError
+
+
+class BuildLineParserTest(unittest.TestCase):
+    def setUp(self):
+        # Nothing is loaded, so the files don't have to exist.
+        build_dir = Path("/nonexistent/build")
+        self.processor = BuildNinjaFileProcessor(build_dir / "build.ninja", build_dir)
+
+    def parse(self, line: str) -> BuildLineData:
+        line_object = self.processor._parse_line(line)
+        self.assertEqual(line_object.type, LineType.BUILD)
+        return line_object.parsed
+
+    def test_all_sections(self):
+        data = self.parse("build a.o b.o | a.d: CXX a.cpp b.cpp | h.h || order1 order2 |@ v\n")
+        self.assertEqual(data, BuildLineData(
+            outputs=["a.o", "b.o"],
+            implicit_outputs=["a.d"],
+            command="CXX",
+            dependencies=["a.cpp", "b.cpp"],
+            implicit_dependencies=["h.h"],
+            order_only_dependencies=["order1", "order2"],
+            validations=["v"]))
+
+    def test_no_dependencies(self):
+        data = self.parse("build all: phony\n")
+        self.assertEqual(data.outputs, ["all"])
+        self.assertEqual(data.command, "phony")
+        self.assertEqual(data.dependencies, [])
+
+    def test_escapes(self):
+        data = self.parse("build dir$ with$ spaces/a$:b.o: CXX price$$list.cpp $$$ x.h\n")
+        self.assertEqual(data.outputs, ["dir$ with$ spaces/a$:b.o"])
+        self.assertEqual(data.command, "CXX")
+        # "$$" is an escaped "$", so the "$ " after it is an escaped space.
+        self.assertEqual(data.dependencies, ["price$$list.cpp", "$$$ x.h"])
+
+    def test_escaped_dollar_before_separator(self):
+        # "$$" doesn't escape the following space or colon.
+        data = self.parse("build a$$ b$$: CXX c$$\n")
+        self.assertEqual(data.outputs, ["a$$", "b$$"])
+        self.assertEqual(data.dependencies, ["c$$"])
+
+    def test_line_continuations(self):
+        data = self.parse("build a.o: CXX a.cpp $\n    b.cpp $\r\n    | h.h\n")
+        self.assertEqual(data.dependencies, ["a.cpp", "b.cpp"])
+        self.assertEqual(data.implicit_dependencies, ["h.h"])
+
+    def test_only_space_separates_paths(self):
+        data = self.parse("build out\xa0a.o: CXX src\ta.cpp  src\xa0b.cpp\r\n")
+        self.assertEqual(data.outputs, ["out\xa0a.o"])
+        self.assertEqual(data.dependencies, ["src\ta.cpp", "src\xa0b.cpp"])
+
+    def test_validations_without_other_sections(self):
+        data = self.parse("build a.o: CXX a.cpp |@ check1 check2\n")
+        self.assertEqual(data.dependencies, ["a.cpp"])
+        self.assertEqual(data.order_only_dependencies, [])
+        self.assertEqual(data.validations, ["check1", "check2"])
+
+    def test_generated_line_keeps_all_sections(self):
+        line = "build a.o | a.d: CXX a$ b.cpp | h.h || order |@ v\n"
+        self.assertEqual(self.processor._generate_build_line(self.parse(line)), line)
+
+    def test_invalid_lines(self):
+        for line in (
+                "build a.o CXX a.cpp\n",
+                "build a.o: CXX a.cpp: b.cpp\n",
+                "build a.o | b | c: CXX a.cpp\n",
+                "build a.o: CXX a.cpp | b | c\n",
+                "build a.o: CXX a.cpp || b | c\n",
+                "build a.o: CXX a.cpp |@ v | w\n",
+                "build a.o: \n"):
+            with self.subTest(line=line):
+                with self.assertRaises(NinjaFileProcessorParseError):
+                    self.processor._parse_line(line)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of the ordering and the output of the commands run by CommandScheduler."""
+
+import contextlib
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from command_scheduler import CommandScheduler, CommandSchedulerError, ScheduledCommand
+
+
+class CommandSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.journal = self.dir / "journal.txt"
+
+    def command(self, text: str, delay_s: float = 0.0, exit_code: int = 0) -> list:
+        """Make a command printing the text and appending it to the journal after the delay."""
+        script = (
+            "import sys, time\n"
+            f"time.sleep({delay_s})\n"
+            f"print({text!r})\n"
+            f"open({str(self.journal)!r}, 'a').write({text!r} + '\\n')\n"
+            f"sys.exit({exit_code})\n")
+        return [sys.executable, "-c", script]
+
+    def run_commands(self, commands: list, jobs: int = 4) -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            CommandScheduler(commands, jobs=jobs, log_dir=self.dir / "logs").run()
+        return output.getvalue()
+
+    def journal_lines(self) -> list:
+        return self.journal.read_text().splitlines()
+
+    def test_unannotated_commands_are_sequential(self):
+        self.run_commands([
+            ScheduledCommand(self.command("first", delay_s=0.3)),
+            ScheduledCommand(self.command("second", delay_s=0.1)),
+            ScheduledCommand(self.command("third"))])
+        self.assertEqual(self.journal_lines(), ["first", "second", "third"])
+
+    def test_annotated_commands_are_parallel(self):
+        self.run_commands([
+            ScheduledCommand(self.command("slow", delay_s=0.5), name="slow"),
+            ScheduledCommand(self.command("fast"), name="fast"),
+            ScheduledCommand(self.command("last"), after=("slow", "fast"))])
+        self.assertEqual(self.journal_lines(), ["fast", "slow", "last"])
+
+    def test_unannotated_command_waits_for_all_preceding(self):
+        self.run_commands([
+            ScheduledCommand(self.command("slow", delay_s=0.5), name="slow"),
+            ScheduledCommand(self.command("fast"), name="fast"),
+            ScheduledCommand(self.command("last"))])
+        self.assertEqual(self.journal_lines()[-1], "last")
+
+    def test_output_is_printed(self):
+        output = self.run_commands([
+            ScheduledCommand(self.command("hello")), ScheduledCommand(self.command("world"))])
+        self.assertLess(output.index("hello\n"), output.index("world\n"))
+        self.assertEqual(len(list((self.dir / "logs").glob("run_*.log"))), 2)
+
+    def test_log_file_names(self):
+        commands = [
+            ScheduledCommand(self.command("hello")),
+            ScheduledCommand(self.command("world"), name="gen/world")]
+        scheduler = CommandScheduler(commands, jobs=2, log_dir=self.dir / "logs")
+        log_file_names = scheduler.get_log_file_names()
+        self.assertEqual(
+            [file_name.name for file_name in log_file_names],
+            [f"run_1_{Path(sys.executable).name}.log", "run_gen_world.log"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler.run()
+        self.assertEqual(sorted((self.dir / "logs").iterdir()), sorted(log_file_names))
+
+    def test_failure_stops_scheduling(self):
+        with self.assertRaisesRegex(CommandSchedulerError, "exit code 3(.|\n)*broken"):
+            self.run_commands([
+                ScheduledCommand(self.command("broken", exit_code=3)),
+                ScheduledCommand(self.command("never"))])
+        self.assertEqual(self.journal_lines(), ["broken"])
+
+    def test_invalid_order(self):
+        with self.assertRaisesRegex(CommandSchedulerError, "unknown"):
+            CommandScheduler(
+                [ScheduledCommand(["true"], after=("missing",))], jobs=1, log_dir=self.dir)
+        with self.assertRaisesRegex(CommandSchedulerError, "Cyclic"):
+            CommandScheduler([
+                ScheduledCommand(["true"], name="a", after=("b",)),
+                ScheduledCommand(["true"], name="b", after=("a",))], jobs=1, log_dir=self.dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of KnownFilesIndex and of searching the unknown files by BuildDirectoryScanner."""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from build_directory_scanner import BuildDirectoryScanner
+from known_files_index import KnownFilesIndex
+
+FILE = KnownFilesIndex.FILE
+SUBTREE = KnownFilesIndex.SUBTREE
+STATE_KEY = KnownFilesIndex.STATE_KEY
+
+
+class KnownFilesIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.build_dir = Path("/work/build")
+        self.index = KnownFilesIndex(self.build_dir)
+
+    def test_files_and_directories(self):
+        self.index.add_files(["a.txt", "lib/a.o", "lib/b.o"])
+        self.index.add_directory("CMakeFiles")
+        self.assertEqual(self.index.root, {
+            "a.txt": FILE,
+            "lib": {"a.o": FILE, "b.o": FILE},
+            "CMakeFiles": SUBTREE,
+        })
+
+    def test_file_which_is_also_a_directory(self):
+        self.index.add_file("lib")
+        self.index.add_file("lib/a.o")
+        self.index.add_file("src/gen")
+        self.index.add_file("src/gen/a.h")
+        self.index.add_file("src")
+        self.assertEqual(self.index.root, {
+            "lib": {STATE_KEY: FILE, "a.o": FILE},
+            "src": {STATE_KEY: FILE, "gen": {STATE_KEY: FILE, "a.h": FILE}},
+        })
+
+    def test_known_directory_contents_are_dropped(self):
+        self.index.add_file("lib/a.o")
+        self.index.add_directory("lib")
+        self.index.add_file("lib/b.o")
+        self.index.add_file("lib/sub/c.o")
+        self.index.add_file("lib")
+        self.assertEqual(self.index.root, {"lib": SUBTREE})
+
+    def test_absolute_paths(self):
+        self.index.add_file("/work/build/lib/a.o")
+        self.index.add_file("/work/build//lib/./b.o")
+        self.index.add_file("/work/other/c.o")
+        self.index.add_file("/work/build_2/d.o")
+        self.index.add_directory("/work")
+        self.index.add_directory("/work/build/bin/")
+        self.assertEqual(self.index.root, {"lib": {"a.o": FILE, "b.o": FILE}, "bin": SUBTREE})
+
+    def test_relative_paths_with_redundant_components(self):
+        self.index.add_file("./lib//a.o")
+        self.index.add_file("")
+        self.index.add_file(".")
+        self.assertEqual(self.index.root, {"lib": {"a.o": FILE}})
+
+    def test_build_directory_as_a_whole(self):
+        self.index.add_file("a.txt")
+        self.index.add_directory("/work/build")
+        self.index.add_file("b.txt")
+        self.index.add_directory("lib")
+        self.assertEqual(self.index.root, SUBTREE)
+
+
+def find_unknown_files_naively(
+        build_dir: Path,
+        known_files: set,
+        known_directories: set,
+        excluded_directory_names: set,
+        excluded_file_names: set,
+        excluded_extensions: set) -> set:
+    """Check every file of the build directory, the way it was done before KnownFilesIndex."""
+
+    result = set()
+    for directory, directory_names, file_names in os.walk(build_dir):
+        relative_directory = Path(directory).relative_to(build_dir)
+        # Symlinks to directories are not followed, but are reported as files.
+        file_names += [name for name in directory_names if Path(directory, name).is_symlink()]
+        for name in file_names:
+            relative_path = relative_directory / name
+            if excluded_directory_names.intersection(relative_directory.parts):
+                continue
+            if name in excluded_file_names or relative_path.suffix in excluded_extensions:
+                continue
+            if relative_path.as_posix() in known_files:
+                continue
+            if any(parent.as_posix() in known_directories for parent in relative_path.parents):
+                continue
+            result.add(relative_path.as_posix())
+    return result
+
+
+class BuildDirectoryScannerTest(unittest.TestCase):
+    EXCLUDED_DIRECTORY_NAMES = {"CMakeFiles"}
+    EXCLUDED_FILE_NAMES = {"build.ninja"}
+    EXCLUDED_EXTENSIONS = {".log"}
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.build_dir = Path(temp_dir.name) / "build"
+        for path in [
+                "build.ninja",
+                "configure.log",
+                ".log",
+                "stale.txt",
+                "lib/a.o",
+                "lib/stale.o",
+                "lib/a.o.d",
+                "lib/deep/er/stale.o",
+                "lib/deep/er/known.o",
+                "bin/app",
+                "bin/plugins/stale.so",
+                "CMakeFiles/stale.o",
+                "sub/CMakeFiles/stale.o",
+                "unrelated/a/b/c.txt",
+                "lib.o/inner.o"]:
+            file_name = self.build_dir / path
+            file_name.parent.mkdir(parents=True, exist_ok=True)
+            file_name.touch()
+        (self.build_dir / "lib/link_to_bin").symlink_to(self.build_dir / "bin")
+        (self.build_dir / "dangling").symlink_to(self.build_dir / "missing")
+
+        self.known_files = {"lib/a.o", "lib/deep/er/known.o", "lib.o", "missing.txt"}
+        self.known_directories = {"bin"}
+
+    def scan(self, jobs=None) -> set:
+        index = KnownFilesIndex(self.build_dir)
+        index.add_files(self.known_files)
+        for directory in self.known_directories:
+            index.add_directory(directory)
+        scanner = BuildDirectoryScanner(
+            self.EXCLUDED_DIRECTORY_NAMES,
+            self.EXCLUDED_FILE_NAMES,
+            self.EXCLUDED_EXTENSIONS,
+            jobs=jobs)
+        entries = scanner.find_unknown_files(self.build_dir, index)
+        paths = [Path(entry.path).relative_to(self.build_dir).as_posix() for entry in entries]
+        self.assertEqual(len(paths), len(set(paths)))
+        return set(paths)
+
+    def test_unknown_files(self):
+        self.assertEqual(self.scan(), {
+            ".log",
+            "stale.txt",
+            "lib/stale.o",
+            "lib/a.o.d",
+            "lib/deep/er/stale.o",
+            "lib/link_to_bin",
+            "unrelated/a/b/c.txt",
+            "lib.o/inner.o",
+            "dangling",
+        })
+
+    def test_same_result_as_checking_every_file(self):
+        expected = find_unknown_files_naively(
+            self.build_dir,
+            self.known_files,
+            self.known_directories,
+            self.EXCLUDED_DIRECTORY_NAMES,
+            self.EXCLUDED_FILE_NAMES,
+            self.EXCLUDED_EXTENSIONS)
+        for jobs in (1, 4):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(self.scan(jobs), expected)
+
+    def test_known_build_directory(self):
+        self.known_directories = {"."}
+        self.assertEqual(self.scan(), set())
+
+    def test_build_directory_inside_excluded_directory(self):
+        self.build_dir = self.build_dir / "CMakeFiles"
+        self.assertEqual(self.scan(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of reading the binary ".ninja_deps" log by NinjaDepsProcessor."""
+
+import struct
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_deps_processor import NinjaDepsProcessor
+
+
+class DepsLogWriter:
+    """Writer of the deps log in the format of ninja (see deps_log.cc in the ninja sources)."""
+
+    def __init__(self, version: int = 4) -> None:
+        self.version = version
+        self.data = bytearray(b"# ninjadeps\n" + struct.pack("<i", version))
+        self.path_ids = {}
+
+    def add_path(self, path: str) -> int:
+        encoded_path = path.encode()
+        padding = b"\0" * (-len(encoded_path) % 4)
+        path_id = len(self.path_ids)
+        self.data += struct.pack("<I", len(encoded_path) + len(padding) + 4)
+        self.data += encoded_path + padding + struct.pack("<I", ~path_id & 0xFFFFFFFF)
+        self.path_ids[path] = path_id
+        return path_id
+
+    def add_deps(self, output: str, dependencies: list, mtime: int = 12345) -> None:
+        ids = [
+            self.path_ids[path] if path in self.path_ids else self.add_path(path)
+            for path in [output, *dependencies]]
+        mtime_data = struct.pack("<q" if self.version == 4 else "<i", mtime)
+        record = struct.pack("<I", ids[0]) + mtime_data + struct.pack(f"<{len(ids) - 1}I", *ids[1:])
+        self.data += struct.pack("<I", len(record) | 0x80000000) + record
+
+    def write(self, file_name: Path) -> None:
+        file_name.write_bytes(bytes(self.data))
+
+
+class NinjaDepsProcessorTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.build_dir = Path(temp_dir.name) / "build"
+        self.build_dir.mkdir()
+        self.log_file_name = self.build_dir / NinjaDepsProcessor.DEPS_LOG_FILE_NAME
+
+    def load(self) -> NinjaDepsProcessor:
+        processor = NinjaDepsProcessor(self.build_dir)
+        self.assertTrue(processor._load_deps_log(self.log_file_name))
+        return processor
+
+    def dependents(self, processor: NinjaDepsProcessor, file_name: str) -> list:
+        return processor.get_dependent_object_files(Path(file_name))
+
+    def make_log(self, version: int) -> DepsLogWriter:
+        writer = DepsLogWriter(version)
+        # "a.h" is mentioned before the outputs, as ninja does for the files of another target.
+        writer.add_path("/src/a.h")
+        writer.add_deps("lib/a.o", ["/src/a.cpp", "/src/a.h", "../src/generated.h"])
+        writer.add_deps("lib/b.o", ["/src/b.cpp", "/src/a.h"])
+        return writer
+
+    def test_supported_versions(self):
+        for version in (3, 4):
+            with self.subTest(version=version):
+                self.make_log(version).write(self.log_file_name)
+                processor = self.load()
+                self.assertEqual(self.dependents(processor, "/src/a.h"), ["lib/a.o", "lib/b.o"])
+                self.assertEqual(self.dependents(processor, "/src/b.cpp"), ["lib/b.o"])
+                # The paths relative to the build directory are made absolute.
+                generated_header = (self.build_dir.parent / "src" / "generated.h").as_posix()
+                self.assertEqual(self.dependents(processor, generated_header), ["lib/a.o"])
+                self.assertEqual(self.dependents(processor, "/src/unknown.h"), [])
+
+    def test_later_record_overrides_earlier_one(self):
+        writer = self.make_log(4)
+        writer.add_deps("lib/a.o", ["/src/a.cpp"])
+        writer.write(self.log_file_name)
+        processor = self.load()
+        self.assertEqual(self.dependents(processor, "/src/a.h"), ["lib/b.o"])
+        self.assertEqual(self.dependents(processor, "/src/a.cpp"), ["lib/a.o"])
+
+    def test_reading_stops_at_damaged_record(self):
+        writer = self.make_log(4)
+        valid_size = len(writer.data)
+        writer.add_deps("lib/c.o", ["/src/c.cpp", "/src/a.h"])
+        for damaged_size in range(valid_size + 1, len(writer.data)):
+            with self.subTest(damaged_size=damaged_size):
+                self.log_file_name.write_bytes(bytes(writer.data[:damaged_size]))
+                processor = self.load()
+                self.assertEqual(self.dependents(processor, "/src/a.h"), ["lib/a.o", "lib/b.o"])
+
+    def test_bad_path_checksum_stops_reading(self):
+        writer = self.make_log(4)
+        path_start = len(writer.data)
+        writer.add_deps("lib/c.o", ["/src/c.cpp"])
+        # Corrupt the checksum of the "lib/c.o" path record.
+        checksum_position = path_start + 4 + len("lib/c.o") + 1
+        writer.data[checksum_position] ^= 0xFF
+        writer.write(self.log_file_name)
+        processor = self.load()
+        self.assertEqual(self.dependents(processor, "/src/c.cpp"), [])
+        self.assertEqual(self.dependents(processor, "/src/a.h"), ["lib/a.o", "lib/b.o"])
+
+    def test_unsupported_log_is_not_read(self):
+        processor = NinjaDepsProcessor(self.build_dir)
+        self.assertFalse(processor._load_deps_log(self.log_file_name))
+        DepsLogWriter(version=5).write(self.log_file_name)
+        self.assertFalse(processor._load_deps_log(self.log_file_name))
+        self.log_file_name.write_bytes(b"# ninja log v5\n")
+        self.assertFalse(processor._load_deps_log(self.log_file_name))
+
+    def test_same_result_as_ninja_deps_output(self):
+        self.make_log(4).write(self.log_file_name)
+        binary_processor = self.load()
+        text_processor = NinjaDepsProcessor(self.build_dir)
+        text_processor._parse_ninja_deps_output([
+            "lib/a.o: #deps 3, deps mtime 12345 (VALID)\n",
+            "    /src/a.cpp\n",
+            "    /src/a.h\n",
+            "    ../src/generated.h\n",
+            "\n",
+            "lib/b.o: #deps 2, deps mtime 12345 (VALID)\n",
+            "    /src/b.cpp\n",
+            "    /src/a.h\n",
+            "\n",
+        ])
+        self.assertEqual(
+            binary_processor._outputs_by_dependencies, text_processor._outputs_by_dependencies)
+
+    def test_most_used_dependencies(self):
+        self.make_log(4).write(self.log_file_name)
+        processor = self.load()
+        self.assertEqual(processor.get_most_used_dependencies(1), [("/src/a.h", 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of NinjaToolServer and send_request() with a fake session."""
+
+import contextlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ninja_tool_server
+from ninja_tool_server import NinjaToolServer, NinjaToolServerError, send_request
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.refresh_count = 0
+        self.requests = []
+
+    def refresh(self) -> None:
+        self.refresh_count += 1
+
+    def execute(self, request: dict) -> None:
+        self.requests.append(request)
+        command = request["command"]
+        print(f"{command[0]} started")
+        print("warning", file=sys.stderr)
+        # The output of other threads must not be sent to the client.
+        thread = threading.Thread(target=print, args=("background output",))
+        thread.start()
+        thread.join()
+        if command[0] == "fail":
+            raise NinjaToolServerError("Command failed")
+        print("x" * 100_000)
+
+
+@unittest.skipUnless(ninja_tool_server.is_supported(), "UNIX sockets are not supported")
+class NinjaToolServerTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.build_dir = Path(temp_dir.name) / "build"
+        self.build_dir.mkdir()
+        self.socket_path = str(self.build_dir / ninja_tool_server.SOCKET_FILE_NAME)
+        self.session = FakeSession()
+        self.server_output = io.StringIO()
+
+    def start_server(self) -> None:
+        server = NinjaToolServer(self.build_dir, self.session)
+        # The server output is the output of the test while the server is running.
+        redirection = contextlib.ExitStack()
+        redirection.enter_context(contextlib.redirect_stdout(self.server_output))
+        redirection.enter_context(contextlib.redirect_stderr(self.server_output))
+        self.addCleanup(redirection.close)
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(send_request, self.build_dir, {"shutdown": True})
+        while "Serving requests" not in self.server_output.getvalue():
+            self.assertTrue(thread.is_alive())
+            time.sleep(0.01)
+
+    def send(self, request: dict) -> (int, str, str):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        # sys.stdout and sys.stderr are replaced by the server with the per-thread routers.
+        with sys.stdout.bind(stdout), sys.stderr.bind(stderr):
+            exit_code = send_request(self.build_dir, request)
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    def test_request_output(self):
+        self.start_server()
+        exit_code, stdout, stderr = self.send({"command": ["strengthen"], "parse_jobs": 2})
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(stdout, "strengthen started\n" + "x" * 100_000 + "\n")
+        self.assertEqual(stderr, "warning\n")
+        self.assertEqual(self.session.requests, [{"command": ["strengthen"], "parse_jobs": 2}])
+        # The session is refreshed when the server starts and before every request.
+        self.assertGreaterEqual(self.session.refresh_count, 2)
+        self.assertIn("background output", self.server_output.getvalue())
+
+    def test_failed_request(self):
+        self.start_server()
+        stdout = io.StringIO()
+        with sys.stdout.bind(stdout), sys.stderr.bind(io.StringIO()):
+            with self.assertRaisesRegex(NinjaToolServerError, "Command failed"):
+                send_request(self.build_dir, {"command": ["fail"]})
+        self.assertEqual(stdout.getvalue(), "fail started\n")
+        # The server keeps serving the requests after a failed one.
+        self.assertEqual(self.send({"command": ["strengthen"]})[0], 0)
+
+    def test_malformed_request(self):
+        self.start_server()
+        for request in (b"not json\n", b"[]\n", b"1\n", b'"strengthen"\n', b"\n"):
+            with self.subTest(request=request):
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                    connection.connect(self.socket_path)
+                    connection.sendall(request)
+                    # The connection is dropped without a response.
+                    self.assertEqual(connection.recv(1), b"")
+                self.assertEqual(self.send({"command": ["strengthen"]})[0], 0)
+        self.assertEqual(self.session.requests, [{"command": ["strengthen"]}] * 5)
+
+    def test_shutdown(self):
+        self.start_server()
+        self.assertEqual(send_request(self.build_dir, {"shutdown": True}), 0)
+        while os.path.exists(self.socket_path):
+            time.sleep(0.01)
+        self.assertIsNone(send_request(self.build_dir, {"command": ["strengthen"]}))
+
+    def test_single_server_per_build_directory(self):
+        self.start_server()
+        with self.assertRaisesRegex(NinjaToolServerError, "already running"):
+            NinjaToolServer(self.build_dir, FakeSession()).serve()
+
+    def test_stale_socket_is_replaced(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale_socket:
+            stale_socket.bind(self.socket_path)
+        self.assertIsNone(send_request(self.build_dir, {"command": ["strengthen"]}))
+        self.start_server()
+        self.assertEqual(self.send({"command": ["strengthen"]})[0], 0)
+
+    def test_no_server(self):
+        self.assertIsNone(send_request(self.build_dir, {"command": ["strengthen"]}))
+
+
+class ThreadOutputRouterTest(unittest.TestCase):
+    def test_output_of_threads(self):
+        default_stream = io.StringIO()
+        router = ninja_tool_server._ThreadOutputRouter(default_stream)
+        streams = [io.StringIO() for _ in range(4)]
+        barrier = threading.Barrier(len(streams))
+
+        def write(stream, index):
+            with router.bind(stream):
+                barrier.wait()
+                for _ in range(100):
+                    router.write(f"{index}")
+            router.write("unbound ")
+
+        threads = [
+            threading.Thread(target=write, args=(stream, index))
+            for index, stream in enumerate(streams)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for index, stream in enumerate(streams):
+            self.assertEqual(stream.getvalue(), f"{index}" * 100)
+        self.assertEqual(default_stream.getvalue(), "unbound " * len(streams))
+
+
+@unittest.skipUnless(hasattr(os, "getuid"), "POSIX only")
+class SocketPathTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = Path(temp_dir.name)
+        self.long_build_dir = Path("/", *["long_directory_name"] * 10, "build")
+
+    def test_socket_in_build_directory(self):
+        self.assertEqual(
+            ninja_tool_server.get_socket_path(Path("/src/build")), "/src/build/.ninja_tool.sock")
+
+    def test_socket_in_runtime_directory(self):
+        runtime_dir = self.temp_dir / "runtime"
+        runtime_dir.mkdir(mode=0o700)
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": str(runtime_dir)}):
+            socket_path = ninja_tool_server.get_socket_path(self.long_build_dir)
+            self.assertEqual(Path(socket_path).parent, runtime_dir)
+            self.assertLessEqual(len(socket_path), ninja_tool_server._MAX_SOCKET_PATH_LENGTH)
+            # Different build directories have different sockets.
+            self.assertNotEqual(
+                socket_path, ninja_tool_server.get_socket_path(self.long_build_dir / "other"))
+
+    def test_private_directory_is_created(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": ""}), \
+                mock.patch.object(tempfile, "tempdir", str(self.temp_dir)):
+            socket_path = ninja_tool_server.get_socket_path(self.long_build_dir)
+        runtime_dir = self.temp_dir / f"ninja_tool-{os.getuid()}"
+        self.assertEqual(Path(socket_path).parent, runtime_dir)
+        self.assertEqual(runtime_dir.stat().st_mode & 0o777, 0o700)
+
+    def test_unsafe_runtime_directory(self):
+        shared_dir = self.temp_dir / "shared"
+        shared_dir.mkdir()
+        shared_dir.chmod(0o755)
+        link = self.temp_dir / "link"
+        link.symlink_to(shared_dir)
+        for runtime_dir in (shared_dir, link, self.temp_dir / "missing"):
+            with self.subTest(runtime_dir=runtime_dir.name):
+                with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": str(runtime_dir)}):
+                    with self.assertRaises(NinjaToolServerError):
+                        ninja_tool_server.get_socket_path(self.long_build_dir)
+                    # The client doesn't use the sockets in such directories.
+                    self.assertIsNone(
+                        send_request(self.long_build_dir, {"command": ["strengthen"]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of loading build.ninja in parallel chunks, compared with the sequential loading."""
+
+import contextlib
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_file_processor.build_ninja_processor import BuildNinjaFileProcessor
+from ninja_file_processor.ninja_file_processor import NinjaFileProcessor
+
+STATEMENT_COUNT = 40
+INCLUDE_LINE = f"include CMakeFiles/{'long_directory_name/' * 10}rules.ninja\n"
+STRENGTHENED_TARGETS = {"bin/app_0", "bin/app_3", "bin/app_7"}
+
+
+def make_statements() -> list:
+    statements = []
+    for i in range(STATEMENT_COUNT):
+        statements.append(
+            f"build obj/{i}.o: CXX_COMPILER ../src/{i}.cpp $\n"
+            f"    | ../src/{i}.h $\n"
+            f"    gen/{i % 3}.h || gen/all\n"
+            f"  depfile = obj/{i}.o.d\n")
+        if i % 4 == 3:
+            statements.append(
+                f"build bin/app_{i // 4}: CXX_LINKER obj/{i}.o obj/{i - 1}.o $\n"
+                f"    obj/{i - 2}.o obj/{i - 3}.o\n")
+    for i in range(3):
+        statements.append(
+            f"build gen/{i}.h: CUSTOM_COMMAND ../src/gen.py\n"
+            f"  COMMAND = moc @gen/{i}.moc_parameters\n")
+    statements.append("build gen/all: phony gen/0.h gen/1.h gen/2.h\n")
+    return statements
+
+
+def make_build_ninja() -> str:
+    """Make build.ninja with the include statement in the middle of the file, so it crosses the
+    boundary of the two halves of the file.
+    """
+
+    statements = make_statements()
+    size = sum(map(len, statements)) + len(INCLUDE_LINE)
+    offset = 0
+    for index, statement in enumerate(statements):
+        if offset <= size // 2 < offset + len(INCLUDE_LINE):
+            return "".join(statements[:index]) + INCLUDE_LINE + "".join(statements[index:])
+        offset += len(statement)
+    raise AssertionError("The include statement is shorter than the other statements")
+
+
+class ParallelLoadingTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.build_dir = Path(temp_dir.name)
+        self.build_file_name = self.build_dir / "build.ninja"
+        self.text = make_build_ninja()
+
+    def load(self, parse_jobs: int, memory_mapped: bool) -> (int, list, Path, bytes):
+        """Load and patch build.ninja.
+
+        :return: Number of the parsed chunks, the known files, the rules file name and the patched
+            file contents.
+        """
+
+        self.build_file_name.write_text(self.text)
+        processor = BuildNinjaFileProcessor(
+            self.build_file_name,
+            build_directory=self.build_dir,
+            parse_jobs=parse_jobs,
+            memory_mapped=memory_mapped)
+        with mock.patch.object(NinjaFileProcessor, "_MIN_PARALLEL_CHUNK_SIZE", 64), \
+                mock.patch.object(NinjaFileProcessor, "_BOUNDARY_SEARCH_BLOCK_SIZE", 16), \
+                mock.patch.object(
+                    BuildNinjaFileProcessor,
+                    "_merge_chunk_state",
+                    autospec=True,
+                    side_effect=BuildNinjaFileProcessor._merge_chunk_state) as merge_chunk_state, \
+                contextlib.redirect_stdout(io.StringIO()):
+            processor.load_data()
+            known_files = sorted(processor.get_known_files())
+            processor.strengthen_dependencies(STRENGTHENED_TARGETS)
+            processor.save_data()
+        return (
+            merge_chunk_state.call_count,
+            known_files,
+            processor.get_rules_file_name(),
+            self.build_file_name.read_bytes())
+
+    def test_fixture_has_statements_crossing_chunk_boundaries(self):
+        size = len(self.text)
+        split_positions = [
+            size * i // parse_jobs for parse_jobs in (2, 3, 4, 7) for i in range(1, parse_jobs)]
+        self.assertTrue(any(map(self._is_in_continued_statement, split_positions)))
+        include_start = self.text.index("include ")
+        self.assertLess(include_start, size // 2)
+        self.assertGreater(include_start + len(INCLUDE_LINE), size // 2)
+
+    def _is_in_continued_statement(self, position: int) -> bool:
+        """Check whether the line containing the position ends with "$" or continues a line ending
+        with "$".
+        """
+
+        line_start = self.text.rfind("\n", 0, position) + 1
+        line_end = self.text.find("\n", position)
+        return self.text[line_end - 1] == "$" or self.text[max(line_start - 2, 0)] == "$"
+
+    def test_same_result_as_sequential_loading(self):
+        for memory_mapped in (False, True):
+            chunk_count, *expected = self.load(parse_jobs=1, memory_mapped=memory_mapped)
+            self.assertEqual(chunk_count, 0)
+            self.assertEqual(expected[1], self.build_dir / INCLUDE_LINE.split()[1])
+            self.assertIn("obj/0.o.d", expected[0])
+            self.assertIn("gen/2.moc_parameters", expected[0])
+            for parse_jobs in (2, 3, 4, 7):
+                with self.subTest(memory_mapped=memory_mapped, parse_jobs=parse_jobs):
+                    chunk_count, *result = self.load(parse_jobs, memory_mapped)
+                    self.assertGreater(chunk_count, 1)
+                    self.assertEqual(result, expected)
+
+    def test_statement_boundaries(self):
+        data = make_build_ninja().replace("obj/1.o.d\n", "obj/1.o.d\r\n").encode()
+        data = data.replace(b"gen/1.h || gen/all\n", b"gen/1.h || gen/all\r\n")
+        data = data.replace(b"../src/1.cpp $\n", b"../src/1.cpp $\r\n")
+        self.build_file_name.write_bytes(data)
+
+        def find_boundary_naively(position: int) -> int:
+            if position == 0:
+                return 0
+            line_end = data.find(b"\n", position - 1)
+            while line_end >= 0 and data[:line_end].rstrip(b"\r").endswith(b"$"):
+                line_end = data.find(b"\n", line_end + 1)
+            return len(data) if line_end < 0 else line_end + 1
+
+        with mock.patch.object(NinjaFileProcessor, "_BOUNDARY_SEARCH_BLOCK_SIZE", 16), \
+                open(self.build_file_name, "rb") as file:
+            for position in range(len(data) + 1):
+                self.assertEqual(
+                    NinjaFileProcessor._find_statement_boundary(file, position),
+                    find_boundary_naively(position),
+                    position)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of sharing the parse cache between the read-only and the writing processors."""
+
+import contextlib
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_file_processor.build_ninja_processor import BuildNinjaFileProcessor
+
+BUILD_NINJA = (
+    "# This file is generated.\n"
+    "include CMakeFiles/rules.ninja\n"
+    "\n"
+    "build a.o: CXX_COMPILER /src/a.cpp || gen\n"
+    "  FLAGS = -O2\n"
+    "build app: CXX_LINKER a.o\n"
+    "build gen: phony\n")
+
+
+class ParseCacheSharingTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.build_dir = Path(temp_dir.name)
+        self.build_file_name = self.build_dir / "build.ninja"
+        self.build_file_name.write_text(BUILD_NINJA)
+
+    def load(self, read_only: bool, memory_mapped: bool) -> (BuildNinjaFileProcessor, str):
+        processor = BuildNinjaFileProcessor(
+            self.build_file_name,
+            build_directory=self.build_dir,
+            cache_file_name=self.build_dir / ".ninja_tool_cache",
+            memory_mapped=memory_mapped,
+            read_only=read_only)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            processor.load_data()
+        return processor, output.getvalue()
+
+    def test_read_only_load_caches_state_usable_for_saving(self):
+        for memory_mapped in (False, True):
+            with self.subTest(memory_mapped=memory_mapped):
+                (self.build_dir / ".ninja_tool_cache").unlink(missing_ok=True)
+                reader, output = self.load(read_only=True, memory_mapped=memory_mapped)
+                self.assertNotIn("Using cached", output)
+                self.assertEqual(
+                    reader.get_changed_targets_by_file_name(Path("/src/a.cpp")), {"a.o", "app"})
+
+                writer, output = self.load(read_only=False, memory_mapped=memory_mapped)
+                self.assertIn("Using cached", output)
+                writer.save_data()
+                self.assertEqual(self.build_file_name.read_text(), BUILD_NINJA)
+
+                # The file is not changed by saving, so the cache is still used by the reader.
+                reader, output = self.load(read_only=True, memory_mapped=memory_mapped)
+                self.assertIn("Using cached", output)
+                self.assertTrue(reader.is_read_only())
+
+
+if __name__ == "__main__":
+    unittest.main()
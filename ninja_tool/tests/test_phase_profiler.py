@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of the report and the output files of PhaseProfiler."""
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from phase_profiler import PhaseProfiler
+
+
+class PhaseProfilerTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+
+    def test_output_files(self):
+        profiler = PhaseProfiler()
+        self.assertEqual(profiler.get_output_files(), [])
+
+        report_file_name = self.dir / "pre_build.timing.json"
+        profiler.configure(
+            profiled_phases=["patch/save_build_ninja"],
+            profile_dir=self.dir,
+            report_file_name=report_file_name)
+        self.assertCountEqual(profiler.get_output_files(), [
+            report_file_name, self.dir / "patch.save_build_ninja.prof"])
+
+        profiler.configure(profiled_phases=[PhaseProfiler.ALL_PHASES], profile_dir=self.dir)
+        with profiler.phase("clean"):
+            with profiler.phase("scan"):
+                pass
+        (self.dir / "unrelated.timing.json").touch()
+        self.assertEqual(profiler.get_output_files(), [self.dir / "clean.prof"])
+
+    def test_reset_drops_collected_data(self):
+        report_file_name = self.dir / "report.json"
+        profiler = PhaseProfiler()
+        profiler.configure(report_file_name=report_file_name)
+        with profiler.phase("first_request"):
+            profiler.count("files", 3)
+        profiler.reset()
+        with profiler.phase("second_request"):
+            profiler.count("files")
+        profiler.write_report()
+
+        report = json.loads(report_file_name.read_text())
+        self.assertEqual([phase["name"] for phase in report["phases"]], ["second_request"])
+        self.assertEqual(report["counters"], {"files": 1})
+
+    def test_no_report_without_file_name(self):
+        profiler = PhaseProfiler()
+        profiler.configure(profile_dir=self.dir)
+        profiler.write_report()
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
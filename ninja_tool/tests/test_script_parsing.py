@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of parsing and merging the commands of the ninja_tool scripts."""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_file_processor.affected_targets_query import AffectedTargetsQuery
+from ninja_tool import (
+    AffectedTargetsListArguments, BuildAnalysisArguments, ParsedScriptData,
+    _parse_splitted_command_line)
+
+
+def parse_script(*lines: str) -> ParsedScriptData:
+    commands = [line.split() for line in lines]
+    return ParsedScriptData.merge(
+        [_parse_splitted_command_line(command[0], command[1:]) for command in commands])
+
+
+class ScriptParsingTest(unittest.TestCase):
+    def test_affected_targets_list_options(self):
+        script_data = parse_script(
+            "generate_affected_targets_list /src changed.txt affected.txt "
+            "rule=CXX* exclude_output=*.pch max_depth=2 counts format=json")
+        self.assertEqual(script_data.affected_targets_list, AffectedTargetsListArguments(
+            source_dir=Path("/src"),
+            changed_files_list_file_name="changed.txt",
+            affected_targets_list_file_name="affected.txt",
+            query=AffectedTargetsQuery(
+                rules=("CXX*",), excluded_outputs=("*.pch",), max_depth=2, with_counts=True),
+            output_format="json"))
+        self.assertEqual(script_data.known_file_names, {"changed.txt", "affected.txt"})
+
+    def test_last_affected_targets_list_command_wins(self):
+        # The options of the first command must not leak into the second one.
+        script_data = parse_script(
+            "generate_affected_targets_list /src a.txt b.txt top_level format=json",
+            "generate_affected_targets_list /src2 c.txt d.txt")
+        self.assertEqual(script_data.affected_targets_list, AffectedTargetsListArguments(
+            source_dir=Path("/src2"),
+            changed_files_list_file_name="c.txt",
+            affected_targets_list_file_name="d.txt"))
+
+    def test_invalid_affected_targets_list_option(self):
+        script_data = parse_script("generate_affected_targets_list /src a.txt b.txt depth=2")
+        self.assertIsNone(script_data.affected_targets_list)
+
+    def test_last_analyze_build_command_wins(self):
+        script_data = parse_script(
+            "analyze_build first.json top=5 format=json", "analyze_build second.txt")
+        self.assertEqual(
+            script_data.build_analysis, BuildAnalysisArguments(report_file_name="second.txt"))
+        self.assertEqual(script_data.known_file_names, {"first.json", "second.txt"})
+
+    def test_analyze_build_options(self):
+        self.assertEqual(
+            parse_script("analyze_build report.json format=json top=50").build_analysis,
+            BuildAnalysisArguments("report.json", top_count=50, output_format="json"))
+        self.assertIsNone(parse_script("analyze_build report.txt top=0").build_analysis)
+
+
+if __name__ == "__main__":
+    unittest.main()
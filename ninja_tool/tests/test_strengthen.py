@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of strengthening the dependencies of the targets in build.ninja, compared with the result
+of the original per-target search of the transitive dependencies.
+"""
+
+import contextlib
+import io
+import re
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ninja_tool
+from ninja_file_processor.build_ninja_processor import BuildNinjaFileProcessor
+
+# Statements of build.ninja: the outputs, the implicit outputs, the rule, the explicit, the implicit
+# and the order-only inputs, and the validations; the paths are escaped as in build.ninja.
+STATEMENTS = [
+    (["gen/version.h"], [], "CUSTOM_COMMAND", ["../src/version.h.in"], [], [], []),
+    (["gen/moc_a.cpp"], [], "CUSTOM_COMMAND", ["../src/a.h"], [], ["gen/version.h"], []),
+    (["gen/all_headers"], [], "phony", ["gen/version.h", "gen/moc_a.cpp"], [], [], []),
+    (
+        ["a.o"], [], "CXX_COMPILER", ["../src/a.cpp"], ["../src/a.h"], ["gen/all_headers"],
+        ["../src/a.lint"]),
+    (["moc_a.o"], [], "CXX_COMPILER", ["gen/moc_a.cpp"], [], ["gen/all_headers"], []),
+    (
+        ["dir$ with$ space/b.o"], [], "CXX_COMPILER", ["../src/b$:c.cpp"], [],
+        ["gen/all_headers"], []),
+    (["main.o"], [], "CXX_COMPILER", ["../src/main.cpp"], ["gen/version.h"], [], []),
+    (
+        ["liba.a"], ["liba.a.manifest"], "STATIC_LIBRARY", ["a.o", "moc_a.o"], [],
+        ["gen/version.h"], []),
+    (
+        ["libb.so"], [], "CXX_LINKER", ["dir$ with$ space/b.o", "liba.a"], [],
+        ["gen/all_headers"], []),
+    # The validation depends on the target it validates; it's not a dependency of the target.
+    (
+        ["app"], [], "CXX_LINKER", ["main.o", "libb.so"], ["liba.a.manifest"], [],
+        ["app.check"]),
+    (["app.check"], [], "CUSTOM_COMMAND", ["app"], [], [], []),
+    (["all"], [], "phony", ["app"], [], [], []),
+]
+
+STRENGTHENED_TARGETS = {"app", "libb.so", "dir with space/b.o", "liba.a", "unknown"}
+
+RULES_NINJA = (
+    "rule CXX_COMPILER\n  command = c++ $in -o $out\n\n"
+    "rule RERUN_CMAKE\n  command = cmake --regenerate-during-build\n")
+
+_TOKEN_RE = re.compile(r"\|@|\|\||[|:]|(?:[^$ :|\n]|\$.)+")
+
+
+def make_build_line(statement) -> str:
+    outputs, implicit_outputs, rule, inputs, implicit_inputs, order_only_inputs, validations = (
+        statement)
+    line = " ".join(outputs)
+    if implicit_outputs:
+        line += " | " + " ".join(implicit_outputs)
+    line += ": " + " ".join([rule, *inputs])
+    if implicit_inputs:
+        line += " | " + " ".join(implicit_inputs)
+    if order_only_inputs:
+        line += " || " + " ".join(order_only_inputs)
+    if validations:
+        line += " |@ " + " ".join(validations)
+    return f"build {line}\n"
+
+
+def make_build_ninja(statements) -> str:
+    text = "# This file is generated.\ninclude CMakeFiles/rules.ninja\n\n"
+    for statement in statements:
+        text += make_build_line(statement) + "  FLAGS = -O2\n\n"
+    return text + "default all\n"
+
+
+def parse_build_line(line: str) -> tuple:
+    """Parse the "build" line into a tuple like the ones of STATEMENTS, with sets of the inputs
+    and the validations.
+    """
+
+    tokens = _TOKEN_RE.findall(line[len("build "):])
+    separator = tokens.index(":")
+    outputs = tokens[:separator]
+    implicit_outputs = []
+    if "|" in outputs:
+        outputs, implicit_outputs = outputs[:outputs.index("|")], outputs[outputs.index("|") + 1:]
+    rule, *sources = tokens[separator + 1:]
+    groups = [[], [], [], []]
+    group = 0
+    for token in sources:
+        if token == "|":
+            group = 1
+        elif token == "||":
+            group = 2
+        elif token == "|@":
+            group = 3
+        else:
+            groups[group].append(token)
+    return (outputs, implicit_outputs, rule, *(set(paths) for paths in groups))
+
+
+def collect_transitive_dependencies_naively(statements, target: str) -> set:
+    """Search the transitive dependencies of the target the way it was done before BuildGraph.
+    The validations are not dependencies, so they are not followed.
+    """
+
+    statements_by_output = {
+        output: statement
+        for statement in statements for output in [*statement[0], *statement[1]]}
+    first_statement = statements_by_output[target]
+    transitive_dependencies = set()
+    unchecked_targets = [path for inputs in first_statement[3:6] for path in inputs]
+    while unchecked_targets:
+        current_target = unchecked_targets.pop()
+        if current_target in transitive_dependencies:
+            continue
+        current_statement = statements_by_output.get(current_target)
+        if current_statement is None:
+            continue
+        transitive_dependencies.add(current_target)
+        unchecked_targets.extend(path for inputs in current_statement[3:6] for path in inputs)
+
+    transitive_dependencies -= set(first_statement[3])
+    return {
+        dependency for dependency in transitive_dependencies
+        if statements_by_output[dependency][2] != "phony"}
+
+
+class StrengthenTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.build_dir = Path(temp_dir.name)
+        self.build_file_name = self.build_dir / "build.ninja"
+
+    def strengthen(self, statements, **options) -> (str, str):
+        self.build_file_name.write_text(make_build_ninja(statements))
+        processor = BuildNinjaFileProcessor(
+            self.build_file_name, build_directory=self.build_dir, **options)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            processor.load_data()
+            processor.strengthen_dependencies(STRENGTHENED_TARGETS)
+            processor.save_data()
+        self.assertIn("Unknown target unknown", output.getvalue())
+        return self.build_file_name.read_text(), output.getvalue()
+
+    def check_result(self, statements, patched_text: str) -> None:
+        original_lines = make_build_ninja(statements).splitlines()
+        marker_line, *patched_lines = patched_text.splitlines()
+        self.assertEqual(marker_line, "# File is patched by ninja_tool")
+        self.assertEqual(len(patched_lines), len(original_lines))
+        remaining_statements = iter(statements)
+        for original_line, patched_line in zip(original_lines, patched_lines):
+            if not original_line.startswith("build "):
+                self.assertEqual(patched_line, original_line)
+                continue
+            statement = next(remaining_statements)
+            if statement[0][0].replace("$ ", " ") not in STRENGTHENED_TARGETS:
+                self.assertEqual(patched_line, original_line)
+                continue
+            outputs, implicit_outputs, rule, inputs, _, _, validations = statement
+            self.assertEqual(parse_build_line(patched_line), (
+                outputs,
+                implicit_outputs,
+                rule,
+                set(inputs),
+                collect_transitive_dependencies_naively(statements, statement[0][0]),
+                set(),
+                set(validations)), patched_line)
+
+    def test_hand_written_build_ninja(self):
+        patched_text, _ = self.strengthen(STATEMENTS)
+        self.check_result(STATEMENTS, patched_text)
+        self.assertEqual(
+            parse_build_line(next(
+                line for line in patched_text.splitlines() if line.startswith("build app:")))[4],
+            {
+                "gen/version.h", "gen/moc_a.cpp", "a.o", "moc_a.o", "dir$ with$ space/b.o",
+                "liba.a", "liba.a.manifest",
+            })
+
+    def test_validations_are_known_files(self):
+        self.build_file_name.write_text(make_build_ninja(STATEMENTS))
+        processor = BuildNinjaFileProcessor(
+            self.build_file_name, build_directory=self.build_dir, read_only=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.load_data()
+        self.assertIn("../src/a.lint", set(processor.get_known_files()))
+
+    def test_loading_modes(self):
+        for options in (
+                {"memory_mapped": True},
+                {"parse_jobs": 2},
+                {"cache_file_name": self.build_dir / "cache"},
+                {"debug_output": True}):
+            with self.subTest(options=options):
+                self.check_result(STATEMENTS, self.strengthen(STATEMENTS, **options)[0])
+
+    def test_reused_dependencies_of_unchanged_targets(self):
+        patch_state_file_name = self.build_dir / "patch_state"
+        self.strengthen(STATEMENTS, patch_state_file_name=patch_state_file_name)
+
+        # "b.o" gets a new dependency, so the dependency subgraphs of "b.o", "libb.so" and "app"
+        # are changed, and only the transitive dependencies of "liba.a" are reused.
+        changed_statements = [
+            (outputs, implicit_outputs, rule, inputs, [*implicit_inputs, "gen/moc_a.cpp"], *rest)
+            if outputs == ["dir$ with$ space/b.o"]
+            else (outputs, implicit_outputs, rule, inputs, implicit_inputs, *rest)
+            for outputs, implicit_outputs, rule, inputs, implicit_inputs, *rest in STATEMENTS]
+        patched_text, output = self.strengthen(
+            changed_statements, patch_state_file_name=patch_state_file_name)
+        self.assertIn("Transitive dependencies of 1 of 5 strengthened targets are reused", output)
+        self.check_result(changed_statements, patched_text)
+
+
+class PatchFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.build_dir = Path(temp_dir.name)
+        self.build_file_name = self.build_dir / "build.ninja"
+        self.build_file_name.write_text(make_build_ninja(STATEMENTS))
+        (self.build_dir / "CMakeFiles").mkdir()
+        (self.build_dir / "CMakeFiles" / "rules.ninja").write_text(RULES_NINJA)
+
+    def patch(self, strengthened_targets: set) -> str:
+        """Patch build.ninja the way ninja_tool does it; the patch script is newer than the file,
+        so the patching is skipped only if the fingerprint of the file matches.
+        """
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ninja_tool.patch_ninja_build(
+                file_name=self.build_file_name,
+                strengthened_targets=strengthened_targets,
+                build_file_processor=ninja_tool._create_build_file_processor(self.build_dir),
+                script_timestamp=time.time() + 3600)
+        return output.getvalue()
+
+    def test_same_targets(self):
+        self.assertIn("build.ninja patched", self.patch(STRENGTHENED_TARGETS))
+        patched_stat = self.build_file_name.stat()
+        self.assertIn("already patched", self.patch(set(STRENGTHENED_TARGETS)))
+        self.assertEqual(self.build_file_name.stat().st_mtime_ns, patched_stat.st_mtime_ns)
+
+    def test_different_targets(self):
+        self.patch(STRENGTHENED_TARGETS - {"app"})
+        self.assertIn(
+            "build app: CXX_LINKER main.o libb.so | liba.a.manifest |@",
+            self.build_file_name.read_text())
+        self.assertIn("build.ninja patched", self.patch(STRENGTHENED_TARGETS))
+        self.assertIn(
+            "build app: CXX_LINKER main.o libb.so | liba.a.manifest liba.a",
+            self.build_file_name.read_text())
+        # The fingerprint of the new target set is stored.
+        self.assertIn("already patched", self.patch(STRENGTHENED_TARGETS))
+
+    def test_regenerated_file_of_same_size(self):
+        self.patch(STRENGTHENED_TARGETS)
+        patched_text = self.build_file_name.read_text()
+        regenerated_text = patched_text.replace("-O2", "-O3")
+        self.assertEqual(len(regenerated_text), len(patched_text))
+        self.build_file_name.write_text(regenerated_text)
+        self.assertIn("build.ninja patched", self.patch(STRENGTHENED_TARGETS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+## Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+
+"""Tests of collect_transitive_dependencies() on small graphs, including the cyclic ones."""
+
+import random
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ninja_file_processor.build_graph import BuildGraph
+from ninja_file_processor import transitive_closure
+from ninja_file_processor.transitive_closure import collect_transitive_dependencies
+
+
+def make_graph(statements) -> BuildGraph:
+    """Make a graph of the statements: tuples of the output, the rule, the explicit and the
+    implicit inputs.
+    """
+
+    graph = BuildGraph()
+    for line_index, (output, rule, inputs, implicit_inputs) in enumerate(statements):
+        graph.add_edge(
+            line_index=line_index,
+            rule=rule,
+            outputs=[output],
+            implicit_outputs=[],
+            dependencies=inputs,
+            implicit_dependencies=implicit_inputs,
+            order_only_dependencies=[])
+    graph.finalize()
+    return graph
+
+
+def collect_naively(graph: BuildGraph, target: int) -> set:
+    producers = graph.node_producers
+    reachable = set()
+    unchecked = [
+        node for node in graph.edge_inputs(producers[target])
+        if producers[node] != BuildGraph.NO_EDGE]
+    while unchecked:
+        node = unchecked.pop()
+        if node in reachable:
+            continue
+        reachable.add(node)
+        unchecked.extend(
+            input_node for input_node in graph.edge_inputs(producers[node])
+            if producers[input_node] != BuildGraph.NO_EDGE)
+    return {
+        node for node in reachable
+        if not graph.is_phony(producers[node])
+        and node not in graph.edge_explicit_inputs(producers[target])}
+
+
+class TransitiveClosureTest(unittest.TestCase):
+    def collect(self, graph: BuildGraph, targets) -> dict:
+        result = collect_transitive_dependencies(graph, [graph.node_id(t) for t in targets])
+        return {
+            graph.paths[node]: {graph.paths[d] for d in dependencies}
+            for node, dependencies in result.items()}
+
+    def test_chain_without_explicit_dependencies(self):
+        graph = make_graph([
+            ("app", "LINK", ["lib.a", "main.o"], []),
+            ("lib.a", "AR", ["lib.o"], []),
+            ("lib.o", "CXX", ["lib.cpp"], ["gen.h"]),
+            ("main.o", "CXX", ["main.cpp"], ["gen.h"]),
+            ("gen.h", "GEN", ["gen.py"], []),
+        ])
+        self.assertEqual(self.collect(graph, ["app", "lib.a"]), {
+            "app": {"lib.o", "gen.h"},
+            "lib.a": {"gen.h"},
+        })
+
+    def test_phony_nodes_are_passed_through(self):
+        graph = make_graph([
+            ("app", "LINK", ["main.o"], ["all_generated"]),
+            ("all_generated", "phony", ["a.h", "b.h"], []),
+            ("a.h", "GEN", [], []),
+            ("b.h", "GEN", [], []),
+            ("main.o", "CXX", ["main.cpp"], []),
+        ])
+        self.assertEqual(self.collect(graph, ["app"]), {"app": {"a.h", "b.h"}})
+
+    def test_cycles(self):
+        graph = make_graph([
+            ("app", "LINK", ["a"], []),
+            ("a", "GEN", ["b"], []),
+            ("b", "GEN", ["c"], ["a"]),
+            ("c", "GEN", ["d"], ["c"]),
+            ("d", "GEN", [], []),
+        ])
+        self.assertEqual(self.collect(graph, ["app", "a", "c"]), {
+            "app": {"b", "c", "d"},
+            "a": {"a", "c", "d"},
+            "c": {"c"},
+        })
+
+    def test_consumers_within_cycles_are_not_counted(self):
+        # A bitset is released when all its consumers are processed, so a consumer in the same
+        # component (which never releases it) must not be counted.
+        graph = make_graph([
+            ("app", "LINK", ["a", "c"], []),
+            ("a", "GEN", ["b"], ["a"]),
+            ("b", "GEN", ["a", "d"], []),
+            ("c", "GEN", ["c", "d"], []),
+            ("d", "GEN", [], []),
+        ])
+        node = graph.node_id
+        successors = transitive_closure._collect_successors(graph, [node("app")])
+        components = []
+        transitive_closure._find_strongly_connected_components(
+            [node("app")], successors, components.append)
+        self.assertCountEqual(
+            [sorted(graph.paths[n] for n in component) for component in components],
+            [["d"], ["a", "b"], ["c"], ["app"]])
+
+        component_ids = {n: i for i, component in enumerate(components) for n in component}
+        self.assertEqual(
+            transitive_closure._count_consumers(successors, component_ids),
+            {node("a"): 1, node("c"): 1, node("d"): 2})
+        # "a" and "c" are explicit dependencies of "app".
+        self.assertEqual(self.collect(graph, ["app"]), {"app": {"b", "d"}})
+
+    def test_random_graphs(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            node_count = rng.randint(1, 12)
+            paths = [f"n{i}" for i in range(node_count)]
+            statements = []
+            for path in paths:
+                if rng.random() < 0.2:
+                    continue  # A source file.
+                inputs = rng.sample(paths, rng.randint(0, min(3, node_count)))
+                implicit_inputs = rng.sample(paths, rng.randint(0, min(2, node_count)))
+                rule = "phony" if rng.random() < 0.2 else "CMD"
+                statements.append((path, rule, inputs, implicit_inputs))
+            graph = make_graph(statements)
+            targets = [output for output, *_ in statements]
+            expected = {
+                target: {graph.paths[n] for n in collect_naively(graph, graph.node_id(target))}
+                for target in targets}
+            self.assertEqual(self.collect(graph, targets), expected, statements)
+
+
+if __name__ == "__main__":
+    unittest.main()